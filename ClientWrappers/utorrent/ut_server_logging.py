@@ -19,7 +19,7 @@ import traceback
 
 # Client wrapper for uTorrent windows version
 # USAGE:
-# $0 clientDir workingDir stopWhenSeeding metaDirCount [metaDir [metaDir ...]] dataDirCount [dataDir [dataDir ...]]
+# $0 clientDir workingDir stopWhenSeeding useDHT metaDirCount [metaDir [metaDir ...]] dataDirCount [dataDir [dataDir ...]] [pollInterval]
 #
 # clientDir will contain the lock files for sockets, this should be a shared directory for all clients on the same machine
 # workingDir will be cleaned out (rm -rf *), webui.zip and utorrent.exe will be copied in
@@ -28,6 +28,7 @@ import traceback
 # metaDir is a directory containing .torrent files to be seeded or downloaded (pass exactly metaDirCount of these)
 # dataDirCount is the number of dataDir arguments passed
 # dataDir is a directory containing data for the .torrent files (pass exactly dataDirCount of these)
+# pollInterval is the number of seconds between two status polls, may be fractional; defaults to 1
 
 # subprocess.Popen object for utorrent client
 utorrent_process = None
@@ -188,10 +189,19 @@ class uTorrentConnection( httplib.HTTPConnection ):
         return self._resp
     
     def doRequest(self, url, reportErrors = True, method = 'GET', headers = None, data = None):
+        # The connection is kept alive between requests. If the client dropped it in the mean time the first
+        # attempt fails without the request ever having been handled, so reconnect and try exactly once more.
         try:
-            self.request( url, method = method, headers = headers, body = data )
-            page = self._resp.read()
-            self.close()
+            try:
+                page = self._doRequestOnce( url, method, headers, data )
+            except (httplib.NotConnected, httplib.ImproperConnectionState, httplib.BadStatusLine):
+                self.close()
+                page = self._doRequestOnce( url, method, headers, data )
+            except socket.error as e:
+                if isinstance( e, socket.timeout ) or e.errno not in (errno.ECONNRESET, errno.EPIPE):
+                    raise
+                self.close()
+                page = self._doRequestOnce( url, method, headers, data )
             if self._resp.status != 200 and reportErrors:
                 print >> sys.stderr, "Unexpected status: {0}".format( self._resp.status )
                 print >> sys.stderr, "Server says: {0}".format( self._resp.reason )
@@ -199,33 +209,43 @@ class uTorrentConnection( httplib.HTTPConnection ):
                 print >> sys.stderr, "End of unexpected status"
             return page
         except httplib.NotConnected:
+            self.close()
             if reportErrors:
                 print >> sys.stderr, time.time()
                 print >> sys.stderr, "Client could not be connected while earlier contact was succesfull."
             return None
         except httplib.ImproperConnectionState:
+            self.close()
             if reportErrors:
                 print >> sys.stderr, time.time()
                 print >> sys.stderr, "Client could was not connected properly while earlier contact was succesfull."
             return None
         except httplib.BadStatusLine:
+            self.close()
             if reportErrors:
                 print >> sys.stderr, time.time()
                 print >> sys.stderr, "Client reacted with strange status after ealier succesfull contact, assuming crash."
             return None
         except socket.timeout:
+            self.close()
             if reportErrors:
                 print >> sys.stderr, time.time()
-                print >> sys.stderr, "Client did not respond in 5 seconds after earlier succesfull contact, assuming crash."
+                print >> sys.stderr, "Client did not respond in time after earlier succesfull contact, assuming crash."
             return None
         except socket.error as e:
-            if e.errno == errno.ECONNREFUSED:
+            self.close()
+            if e.errno in (errno.ECONNREFUSED, errno.ECONNRESET, errno.EPIPE):
                 if reportErrors:
                     print >> sys.stderr, time.time()
                     print >> sys.stderr, "Client did not accept connection after earlier succesfull contact, assuming crash."
                 return None
             raise
 
+    def _doRequestOnce(self, url, method, headers, data):
+        self.request( url, method = method, headers = headers, body = data )
+        # Read the whole response, otherwise the connection can't be reused for the next request
+        return self._resp.read()
+
 def randomstring(l):
     res = ''
     for i in range(l):
@@ -240,7 +260,7 @@ def handler(_a,_b):
     # pylint: enable-msg=W0603
     going = False
 
-def interact(webport, metadirs, stopWhenSeeding):
+def interact(webport, metadirs, stopWhenSeeding, pollInterval):
     # pylint: disable-msg=W0603,W0602
     # Yes, that's global
     # And yes, it's not being assigned to. Yet.
@@ -248,12 +268,27 @@ def interact(webport, metadirs, stopWhenSeeding):
     # pylint: enable-msg=W0603,W0602
     torrentLoaded = False
     seedStopping = 0
+    seedKilled = False
     torrentCounter = 0
+    # One connection for all polls, kept alive by uTorrentConnection
+    conn = uTorrentConnection( webport )
+    # The torrent list as known so far, by hash, and the cache id it belongs to
+    torrents = {}
+    cid = None
+    nextPoll = time.time()
     while going:
-        time.sleep(1)
-        # Request status
-        conn = uTorrentConnection( webport )
-        page = conn.doRequest('/gui/?list=1', reportErrors = torrentLoaded)
+        # Poll on a fixed schedule, regardless of how long the previous poll took
+        nextPoll += pollInterval
+        delay = nextPoll - time.time()
+        if delay > 0:
+            time.sleep(delay)
+        else:
+            nextPoll = time.time()
+        # Request status; with a cache id the client only sends what changed since then
+        if cid is None:
+            page = conn.doRequest('/gui/?list=1', reportErrors = torrentLoaded)
+        else:
+            page = conn.doRequest('/gui/?list=1&cid={0}'.format( cid ), reportErrors = torrentLoaded)
         if page is None:
             if torrentLoaded:
                 break
@@ -271,7 +306,6 @@ def interact(webport, metadirs, stopWhenSeeding):
             break
         # Load torrents if this is the first contact
         if not torrentLoaded:
-            conn = uTorrentConnection( webport )
             torrentCounter = 0
             for d in metadirs:
                 torrentCounter += len([os.path.join(d, f) for f in os.listdir(d) if f[-8:] == '.torrent' and os.path.isfile(os.path.join(d,f))])
@@ -311,6 +345,9 @@ def interact(webport, metadirs, stopWhenSeeding):
             print >> sys.stderr, time.time()
             print >> sys.stderr, "Loaded {0} files".format(torrentCounter)
             torrentLoaded = True
+            # The status at hand predates the loading, so start from a complete list again on the next poll
+            cid = None
+            torrents = {}
         # Decode status
         try:
             status = json.loads( page )
@@ -320,23 +357,34 @@ def interact(webport, metadirs, stopWhenSeeding):
                 print >> sys.stderr, "Client reacted with invalid json string while earlier contact was succesfull."
                 break
             continue
+        if 'torrents' in status:
+            # Complete list
+            torrents = dict( (t[0], t) for t in status['torrents'] )
+        else:
+            # Incremental update: changed torrents and removed hashes
+            for t in status.get('torrentp', []):
+                torrents[t[0]] = t
+            for h in status.get('torrentm', []):
+                if h in torrents:
+                    del torrents[h]
+        cid = status.get('torrentc')
         stillBusy = torrentCounter
         uploadDone = 0
         downloadDone = 0
         percentDone = 0
-        for t in status['torrents']:
+        for t in torrents.itervalues():
             percentDone += t[4]
             if t[4] >= 1000:
                 stillBusy -= 1
             downloadDone += t[5]
             uploadDone += t[6]
         print time.time()
-        print >> sys.stderr, "DEBUG COUNT: {0}".format( len(status['torrents']) )
-        if len(status['torrents']) != torrentCounter:
-            print >> sys.stderr, "WARNING! Only {0} of {1} torrents seem to be loaded.".format( len(status['torrents']), torrentCounter )
+        print >> sys.stderr, "DEBUG COUNT: {0}".format( len(torrents) )
+        if len(torrents) != torrentCounter:
+            print >> sys.stderr, "WARNING! Only {0} of {1} torrents seem to be loaded.".format( len(torrents), torrentCounter )
         #for tor in status['torrents']:
         #    print >> sys.stderr, "DEBUG TORRENTS: ", tor 
-        if len(status['torrents']) == 0:
+        if len(torrents) == 0:
             print "0 0 0"
         else:
             print "{0} {1} {2}".format( percentDone / (torrentCounter * 10.0), downloadDone, uploadDone )
@@ -344,23 +392,17 @@ def interact(webport, metadirs, stopWhenSeeding):
             if seedStopping == 0:
                 print >> sys.stderr, time.time()
                 print >> sys.stderr, "Stopped when seeding"
-                seedStopping = 1
+                seedStopping = time.time()
                 # Stop the process
                 utorrent_process.terminate()
-            elif seedStopping <= 5:
-                # Give it some time (at least 1 sec per seedStopping increment, so at least 5 secs)
-                seedStopping += 1
-            elif seedStopping == 6:
-                # Not listening? Die, then.
+            elif not seedKilled and time.time() - seedStopping > 5:
+                # Not listening after 5 secs? Die, then.
                 utorrent_process.kill()
-                seedStopping += 1
-            elif seedStopping <= 10:
-                # Give it some time again
-                seedStopping += 1
-            else:
+                seedKilled = True
+            elif time.time() - seedStopping > 10:
                 # OK, we're outta here
                 print >> sys.stderr, time.time()
-                print >> sys.stderr, "Client did not die after 5 secs, giving up on it, anyway"
+                print >> sys.stderr, "Client did not die after 10 secs, giving up on it, anyway"
                 break
 
 def patchLinuxConfig(port, webport, workingDir, _, useDHT, nTorrents): # _ == clientDir
@@ -495,6 +537,14 @@ def mainFunction():
         metadirs.append( sys.argv[i] )
     for i in range(7+metaDirCount, 7+metaDirCount+dataDirCount):
         datadirs.append( sys.argv[i] )
+    pollInterval = 1.0
+    if len(sys.argv) > 7 + metaDirCount + dataDirCount:
+        try:
+            pollInterval = float(sys.argv[7 + metaDirCount + dataDirCount])
+        except ValueError:
+            pollInterval = 0
+        if pollInterval <= 0:
+            raise Exception( "pollInterval must be a positive number of seconds, not {0}".format( sys.argv[7 + metaDirCount + dataDirCount] ) )
     
     # Setup signal handling
     signal.signal( signal.SIGINT, handler )
@@ -597,7 +647,7 @@ def mainFunction():
         print >> sys.stderr, "Client started"
         
         # Start interaction with the client
-        interact(webport, metadirs, stopWhenSeeding)
+        interact(webport, metadirs, stopWhenSeeding, pollInterval)
     except Exception as e:
         print >> sys.stderr, e.__str__()
         print >> sys.stderr, traceback.format_exc()
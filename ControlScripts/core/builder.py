@@ -1,3 +1,8 @@
+import os
+import shutil
+import tempfile
+import hashlib
+import platform
 from subprocess import STDOUT
 from subprocess import PIPE
 from subprocess import Popen
@@ -44,12 +49,29 @@ class builder(coreObject):
         This default implementation does nothing if buildCommand(...) returns None.
         Otherwise it starts a local bash instance and gives the buildCommand(...) as input to that.
 
+        If the client has a build cache the build results are taken from the cache when the same sources have been
+        built before; see getBuildCacheEntry(...). Otherwise the build results are stored in the cache afterwards.
+
         @param  client      The client for which the sources are to be built locally.
         
         @return True iff the building was succesful.
         """
         buildCommand = self.buildCommand(client)
         if buildCommand:
+            cacheEntry = None
+            cacheFiles = self.getBuildCacheFiles(client)
+            if cacheFiles:
+                revision = client.sourceObj.localRevision( client, cacheFiles )
+                if revision:
+                    cacheEntry = self.getBuildCacheEntry( client, revision, platform.machine() )
+                    if os.path.isdir( cacheEntry ):
+                        print "Using cached build of client {0}".format( client.name )
+                        for f in cacheFiles:
+                            target = os.path.join( client.sourceObj.localLocation(client), f )
+                            if not os.path.exists( os.path.dirname( target ) ):
+                                os.makedirs( os.path.dirname( target ) )
+                            shutil.copy2( os.path.join( cacheEntry, f ), target )
+                        return True
             result = ''
             try:
                 if self.isInCleanup():
@@ -62,6 +84,8 @@ class builder(coreObject):
             except Exception:
                 Campaign.logger.log( result )
                 raise Exception( "Could not build client {0} locally using builder {1}".format( client.name, self.__class__.__name__ ) )
+            if cacheEntry:
+                self.storeBuild( cacheEntry, cacheFiles, lambda f, target: shutil.copy2( os.path.join( client.sourceObj.localLocation(client), f ), target ) )
         return True
     
     def buildRemote(self, client, host):
@@ -71,6 +95,10 @@ class builder(coreObject):
         This default implementation does nothing if buildCommand(...) returns None.
         Otherwise it sends the buildCommand(...) to the host.
 
+        If the client has a build cache the build results are uploaded from the cache when the same sources have
+        been built before for the same architecture; see getBuildCacheEntry(...). Otherwise the build results are
+        retrieved into the cache afterwards.
+
         @param  client      The client for which the sources are to be built remotely.
         @param  host        The remote host on which the source are to be built.
         
@@ -78,6 +106,22 @@ class builder(coreObject):
         """
         buildCommand = self.buildCommand(client)
         if buildCommand:
+            cacheEntry = None
+            cacheFiles = self.getBuildCacheFiles(client)
+            if cacheFiles:
+                revision = client.sourceObj.remoteRevision( client, host, cacheFiles )
+                if revision:
+                    cacheEntry = self.getBuildCacheEntry( client, revision, host.sendCommand( 'uname -m' ).splitlines()[-1] )
+                    if os.path.isdir( cacheEntry ):
+                        print "Using cached build of client {0} on host {1}".format( client.name, host.name )
+                        location = client.sourceObj.remoteLocation(client, host)
+                        host.sendCommand( 'mkdir -p {0}'.format( ' '.join( ['"{0}/{1}"'.format( location, os.path.dirname( f ) ) for f in cacheFiles] ) ) )
+                        for f in cacheFiles:
+                            host.sendFile( os.path.join( cacheEntry, f ), '{0}/{1}'.format( location, f ), True )
+                        executables = ['"{0}/{1}"'.format( location, f ) for f in cacheFiles if os.access( os.path.join( cacheEntry, f ), os.X_OK )]
+                        if len(executables) > 0:
+                            host.sendCommand( 'chmod +x {0}'.format( ' '.join( executables ) ) )
+                        return True
             result = ''
             try:
                 if self.isInCleanup():
@@ -89,8 +133,75 @@ class builder(coreObject):
             except Exception:
                 Campaign.logger.log( result )
                 raise Exception( "Could not build client {0} remotely on host {2} using builder {1}".format( client.name, self.__class__.__name__, host.name ) )
+            if cacheEntry:
+                self.storeBuild( cacheEntry, cacheFiles, lambda f, target: host.getFile( '{0}/{1}'.format( client.sourceObj.remoteLocation(client, host), f ), target, True ) )
         return True
 
+    def getBuildCacheFiles(self, client):
+        """
+        Returns the build results of the client that are kept in the build cache.
+
+        These are the source locations of the files in client.getSourceLayout().
+
+        @param  client      The client for which the sources are to be built.
+
+        @return The list of paths relative to the sources, or None if the build is not to be cached.
+        """
+        if not client.buildCacheDir or not client.getSourceLayout():
+            return None
+        files = [entry[0] for entry in client.getSourceLayout() if entry[0][-1:] != '/']
+        if len(files) == 0:
+            return None
+        return files
+
+    def getBuildCacheEntry(self, client, revision, arch):
+        """
+        Returns the directory in the build cache of the client where the results of a build are kept.
+
+        Builds are identified by the revision of the sources, the builder, the build command and the architecture
+        of the machine that builds.
+
+        @param  client      The client for which the sources are to be built.
+        @param  revision    The identification of the revision of the sources, as returned by the source object.
+        @param  arch        The architecture of the machine that builds, as reported by uname -m.
+
+        @return The path to the directory in the build cache.
+        """
+        key = hashlib.sha1( '\n'.join( [revision, self.__class__.__name__, self.buildCommand(client), arch] ) ).hexdigest()
+        return os.path.join( client.buildCacheDir, key )
+
+    def storeBuild(self, cacheEntry, cacheFiles, fetch):
+        """
+        Stores the results of a build in the build cache.
+
+        The files are collected in a temporary directory next to the entry, which is then renamed to the entry, so
+        an entry is either complete or not there at all.
+
+        @param  cacheEntry  The directory in the build cache as returned by getBuildCacheEntry(...).
+        @param  cacheFiles  The paths of the build results relative to the sources.
+        @param  fetch       Function fetch(f, target) that copies build result f to the local path target.
+        """
+        if not os.path.exists( os.path.dirname( cacheEntry ) ):
+            os.makedirs( os.path.dirname( cacheEntry ) )
+        tmpDir = tempfile.mkdtemp( dir = os.path.dirname( cacheEntry ) )
+        try:
+            for f in cacheFiles:
+                target = os.path.join( tmpDir, f )
+                if not os.path.exists( os.path.dirname( target ) ):
+                    os.makedirs( os.path.dirname( target ) )
+                fetch( f, target )
+            try:
+                os.rename( tmpDir, cacheEntry )
+                tmpDir = None
+            except OSError:
+                # Someone else stored the same build in the meantime
+                pass
+        except Exception as e:
+            Campaign.logger.log( "Warning! Could not store build in the build cache {0}: {1}".format( cacheEntry, e.__str__() ) )
+        finally:
+            if tmpDir:
+                shutil.rmtree( tmpDir, True )
+
     def getModuleType(self):
         """
         Return the moduleType string.
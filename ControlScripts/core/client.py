@@ -5,14 +5,184 @@ import threading
 import re
 import time
 import posixpath
+import tarfile
+import hashlib
 
-from core.parsing import isValidName
+from core.parsing import isValidName, isPositiveFloat
 from core.campaign import Campaign
 from core.coreObject import coreObject
 
 def parseError( msg ):
     raise Exception( "Parse error for client object on line {0}: {1}".format( Campaign.currentLineNumber, msg ) )
 
+# The version of the sources of the profiling sampler, see samplerVersion()
+_samplerVersion = None
+
+def samplerVersion():
+    """
+    Returns the version of the sources of the profiling sampler in Utils/procsampler.
+
+    Builds of the sampler on the hosts are kept per version, so a changed sampler is never mistaken for an old build.
+
+    @return The first 12 characters of the SHA-1 hash of procsampler.c.
+    """
+    global _samplerVersion
+    if _samplerVersion is None:
+        f = None
+        try:
+            f = open( os.path.join( Campaign.testEnvDir, 'Utils', 'procsampler', 'procsampler.c' ), 'rb' )
+            _samplerVersion = hashlib.sha1( f.read() ).hexdigest()[:12]
+        finally:
+            if f:
+                f.close()
+    return _samplerVersion
+
+# The batches of execution preparations that are being collected, by host; see prepareExecutions(...)
+executionBatches = {}
+
+def prepareExecutions( host, executions ):
+    """
+    Prepares all given executions on one host, batching the remote work.
+
+    Calls execution.client.prepareExecution(execution) for each of the executions. While doing so the directories to
+    be created, the linkDataIn targets to be validated and the client runner scripts to be uploaded are collected
+    instead of being handled one by one. Afterwards the runner scripts are sent in a single archive and all
+    directories and linkDataIn targets are handled with a single command.
+
+    @param  host        The host on which all executions run.
+    @param  executions  The list of executions to prepare.
+    """
+    batch = executionBatch( host )
+    executionBatches[host] = batch
+    try:
+        for execution in executions:
+            execution.client.prepareExecution( execution )
+    except Exception:
+        batch.discard()
+        raise
+    finally:
+        del executionBatches[host]
+    batch.flush()
+
+class executionBatch():
+    """
+    Collects the remote work needed to prepare the executions on one host.
+    """
+    
+    host = None                 # The host the executions run on
+    directories = None          # List of remote directories to be created
+    linkDataIns = None          # List of (remote directory, execution) tuples of linkDataIn targets to be validated
+    archivePath = None          # Path to the local archive with the files to be uploaded
+    archive = None              # The tarfile object of the archive, None if no files were added yet
+    
+    def __init__(self, host):
+        """
+        Initialization of an empty batch.
+        
+        @param  host        The host the executions run on.
+        """
+        self.host = host
+        self.directories = []
+        self.linkDataIns = []
+    
+    def addDirectories(self, directories):
+        """
+        Adds remote directories to be created.
+        
+        @param  directories     List of paths to remote directories.
+        """
+        for d in directories:
+            if d not in self.directories:
+                self.directories.append( d )
+    
+    def addLinkDataIn(self, linkDataIn, execution):
+        """
+        Adds a linkDataIn target to be validated and created if needed.
+        
+        @param  linkDataIn      The path to the remote directory.
+        @param  execution       The execution the target belongs to.
+        """
+        self.linkDataIns.append( (linkDataIn, execution) )
+    
+    def addFile(self, localPath, remotePath):
+        """
+        Adds a local file to be uploaded.
+        
+        Files can only be added if they are to be placed in the test directory of the host.
+        
+        @param  localPath       The path to the local file. It can be removed after this call.
+        @param  remotePath      The path to which the file is to be uploaded.
+        
+        @return True iff the file was added, False if it needs to be uploaded separately.
+        """
+        testDir = self.host.getTestDir()
+        if not testDir or not remotePath.startswith( testDir.rstrip( '/' ) + '/' ):
+            return False
+        if self.archive is None:
+            fd, self.archivePath = tempfile.mkstemp( '.tar.gz' )
+            os.close( fd )
+            self.archive = tarfile.open( self.archivePath, 'w:gz' )
+        self.archive.add( localPath, posixpath.relpath( remotePath, testDir ) )
+        return True
+    
+    def flushDirectories(self):
+        """
+        Creates the directories collected so far right away.
+
+        Use this before uploading a file separately, when addFile(...) returned False, since its directory may be
+        among those collected.
+        """
+        if len(self.directories) == 0:
+            return
+        res = self.host.sendCommand( 'mkdir -p {0} && echo "OK"'.format( ' '.join( ['"{0}"'.format( d ) for d in self.directories] ) ) )
+        if len(res.splitlines()) < 1 or res.splitlines()[-1] != 'OK':
+            raise Exception( "Creating the directories of the executions on host {0} failed. Response: {1}".format( self.host.name, res ) )
+        self.directories = []
+
+    def discard(self):
+        """
+        Throws away the collected work.
+        """
+        if self.archive is not None:
+            self.archive.close()
+            self.archive = None
+        if self.archivePath:
+            os.remove( self.archivePath )
+            self.archivePath = None
+    
+    def flush(self):
+        """
+        Does the collected remote work: one upload of the archive and one command.
+        """
+        commands = []
+        if len(self.directories) > 0:
+            commands.append( 'mkdir -p {0}'.format( ' '.join( ['"{0}"'.format( d ) for d in self.directories] ) ) )
+        for i in range(len(self.linkDataIns)):
+            commands.append( '( ([ -e "{0}" ] && (([ -d "{0}" ] && echo "LINK {1} D") || echo "LINK {1} E")) || (mkdir -p "{0}" && echo "LINK {1} D") )'.format( self.linkDataIns[i][0], i ) )
+        remoteArchive = None
+        try:
+            if self.archive is not None:
+                self.archive.close()
+                self.archive = None
+                remoteArchive = '{0}/executions.tar.gz'.format( self.host.getTestDir() )
+                self.host.sendFile( self.archivePath, remoteArchive, True )
+                commands.append( 'tar -xzf "{0}" -C "{1}" && rm -f "{0}"'.format( remoteArchive, self.host.getTestDir() ) )
+        finally:
+            self.discard()
+        if len(commands) == 0:
+            return
+        res = self.host.sendCommand( '{0} && echo "OK"'.format( ' && '.join( commands ) ) )
+        lines = res.splitlines()
+        if len(lines) < 1 or lines[-1] != 'OK':
+            raise Exception( "Preparing the executions on host {0} failed. Response: {1}".format( self.host.name, res ) )
+        for line in lines:
+            m = re.match( '^LINK ([0-9]+) ([DE])$', line )
+            if not m:
+                continue
+            linkDataIn, execution = self.linkDataIns[int(m.group( 1 ))]
+            if m.group( 2 ) != 'D':
+                raise Exception( 'linkDataIn for execution {2} client {1} is set to {0} but that already exists and is not a directory'.format( linkDataIn, execution.client.name, execution.getNumber() ) )
+
 class client(coreObject):
     """
     The parent class for all clients.
@@ -27,6 +197,8 @@ class client(coreObject):
     isRemote = False            # True iff the client source is on the remote host; this means either having the source available there or retrieving it from there
     location = None             # String with the path to the location of the client; meaning depends on the way the client is to be found
     builder = None              # String with the name of the builder module to use to build the source; None for precompiled binaries
+    buildCacheDir = None        # Path to a local directory in which build results are cached; None for no caching
+    sourceCacheDir = None       # Path to a local directory in which the source module may cache sources; None for no caching
     
     parsers = None              # List of strings with the names of the parser objects to use
 
@@ -38,10 +210,14 @@ class client(coreObject):
     pids_finished = {}          # Dictionary execution-number->True for those execution numbers that have already finished
     
     profile = False             # Flag to include external profiling code
+    profileInterval = None      # The time in seconds between two samples of the profiler
     logStart = False            # Flag to include logging of the starting time of the client on the remote host
     
     onHosts = None              # Temporary list of hosts where this client will run; do not use
 
+    remoteBuildHosts = None     # Dictionary from host to the host whose remote build it uses, for hosts sharing their filesystem; see setRemoteBuildHosts(...)
+    remoteBuilds = None         # Dictionary from host to True for the hosts on which the client has been built remotely
+
     # For more clarity: the way source, isRemote, location and builder work together is as follows.
     #
     # If isRemote is set, we first go to the remote host and work there.
@@ -68,6 +244,8 @@ class client(coreObject):
         self.pids = {}
         self.pids_finished = {}
         self.onHosts = []
+        self.remoteBuildHosts = {}
+        self.remoteBuilds = {}
 
     def parseSetting(self, key, value):
         """
@@ -115,6 +293,18 @@ class client(coreObject):
                 parseError( 'Builder name given is not a valid name: {0}'.format( value ) )
             __import__( 'modules.builder.'+value, globals(), locals(), value )
             self.builder = value
+        elif key == 'buildCache':
+            if self.buildCacheDir:
+                parseError( 'Build cache already set for client: {0}'.format( self.buildCacheDir ) )
+            if os.path.exists( value ) and not os.path.isdir( value ):
+                parseError( '{0} is not a directory'.format( value ) )
+            self.buildCacheDir = value
+        elif key == 'sourceCache':
+            if self.sourceCacheDir:
+                parseError( 'Source cache already set for client: {0}'.format( self.sourceCacheDir ) )
+            if os.path.exists( value ) and not os.path.isdir( value ):
+                parseError( '{0} is not a directory'.format( value ) )
+            self.sourceCacheDir = value
         elif key == 'source':
             if self.source:
                 parseError( 'Source already set for client: {0}'.format( self.source ) )
@@ -126,6 +316,12 @@ class client(coreObject):
             self.isRemote = ( value != '' )
         elif key == 'profile':
             self.profile = ( value != '' )
+        elif key == 'profileInterval':
+            if self.profileInterval is not None:
+                parseError( 'Profile interval already set for client: {0}'.format( self.profileInterval ) )
+            if not isPositiveFloat( value, True ):
+                parseError( 'The profile interval must be a positive, non-zero number of seconds' )
+            self.profileInterval = float(value)
         elif key == 'logStart':
             self.logStart = ( value != '' )
         else:
@@ -140,6 +336,12 @@ class client(coreObject):
 
         An Exception is raised in the case of insanity.
         """
+        if self.buildCacheDir and not self.builder:
+            raise Exception( "Client {0} has a build cache, but no builder. You've forgotten something.".format( self.name ) )
+        if self.profileInterval is None:
+            self.profileInterval = 1.0
+        elif not self.profile:
+            raise Exception( "Client {0} has a profile interval, but profiling is not enabled. You've forgotten something.".format( self.name ) )
         if self.name == '':
             if self.__class__.__name__ in self.scenario.getObjectsDict( 'client' ):
                 raise Exception( "Client object declared at line {0} was not given a name and default name {1} was already taken".format( self.declarationLine, self.__class__.__name__ ) )
@@ -281,42 +483,30 @@ class client(coreObject):
                     host.sendCommand( 'mkdir -p "{0}/{1}"'.format( self.getClientDir(host), entry ) )
         # Make sure client is uploaded/present
         if self.isRemote:
-            if self.builder:
-                # Only say we're compiling if a builder was given
-                print "Remotely compiling client {0}".format( self.name )
-            if not self.sourceObj.prepareRemote( self, host ):
-                if self.isInCleanup():
+            buildHost = host
+            if host in self.remoteBuildHosts:
+                buildHost = self.remoteBuildHosts[host]
+            error = None
+            if buildHost is not host:
+                # The host shares its filesystem with buildHost, so the build there can be used directly
+                if not self.buildRemotely( buildHost ):
                     return
-                raise Exception( "The source of client {0} could not be prepared remotely on host {1}".format( self.name, host.name ) )
-            if self.isInCleanup():
-                return
-            if not self.builderObj.buildRemote( self, host ):
                 if self.isInCleanup():
                     return
-                raise Exception( "A remote build of client {0} failed on host {1}".format( self.name, host.name ) )
-            # Check and shuffle files
-            if self.getBinaryLayout():
+                print "Reusing the remote build of client {0} on host {1} for host {2}".format( self.name, buildHost.name, host.name )
+                error = self.installRemoteBuild( host, self.sourceObj.remoteLocation( self, buildHost ) )
+                if error is not None:
+                    Campaign.logger.log( "Reusing the remote build of client {0} on host {1} failed for host {2}, building on that host instead: {3}".format( self.name, buildHost.name, host.name, error ) )
+            if buildHost is host or error is not None:
+                if not self.buildRemotely( host ):
+                    return
                 if self.isInCleanup():
                     return
-                if self.builder and self.getSourceLayout():
-                    for entry in self.getSourceLayout():
-                        if self.isInCleanup():
-                            return
-                        if self.sourceObj.remoteLocation( self, host ) == self.getClientDir(host) and entry[0] == entry[1]:
-                            res = host.sendCommand( '[ -f "{0}/{1}" ] && echo "OK"'.format( self.sourceObj.remoteLocation( self, host ), entry[0] ) )
-                        else:
-                            res = host.sendCommand( '[ -f "{0}/{1}" ] && cp "{0}/{1}" "{2}/{3}" && echo "OK"'.format( self.sourceObj.remoteLocation( self, host ), entry[0], self.getClientDir(host), entry[1] ) )
-                        if res != "OK":
-                            raise Exception( "Client {0} failed to prepare host {1}: checking for existence of file {2} after building and copying it to {3} (if needed) failed. Response: {4}.".format( self.name, host.name, entry[0], entry[1], res ) )
-                elif not self.builder:
-                    for entry in self.getBinaryLayout():
-                        if entry[-1:] == '/':
-                            continue
-                        if self.isInCleanup():
-                            return
-                        res = host.sendCommand( '[ -f "{0}/{1}" ] && echo "OK"'.format( self.sourceObj.remoteLocation( self, host ), entry ) )
-                        if res != "OK":
-                            raise Exception( "Client {0} failed to prepare host {1}: checking for existence of file {2} after preparing remotely failed. Response: {3}.".format( self.name, host.name, entry, res ) )
+                error = self.installRemoteBuild( host, self.sourceObj.remoteLocation( self, host ) )
+                if error is not None:
+                    raise Exception( error )
+            if self.isInCleanup():
+                return
         else:
             if self.getBinaryLayout():
                 if self.builder:
@@ -356,6 +546,130 @@ class client(coreObject):
                 raise Exception( "Client {0} has requested profiling, but a usable /proc seems not to be available on host {1}.".format( self.name, host.name ) )
             else:
                 raise Exception( "Client {0} has requested profiling, but a strange response was received when testing availability of /proc on host {1}: {2}".format( self.name, host.name, res ) )
+            # Make sure the sampler is available on the host; it is shared by all clients on the host
+            samplerDir = host.sendCommand( 'mkdir -p "{0}" && cd "{0}" && pwd'.format( self.getSamplerDir(host) ) ).splitlines()[-1]
+            # Stop a sampler left behind by an earlier run and forget its registrations
+            host.sendCommand( self.samplerResetCommand( samplerDir ) )
+            buildDir = '{0}/{1}'.format( samplerDir, samplerVersion() )
+            res = host.sendCommand( '[ -x "{0}/procsampler" ] && echo "OK" || echo "NO"'.format( buildDir ) )
+            if res.splitlines()[-1] != 'OK':
+                host.sendCommand( 'mkdir -p "{0}"'.format( buildDir ) )
+                host.sendFile( os.path.join( Campaign.testEnvDir, 'Utils', 'procsampler', 'procsampler.c' ), '{0}/procsampler.c'.format( buildDir ), True )
+                res = host.sendCommand( '( cd "{0}"; ( gcc -O2 procsampler.c -o procsampler -lrt || gcc -O2 procsampler.c -o procsampler ) && echo && echo "OK" )'.format( buildDir ) )
+                if len(res) < 2 or res[-2:] != "OK":
+                    raise Exception( "Client {0} has requested profiling, but the profiling sampler could not be built on host {1}. Response: {2}".format( self.name, host.name, res ) )
+
+    def setRemoteBuildHosts(self, groups):
+        """
+        Arranges for hosts that share their filesystem to use a single remote build of the client.
+
+        Of each group the first host that runs this client builds it; the other hosts of the group that run this
+        client use the results of that build.
+
+        @param  groups      List of lists of hosts that share their filesystem, as returned by core.host.getSharedFilesystemGroups(...).
+        """
+        self.remoteBuildHosts = {}
+        for group in groups:
+            members = [h for h in group if self in h.clients]
+            for h in members:
+                self.remoteBuildHosts[h] = members[0]
+
+    def buildRemotely(self, host):
+        """
+        Prepares the sources of the client on the host and builds them there, unless that was already done.
+
+        @param  host            The host on which to build the client.
+
+        @return True iff the client has been built on the host; False if this was interrupted by cleanup.
+        """
+        if host in self.remoteBuilds:
+            return True
+        if self.builder:
+            # Only say we're compiling if a builder was given
+            print "Remotely compiling client {0} on host {1}".format( self.name, host.name )
+        if not self.sourceObj.prepareRemote( self, host ):
+            if self.isInCleanup():
+                return False
+            raise Exception( "The source of client {0} could not be prepared remotely on host {1}".format( self.name, host.name ) )
+        if self.isInCleanup():
+            return False
+        if not self.builderObj.buildRemote( self, host ):
+            if self.isInCleanup():
+                return False
+            raise Exception( "A remote build of client {0} failed on host {1}".format( self.name, host.name ) )
+        self.remoteBuilds[host] = True
+        return True
+
+    def installRemoteBuild(self, host, sourceLocation):
+        """
+        Checks the results of a remote build and copies them into the client directory on the host, as needed.
+
+        @param  host            The host on which to install the client.
+        @param  sourceLocation  The remote path of the built sources, as seen from the host.
+
+        @return None on success, or a description of the problem otherwise.
+        """
+        if self.getBinaryLayout():
+            if self.isInCleanup():
+                return None
+            if self.builder and self.getSourceLayout():
+                for entry in self.getSourceLayout():
+                    if self.isInCleanup():
+                        return None
+                    if sourceLocation == self.getClientDir(host) and entry[0] == entry[1]:
+                        res = host.sendCommand( '[ -f "{0}/{1}" ] && echo "OK"'.format( sourceLocation, entry[0] ) )
+                    else:
+                        res = host.sendCommand( '[ -f "{0}/{1}" ] && cp "{0}/{1}" "{2}/{3}" && echo "OK"'.format( sourceLocation, entry[0], self.getClientDir(host), entry[1] ) )
+                    if res != "OK":
+                        return "Client {0} failed to prepare host {1}: checking for existence of file {2} after building and copying it to {3} (if needed) failed. Response: {4}.".format( self.name, host.name, entry[0], entry[1], res )
+            elif not self.builder:
+                for entry in self.getBinaryLayout():
+                    if entry[-1:] == '/':
+                        continue
+                    if self.isInCleanup():
+                        return None
+                    res = host.sendCommand( '[ -f "{0}/{1}" ] && echo "OK"'.format( sourceLocation, entry ) )
+                    if res != "OK":
+                        return "Client {0} failed to prepare host {1}: checking for existence of file {2} after preparing remotely failed. Response: {3}.".format( self.name, host.name, entry, res )
+        return None
+
+    def getSamplerDir(self, host):
+        """
+        Convenience function that constructs the path to the directory of the profiling sampler on the remote host.
+
+        The sampler is shared by all clients on the host, so this directory does not depend on the client. Since
+        the sampler can only sample the processes of the machine it runs on, while several hosts may share their
+        persistent test directory (such as the nodes of a DAS4 host), the directory is specific to the machine: the
+        path contains the shell expression $(uname -n) and is hence only to be used inside double quotes in commands
+        to the host. The sampler itself is built in the subdirectory named after samplerVersion().
+
+        During cleanup this may return None! 
+
+        @param  host            The remote host for to construct the path.
+
+        @return The path to the sampler directory on the remote host.
+        """
+        if host.getPersistentTestDir():
+            return "{0}/procsampler/$(uname -n)".format( host.getPersistentTestDir() )
+        return None
+
+    def samplerResetCommand(self, samplerDir):
+        """
+        Returns the command that stops the profiling sampler and removes its registrations.
+
+        The sampler is given a few seconds to exit; the lock of a sampler that has been killed is removed anyway.
+
+        @param  samplerDir      The path to the sampler directory on the remote host, see getSamplerDir(...).
+
+        @return The command to be sent to the host.
+        """
+        return ( 'if [ -d "{0}" ]; then '
+                    'if [ -d "{0}/running" ]; then '
+                        'touch "{0}/stop"; i=0; '
+                        'while [ -d "{0}/running" ] && [ $i -lt 50 ]; do sleep 0.1; i=$((i+1)); done; '
+                    'fi; '
+                    'rm -rf "{0}/stop" "{0}/register" "{0}/running"; '
+                'fi' ).format( samplerDir )
 
     def getClientDir(self, host, persistent = False):
         """
@@ -489,14 +803,22 @@ class client(coreObject):
         """
         if self.isInCleanup():
             return
+        batch = None
+        if execution.host in executionBatches:
+            batch = executionBatches[execution.host]
         # Create client/execution specific directories
-        execution.host.sendCommand( 'mkdir -p "{0}/clients/{2}/exec_{3}"; mkdir -p "{0}/logs/{2}/exec_{3}"; mkdir -p "{1}/clients/{2}/exec_{3}"; mkdir -p "{1}/logs/{2}/exec_{3}"'.format( execution.host.getTestDir(), execution.host.getPersistentTestDir(), self.name, execution.getNumber() ) )
+        if batch:
+            batch.addDirectories( ['{0}/{1}/{2}/exec_{3}'.format( d, sub, self.name, execution.getNumber() ) for d in [execution.host.getTestDir(), execution.host.getPersistentTestDir()] for sub in ['clients', 'logs']] )
+        else:
+            execution.host.sendCommand( 'mkdir -p "{0}/clients/{2}/exec_{3}"; mkdir -p "{0}/logs/{2}/exec_{3}"; mkdir -p "{1}/clients/{2}/exec_{3}"; mkdir -p "{1}/logs/{2}/exec_{3}"'.format( execution.host.getTestDir(), execution.host.getPersistentTestDir(), self.name, execution.getNumber() ) )
 
         prependCommands = ''
         if linkDataIn is not None:
             if simpleCommandLine is None and complexCommandLine is None:
                 raise Exception( "linkDataIn is set, but neither simpleCommandLine not complexCommandLine is set: error in calling code" )
-            if execution.isSeeder():
+            if execution.isSeeder() and batch:
+                batch.addLinkDataIn( linkDataIn, execution )
+            elif execution.isSeeder():
                 res = execution.host.sendCommand( '([ -e "{0}" ] && (([ -d "{0}" ] && echo "D") || echo "E")) || (mkdir -p "{0}" && echo "D")'.format( linkDataIn ) )
                 isDir = res.splitlines()[-1]
                 if isDir != 'D':
@@ -504,6 +826,7 @@ class client(coreObject):
                         raise Exception( 'linkDataIn for execution {2} client {1} is set to {0} but that already exists and is not a directory'.format( linkDataIn, self.name, execution.getNumber() ) )
                     else:
                         raise Exception( "Checking linkDataIn directory {0} for existence and creating if needed in execution {2} of client {3}; got unexpected response {1}".format( linkDataIn, res, execution.getNumber(), self.name ) )
+            if execution.isSeeder():
                 prependCommands = " ".join( ['mkdir -p "{0}";'.format(posixpath.join(linkDataIn, *d[1])) for d in execution.getDataDirTree()])
                 prependCommands += " ".join( ['ln "{0}" "{1}";'.format( posixpath.join(*d[0]), posixpath.join(linkDataIn, *d[1])) for d in execution.getDataFileTree()])
                 prependCommands += "\n"
@@ -555,15 +878,13 @@ class client(coreObject):
                     fileObj.write( '( {0} ) &\n'.format( complexCommandLine ) )
                 print ""
                 if self.profile:
+                    # Register the client with the sampler of the host and start the sampler if it isn't running yet
+                    samplerDir = self.getSamplerDir( execution.host )
                     fileObj.write( 'myPid=$!\n' )
                     fileObj.write( 'echo $myPid\n' )
-                    # FIXME: CLK_TCK is deprecated, but the linux kernel uses it for stats??? - needs sysconf(), really
-                    fileObj.write( '(getconf CLK_TCK 2>/dev/null || echo 100) >> {0}/cpu.log\n'.format( self.getExecutionLogDir(execution) ) )
-                    fileObj.write( '(while kill -0 $myPid > /dev/null 2> /dev/null; do ' )
-                    fileObj.write( 'date "+%y-%m-%d %H:%M:%S.%N" >> {0}/cpu.log; '.format( self.getExecutionLogDir(execution) ) )
-                    fileObj.write( 'cat /proc/$myPid/stat 2>&1 >> {0}/cpu.log; '.format( self.getExecutionLogDir(execution) ) )
-                    fileObj.write( 'ps -p $myPid -o vsz= -o rss= 2>&1 >> {0}/cpu.log; '.format( self.getExecutionLogDir(execution) ) )
-                    fileObj.write( 'sleep 1;  done) &\n' )
+                    fileObj.write( 'touch "{0}/cpu.log" "{0}/io.log" "{0}/net.log"\n'.format( self.getExecutionLogDir(execution) ) )
+                    fileObj.write( 'echo "$myPid {0} {1}" >> "{2}/register"\n'.format( self.profileInterval, self.getExecutionLogDir(execution), samplerDir ) )
+                    fileObj.write( 'mkdir "{0}/running" 2> /dev/null && ( "{0}/{1}/procsampler" "{0}" > "{0}/procsampler.log" 2>&1 < /dev/null & )\n'.format( samplerDir, samplerVersion() ) )
                 else:
                     fileObj.write( 'echo $!\n' )
                 fileObj.close()
@@ -572,7 +893,10 @@ class client(coreObject):
                 os.chmod( clientRunner, os.stat( clientRunner ).st_mode | stat.S_IXUSR )
                 if self.isInCleanup():
                     return
-                execution.host.sendFile( clientRunner, "{0}/clientRunnerScript".format( self.getExecutionClientDir( execution ) ) )
+                if not batch or not batch.addFile( clientRunner, "{0}/clientRunnerScript".format( self.getExecutionClientDir( execution ) ) ):
+                    if batch:
+                        batch.flushDirectories()
+                    execution.host.sendFile( clientRunner, "{0}/clientRunnerScript".format( self.getExecutionClientDir( execution ) ) )
             finally:
                 if fileObj:
                     fileObj.close()
@@ -581,7 +905,22 @@ class client(coreObject):
                 if clientRunner:
                     os.remove( clientRunner )
 
-    def start(self, execution):
+    def prepareExecutionDirectory(self, execution, path):
+        """
+        Makes sure a directory exists on the host of the execution before the execution is started.
+
+        Use this from prepareExecution(...) for extra directories the execution needs. When the executions of a host
+        are prepared together the directory is created along with the other directories of the executions.
+
+        @param  execution       The execution that needs the directory.
+        @param  path            The path to the directory on the remote host.
+        """
+        if execution.host in executionBatches:
+            executionBatches[execution.host].addDirectories( [path] )
+        else:
+            execution.host.sendCommand( 'mkdir -p "{0}"'.format( path ) )
+
+    def start(self, execution, startAt = None):
         """
         Run the client for the provided execution.
         
@@ -594,6 +933,10 @@ class client(coreObject):
         prepareExecution(...) or didn't provide a script in the location indicated by the documentation of
         prepareExecution(...), be sure to provide your own implementation.
 
+        If startAt is given the command is sent right away, but the remote host waits until its clock reaches
+        startAt before running the client runner script. The wait can be cancelled using cancelStart(...), in
+        which case the client is never started and no PID is saved.
+
         The PID of the running client will be saved in the dictionary self.pids, which is guarded by
         self.pid__lock
         
@@ -601,6 +944,7 @@ class client(coreObject):
         the command and once at the end.
 
         @param  execution       The execution this client is to be run for.
+        @param  startAt         The time, according to the clock of the remote host, at which to run the client, or None to run it right away.
         """
         try:
             self.pid__lock.acquire() 
@@ -619,9 +963,24 @@ class client(coreObject):
                 self.pid__lock.release()
             except RuntimeError:
                 pass
-        execution.host.sendCommandAsyncStart( '{0}/clientRunnerScript'.format( self.getExecutionClientDir( execution ) ), execution.getExecutionConnection() )
+        command = '{0}/clientRunnerScript'.format( self.getExecutionClientDir( execution ) )
+        if startAt is not None:
+            # Sleep once until the start time; the PID of the sleeper is recorded for cancelStart(...) to kill it
+            command = (
+                'd=$(awk -v t={1:.6f} -v n=$(date +%s.%N) \'BEGIN {{ d = t - n; if ( d < 0 ) d = 0; printf "%.6f", d }}\'); '
+                'sleep $d & '
+                'echo $! > "{0}/startSleeper"; '
+                '[ -e "{0}/cancelStart" ] && kill $! 2> /dev/null; '
+                'wait $!; '
+                'rm -f "{0}/startSleeper"; '
+                '[ -e "{0}/cancelStart" ] && echo "CANCELLED" || {2}'
+                ).format( self.getExecutionClientDir( execution ), startAt, command )
+        execution.host.sendCommandAsyncStart( command, execution.getExecutionConnection() )
         yield
         result = execution.host.sendCommandAsyncEnd( execution.getExecutionConnection() )
+        if startAt is not None and result.splitlines() and result.splitlines()[-1] == 'CANCELLED':
+            yield
+            return
         #result = execution.host.sendCommand( '{0}/clientRunnerScript'.format( self.getExecutionClientDir( execution ) ), execution.getRunnerConnection() )
         m = re.match( '^([0-9][0-9]*)', result )
         if not m:
@@ -636,6 +995,16 @@ class client(coreObject):
                 pass
         yield
     
+    def cancelStart(self, execution):
+        """
+        Cancels a start of the client for the provided execution that is waiting for its start time.
+
+        This only has effect on a start(...) that was given startAt and that has not run the client yet.
+
+        @param  execution       The execution for which the start is to be cancelled.
+        """
+        execution.host.sendCommand( 'touch "{0}/cancelStart"; [ -f "{0}/startSleeper" ] && kill $(cat "{0}/startSleeper") 2> /dev/null; true'.format( self.getExecutionClientDir( execution ) ) )
+
     def hasStarted(self, execution):
         """
         Returns whether the client has actually been started.
@@ -793,6 +1162,8 @@ class client(coreObject):
         if self.getExecutionLogDir(execution):
             if self.profile:
                 execution.host.getFile( '{0}/cpu.log'.format( self.getExecutionLogDir(execution) ), os.path.join( localLogDestination, 'cpu.log' ) )
+                execution.host.getFile( '{0}/io.log'.format( self.getExecutionLogDir(execution) ), os.path.join( localLogDestination, 'io.log' ) )
+                execution.host.getFile( '{0}/net.log'.format( self.getExecutionLogDir(execution) ), os.path.join( localLogDestination, 'net.log' ) )
             if self.logStart:
                 execution.host.getFile( '{0}/starttime.log'.format( self.getExecutionLogDir(execution) ), os.path.join( localLogDestination, 'starttime.log' ) )
 
@@ -808,6 +1179,8 @@ class client(coreObject):
         connection = True
         if reuseConnection:
             connection = reuseConnection
+        if self.profile and self.getSamplerDir(host):
+            host.sendCommand( self.samplerResetCommand( self.getSamplerDir(host) ), connection )
         if host.getTestDir() and host.getPersistentTestDir():
             host.sendCommand( 'rm -rf "{0}/clients/{2}" "{0}/logs/{2}" "{1}/clients/{2}" "{1}/logs/{2}"'.format( host.getTestDir(), host.getPersistentTestDir(), self.name ), connection )
         elif host.getTestDir():
@@ -996,6 +1369,19 @@ class client(coreObject):
         """
         return False
 
+    def hasSideServiceLogs(self):
+        """
+        Returns whether this client, if it is a side service, still has logs that are to be retrieved and parsed.
+
+        The executions of such side services remain ignored by processors and viewers, but their parsed logs
+        are available in the results like those of other executions.
+
+        The default implementation returns False.
+
+        @return     True iff the logs of this side service are to be retrieved and parsed.
+        """
+        return False
+
     @staticmethod
     def APIVersion():
         return "2.4.0-core"
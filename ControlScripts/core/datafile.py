@@ -0,0 +1,249 @@
+import os
+import re
+import sys
+import mmap
+import array
+
+# Columnar binary storage of parsed logs.
+#
+# Parsers write their parsed logs as whitespace separated text (.data files) with a header line naming the columns.
+# Next to every such file a columnar binary copy can be stored (a .cols file, e.g. log.data.cols next to log.data) from
+# which consumers can load whole columns as typed arrays without doing any work per line.
+#
+# The binary format is:
+# - a header of ASCII lines:
+#     #p2pcols 1 byteorder rows columns
+#   followed by one line per column:
+#     name typecode itemsize
+#   with byteorder either little or big, and typecode d for floats, l for integers and s for strings (space padded to
+#   itemsize bytes);
+# - NUL padding up to a multiple of 8 bytes;
+# - the data of each column in turn, rows * itemsize bytes each, padded with NUL up to a multiple of 8 bytes.
+#
+# Since each column is a contiguous, aligned array the file can be memory mapped as is.
+
+# Version of the binary format written by writeColumns(...)
+COLUMNS_VERSION = 1
+# Extension of the binary copy of a parsed log
+COLUMNS_EXTENSION = '.cols'
+
+_intRE = re.compile( '^[-+]?[0-9]+$' )
+
+def _align(n):
+    """
+    Returns n rounded up to a multiple of 8.
+    """
+    return ( n + 7 ) & ~7
+
+def _columnType(values):
+    """
+    Determines the type in which a column of values read from text is to be stored.
+
+    @param  values      The list of strings in the column, None for missing values.
+
+    @return 'l' if all values are integers, 'd' if all values are numbers (or missing) and 's' otherwise.
+    """
+    typecode = 'l'
+    for v in values:
+        if v is None:
+            if typecode == 'l':
+                typecode = 'd'
+            continue
+        if typecode == 'l' and _intRE.match( v ):
+            continue
+        try:
+            float(v)
+            typecode = 'd'
+        except ValueError:
+            return 's'
+    if typecode == 'l' and array.array('l').itemsize != 8:
+        # Integers are stored as 8 byte values; fall back to floats where longs are smaller
+        typecode = 'd'
+    return typecode
+
+def writeColumns(path, names, columns):
+    """
+    Writes columns of data to a columnar binary file.
+
+    @param  path        The path of the file to write.
+    @param  names       The list of names of the columns.
+    @param  columns     The list of columns, each an array.array of typecode 'd' or 'l', or a list of strings.
+                        All columns must have the same length.
+    """
+    if len(names) != len(columns):
+        raise Exception( "Can't write {0}: {1} names given for {2} columns".format( path, len(names), len(columns) ) )
+    rows = 0
+    if len(columns) > 0:
+        rows = len(columns[0])
+    header = '#p2pcols {0} {1} {2} {3}\n'.format( COLUMNS_VERSION, sys.byteorder, rows, len(columns) )
+    data = []
+    for name, column in zip( names, columns ):
+        if len(column) != rows:
+            raise Exception( "Can't write {0}: column {1} has {2} rows instead of {3}".format( path, name, len(column), rows ) )
+        if re.search( '\\s', name ) or name == '':
+            raise Exception( "Can't write {0}: invalid column name '{1}'".format( path, name ) )
+        if isinstance( column, array.array ):
+            if column.typecode not in ('d', 'l'):
+                raise Exception( "Can't write {0}: column {1} has unsupported typecode {2}".format( path, name, column.typecode ) )
+            header += '{0} {1} {2}\n'.format( name, column.typecode, column.itemsize )
+            data.append( column.tostring() )
+        else:
+            itemsize = max( [len(v) for v in column] + [1] )
+            header += '{0} s {1}\n'.format( name, itemsize )
+            data.append( ''.join( [v.ljust( itemsize ) for v in column] ) )
+    f = None
+    try:
+        f = open( path, 'wb' )
+        f.write( header.ljust( _align( len(header) ), '\0' ) )
+        for d in data:
+            f.write( d.ljust( _align( len(d) ), '\0' ) )
+    finally:
+        if f:
+            f.close()
+
+def loadColumns(path):
+    """
+    Loads all columns from a columnar binary file.
+
+    @param  path        The path of the file to load.
+
+    @return A tuple (names, columns) with names the list of names of the columns and columns a dictionary from name
+            to column; numeric columns are array.array objects, string columns are lists of strings.
+    """
+    f = None
+    m = None
+    try:
+        f = open( path, 'rb' )
+        if os.fstat( f.fileno() ).st_size == 0:
+            raise Exception( "Not a columnar data file: {0}".format( path ) )
+        m = mmap.mmap( f.fileno(), 0, access = mmap.ACCESS_READ )
+        values = m.readline().split()
+        if len(values) != 5 or values[0] != '#p2pcols':
+            raise Exception( "Not a columnar data file: {0}".format( path ) )
+        if values[1] != str(COLUMNS_VERSION):
+            raise Exception( "Unsupported columnar data file version {1} in {0}".format( path, values[1] ) )
+        byteorder = values[2]
+        rows = int(values[3])
+        specs = []
+        for _ in range( int(values[4]) ):
+            spec = m.readline().split()
+            if len(spec) != 3:
+                raise Exception( "Corrupt column header in {0}".format( path ) )
+            specs.append( ( spec[0], spec[1], int(spec[2]) ) )
+        offset = _align( m.tell() )
+        names = []
+        columns = {}
+        for name, typecode, itemsize in specs:
+            size = rows * itemsize
+            if offset + size > len(m):
+                raise Exception( "Columnar data file {0} is truncated".format( path ) )
+            if typecode == 's':
+                raw = m[offset:offset + size]
+                column = [raw[i:i + itemsize].rstrip( ' ' ) for i in range( 0, size, itemsize )]
+            else:
+                column = array.array( typecode )
+                if column.itemsize != itemsize:
+                    raise Exception( "Column {1} in {0} has items of {2} bytes, which this platform can't load".format( path, name, itemsize ) )
+                column.fromstring( m[offset:offset + size] )
+                if byteorder != sys.byteorder:
+                    column.byteswap()
+            names.append( name )
+            columns[name] = column
+            offset += _align( size )
+        return ( names, columns )
+    finally:
+        if m:
+            m.close()
+        if f:
+            f.close()
+
+def readDataFile(path):
+    """
+    Reads a parsed log in text form into columns.
+
+    The first line of the file names the columns. Values missing from a row are stored as NaN (or as an empty string
+    for string columns), values beyond the named columns are ignored.
+
+    @param  path        The path to the parsed log.
+
+    @return A tuple (names, columns) as returned by loadColumns(...).
+    """
+    f = None
+    try:
+        f = open( path, 'r' )
+        names = f.readline().split()
+        raw = [[] for _ in names]
+        for line in f:
+            values = line.split()
+            if len(values) == 0:
+                continue
+            for i in range( len(names) ):
+                if i < len(values):
+                    raw[i].append( values[i] )
+                else:
+                    raw[i].append( None )
+    finally:
+        if f:
+            f.close()
+    columns = {}
+    for name, values in zip( names, raw ):
+        typecode = _columnType( values )
+        if typecode == 's':
+            columns[name] = [v or '' for v in values]
+        elif typecode == 'l':
+            columns[name] = array.array( 'l', [int(v) for v in values] )
+        else:
+            columns[name] = array.array( 'd', [float(v) if v is not None else float('nan') for v in values] )
+    return ( names, columns )
+
+def convertDataFile(path):
+    """
+    Stores the columnar binary copy of a parsed log next to it.
+
+    @param  path        The path to the parsed log in text form.
+    """
+    names, columns = readDataFile( path )
+    writeColumns( path + COLUMNS_EXTENSION, names, [columns[name] for name in names] )
+
+def convertDataFiles(directory):
+    """
+    Stores the columnar binary copy of each parsed log (.data file) in a directory that is not up to date yet.
+
+    @param  directory   The path to the directory with the parsed logs.
+    """
+    for name in os.listdir( directory ):
+        path = os.path.join( directory, name )
+        if name[-5:] != '.data' or not os.path.isfile( path ):
+            continue
+        if hasCurrentColumns( path ):
+            continue
+        convertDataFile( path )
+
+def hasCurrentColumns(path):
+    """
+    Returns whether a parsed log has a columnar binary copy that is at least as recent as the parsed log itself.
+
+    @param  path        The path to the parsed log in text form.
+
+    @return True iff an up to date binary copy exists.
+    """
+    colsPath = path + COLUMNS_EXTENSION
+    if not os.path.isfile( colsPath ) or not os.path.isfile( path ):
+        return False
+    return os.path.getmtime( colsPath ) >= os.path.getmtime( path )
+
+def loadDataFile(path):
+    """
+    Loads the columns of a parsed log.
+
+    The columnar binary copy is used if it is up to date, otherwise the parsed log is read from its text form.
+
+    @param  path        The path to the parsed log in text form, e.g. .../parsedLogs/log.data.
+
+    @return A tuple (names, columns) as returned by loadColumns(...), or None if the parsed log does not exist.
+    """
+    if hasCurrentColumns( path ):
+        return loadColumns( path + COLUMNS_EXTENSION )
+    if not os.path.exists( path ):
+        return None
+    return readDataFile( path )
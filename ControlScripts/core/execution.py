@@ -1,6 +1,8 @@
 from core.parsing import isValidName, isPositiveFloat, isPositiveInt
 from core.campaign import Campaign
 from core.coreObject import coreObject
+from core.datafile import convertDataFiles
+from core.parser import runParserList
 
 def parseError( msg ):
     raise Exception( "Parse error for execution object on line {0}: {1}".format( Campaign.currentLineNumber, msg ) )
@@ -69,6 +71,7 @@ class execution(coreObject):
     # Yes, that's a warning below. That's OK, though.
     files = None                # The files array, consist of multiple file objects
     parsers = None              # The list of parser objects
+    parsedRemotely = False      # True iff the parsers that can reparse have already been run on the host, see core.remoteparsing
 
     seeder = False              # True iff this execution is a seeder
 
@@ -295,23 +298,43 @@ class execution(coreObject):
         """
         return execution.executionCount
 
+    def getParsers(self):
+        """
+        Returns the parsers for this execution.
+
+        These are the parsers given for the execution, or otherwise the default parsers of the client.
+
+        @return The list of parser objects.
+        """
+        # The parser loading has already been done
+        if self.parsers:
+            return self.parsers
+        return self.client.loadDefaultParsers(self)
+
     def runParsers(self, logDir, outputDir):
         """
         Runs all the parsers for this execution.
 
-        This method will choose the right parser and pass on the arguments.
+        This method will choose the right parser and pass on the arguments. The parsers are run in order, see
+        core.parser.runParserList(...): those that provide consumers for their logs (see parser.logConsumers(...)) are
+        run together, reading each raw log only once. Afterwards the columnar binary copies of the parsed logs are stored next to them, see
+        core.datafile.
+
+        If self.parsedRemotely is set, the parsers that can reparse are skipped: their parsed logs have already been
+        retrieved from the host.
 
         @param  logDir      The path to the directory on the local machine where the logs reside.
         @param  outputDir   The path to the directory on the local machine where the parsed logs are to be stored.
         """
-        # The parser loading has already been done
-        if self.parsers:
-            for parser in self.parsers:
-                parser.parseLogs( self, logDir, outputDir )
-        else:
-            p = self.client.loadDefaultParsers(self)
-            for parser in p:
-                parser.parseLogs(self, logDir, outputDir)
+        parsers = self.getParsers()
+        if self.parsedRemotely:
+            parsers = [p for p in parsers if not p.canReparse()]
+        runParserList( parsers, self, logDir, outputDir )
+        # Store the columnar binary copies of the parsed logs; the text forms remain usable if this fails
+        try:
+            convertDataFiles( outputDir )
+        except Exception as e:
+            Campaign.logger.log( "Warning! Could not store the columnar copies of the parsed logs of execution {0} of client {1}: {2}".format( self.getNumber(), self.client.name, e.__str__() ) )
 
     def getModuleType(self):
         """
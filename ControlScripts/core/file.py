@@ -322,6 +322,26 @@ class file(coreObject):
         """
         return None
     
+    def getDataDigests(self):
+        """
+        Returns the SHA1 digests of the data found in getFile(), as known locally.
+        
+        This is used to verify the integrity of the data on the seeding hosts after it has been sent to them.
+        The dictionary maps the path of each file relative to getFile(), as a tuple, to the hexadecimal SHA1 digest
+        of its contents. For a file object pointing to a single file the only key is the empty tuple.
+        
+        E.g. a file that points to a directory called Videos containing generic.avi and Humor/humor1.avi would return
+            {
+                ('generic.avi',): 'da39a3ee5e6b4b0d3255bfef95601890afd80709',
+                ('Humor', 'humor1.avi'): '2fd4e1c67a2d28fced849ee1bb76e7391b93eb12'
+            }
+        
+        The default implementation returns None, signalling the digests are not known and the data can't be verified.
+        
+        @return    A dictionary of digests, or None.
+        """
+        return None
+
     def getDataDir(self, host):
         """
         Returns the path to the directory containing the files on the remote seeding host.
@@ -24,6 +24,83 @@ def checkSpeedValue( value, speedName ):
         parseError( '{1} should be a positive integer, possibly postfixed by kbit or mbit (default: mbit), found "{0}"'.format( origValue, speedName ) )
     return value
 
+def sendCommandToHosts( commands ):
+    """
+    Sends a command to each of a number of hosts and waits for all of them to finish.
+
+    The commands are started asynchronously on a new connection to each host, so they run on all hosts concurrently.
+
+    @param  commands    Dictionary from host object to the command to be sent to that host.
+
+    @return Dictionary from host object to the result of the command.
+    """
+    connections = {}
+    results = {}
+    try:
+        for h in commands:
+            connections[h] = h.setupNewConnection()
+            h.sendCommandAsyncStart( commands[h], connections[h] )
+        for h in commands:
+            results[h] = h.sendCommandAsyncEnd( connections[h] )
+    finally:
+        for h in connections:
+            if h not in results:
+                try:
+                    h.sendCommandAsyncEnd( connections[h] )
+                except Exception:
+                    pass
+            h.closeConnection( connections[h] )
+    return results
+
+def getSharedFilesystemGroups( hosts ):
+    """
+    Finds out which hosts share the filesystem their test directories are on and have the same architecture.
+
+    Each host writes a probe file with a unique token to its test directory, after which each host reports which
+    of the tokens it can see, along with its architecture (uname -m). Both steps are done on all hosts concurrently.
+
+    @param  hosts       The hosts to probe.
+
+    @return List of lists of hosts; the hosts in each list share their filesystem and architecture. The hosts keep the order in which they were given.
+    """
+    hosts = list(hosts)
+    if len(hosts) < 2:
+        return [[h] for h in hosts]
+    tokens = {}
+    probes = {}
+    for h in hosts:
+        tokens[h] = 'FSPROBE-{0}'.format( os.urandom( 8 ).encode( 'hex' ) )
+        probes[h] = '{0}/.fsprobe'.format( h.getTestDir() )
+    owners = dict( [(tokens[h], h) for h in hosts] )
+    sendCommandToHosts( dict( [(h, 'echo "{0}" > "{1}"'.format( tokens[h], probes[h] )) for h in hosts] ) )
+    try:
+        check = 'uname -m; {0}'.format( '; '.join( ['cat "{0}" 2> /dev/null'.format( probes[h] ) for h in hosts] ) )
+        results = sendCommandToHosts( dict( [(h, check) for h in hosts] ) )
+    finally:
+        sendCommandToHosts( dict( [(h, 'rm -f "{0}"'.format( probes[h] )) for h in hosts] ) )
+    # Hosts that see each other's probes share a filesystem; join their groups
+    group = dict( [(h, [h]) for h in hosts] )
+    arch = {}
+    for h in hosts:
+        lines = results[h].splitlines()
+        arch[h] = lines[0] if lines else ''
+        for line in lines[1:]:
+            other = owners.get( line.strip() )
+            if other is None or group[other] is group[h]:
+                continue
+            merged = group[h] + group[other]
+            for m in merged:
+                group[m] = merged
+    groups = []
+    for h in hosts:
+        if h in [m for g in groups for m in g]:
+            continue
+        members = [m for m in hosts if m in group[h]]
+        # Only hosts with the same architecture can share builds
+        for a in sorted( set( [arch[m] for m in members] ) ):
+            groups.append( [m for m in members if arch[m] == a] )
+    return groups
+
 class connectionObject():
     """
     The parent class for all connection objects.
@@ -276,6 +353,10 @@ class host(coreObject):
     files = None                # List of files that are to be used on this host. Will be filled when all executions are known.
     seedingFiles = None         # List of files that are to be seeded from this host. Will be filled when all executions are known.
 
+    clockOffset = None          # Float, the measured offset in seconds of the clock of the remote host relative to the local clock, None if not measured yet
+    clockRTT = None             # Float, the round trip time in seconds of the exchange clockOffset was measured with, None if not measured yet
+    clockMeasurements = None    # List of (localTime, offset, rtt) tuples, one for each time the clock offset was measured
+
     def __init__(self, scenario):
         """
         Initialization of a generic module object.
@@ -290,6 +371,7 @@ class host(coreObject):
         self.clients = []
         self.files = []
         self.seedingFiles = []
+        self.clockMeasurements = []
     
     def copyhost(self, other):
         """
@@ -893,6 +975,50 @@ class host(coreObject):
             self.connections__lock.release()
     # pylint: enable-msg=W0221
 
+    def measureClockOffset(self, samples = 5, reuseConnection = True):
+        """
+        Measures the offset of the clock of the remote host relative to the local clock.
+
+        The remote clock is read a number of times over the connection. For each exchange the remote time is
+        assumed to have been read halfway the round trip, as NTP does; the exchange with the smallest round trip
+        time is the most accurate and is the one that is kept.
+
+        The result is stored in self.clockOffset and self.clockRTT and is added to self.clockMeasurements.
+
+        @param  samples             The number of exchanges to do.
+        @param  reuseConnection     True for commands that are shortlived or are expected not to be parallel with other commands.
+                                    False to build a new connection for this command and use that.
+                                    A specific connection object as obtained through setupNewConnection(...) to reuse that connection.
+
+        @return A tuple (offset, rtt) in seconds; the remote time is the local time plus offset.
+        """
+        best = None
+        for _ in range( 0, samples ):
+            before = time.time()
+            res = self.sendCommand( 'date +%s.%N', reuseConnection )
+            after = time.time()
+            try:
+                remoteTime = float( res.splitlines()[-1] )
+            except (ValueError, IndexError):
+                raise Exception( "Could not read the clock of host {0}, got: {1}".format( self.name, res ) )
+            if best is None or after - before < best[2]:
+                best = ( ( before + after ) / 2, remoteTime - ( before + after ) / 2, after - before )
+        self.clockMeasurements.append( best )
+        self.clockOffset, self.clockRTT = best[1:]
+        return best[1:]
+
+    def getClockOffset(self):
+        """
+        Returns the offset of the clock of the remote host relative to the local clock.
+
+        The offset is measured using measureClockOffset() if that hasn't been done yet.
+
+        @return The offset in seconds; the remote time is the local time plus offset.
+        """
+        if self.clockOffset is None:
+            self.measureClockOffset()
+        return self.clockOffset
+
     def getTestDir(self):
         """
         Returns the path to the directory on the remote host where (temporary) files are stored for the testing
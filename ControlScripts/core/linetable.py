@@ -0,0 +1,239 @@
+import re
+
+# Declarative parsing of line based raw logs.
+#
+# Most parsers turn a raw log into a single data file by looking at each line of the log, matching it against a few
+# patterns and writing a row of output for some of those lines. A lineTable captures that once: the parser declares
+# the columns of its output and a table of rules, each rule being a regular expression, the extractors for its fields
+# and the action to run when a line matches it. All patterns are compiled into a single expression, so each line is
+# matched only once, and the output is written in batches while the log is read.
+#
+# A lineTable does not read the log itself: consume(...) returns a consumer for core.parser.streamLogs(...), which
+# feeds it the log in batches of lines. This is what parser.logConsumers(...) is for.
+#
+# Actions are named methods of the object passed to consume(...), typically the parser object itself, and are
+# called as
+#     handler.action(state, field1, field2, ...)
+# with state a lineState object holding whatever the actions need to keep between lines for the log being parsed.
+# An action returns either None or a sequence with one value per column, which is then written as a row.
+#
+# The lines of a log are tried against the rules in the order in which they were added; only the first rule that
+# matches is applied. Patterns are matched at the start of the line, like re.match(...), and may contain unnamed groups
+# only.
+
+class lineState:
+    """
+    The state kept by the actions of a lineTable while parsing a single log.
+
+    Any keyword arguments given on initialization are set as attributes.
+    """
+
+    def __init__(self, **kwargs):
+        """
+        Initialization of a state object.
+
+        @param  kwargs      The initial attributes of the state.
+        """
+        self.__dict__.update( kwargs )
+
+class lineTable:
+    """
+    A table of line patterns and their actions, used to parse a raw log into a data file.
+    """
+
+    columns = None          # The list of names of the output columns
+    initialRows = None      # The list of rows written directly after the header
+    rules = None            # The list of rules as (pattern, action, fields, split, items)
+    rowFormat = None        # The format string for a single row of output
+
+    dispatcher = None       # The compiled combination of the patterns of all rules
+    ruleIndex = None        # Dictionary from the group in dispatcher of each rule to (group, count, action, converters, splitter, items)
+
+    def __init__(self, columns, initialRows = None):
+        """
+        Initialization of a table.
+
+        @param  columns         The list of names of the output columns.
+        @param  initialRows     The list of rows to write before any parsed row, each a sequence with one value per column.
+        """
+        self.columns = columns
+        self.initialRows = initialRows or []
+        self.rules = []
+        self.rowFormat = ' '.join( ['{' + str(i) + '}' for i in range( len(columns) )] ) + '\n'
+
+    def addRule(self, pattern, action, fields = None, split = None, items = None):
+        """
+        Adds a rule to the table.
+
+        By default the fields passed to the action are the groups of the pattern. If split is given the fields are
+        taken from the line split by that expression instead, at the indices listed in items.
+
+        @param  pattern         The regular expression to match lines against, without named groups.
+        @param  action          The name of the method of the handler to call for matching lines.
+        @param  fields          A list of extractors, one for each field, each a callable that converts the text of
+                                the field to its value, or None to pass the text as is. Leave out to pass all fields as
+                                text.
+        @param  split           A regular expression to split matching lines by.
+        @param  items           The indices of the fields to take from the split line; required iff split is given.
+        """
+        if self.dispatcher is not None:
+            raise Exception( "Can't add a rule to a lineTable that has already been used" )
+        if ( split is None ) != ( items is None ):
+            raise Exception( "A rule of a lineTable needs both split and items, or neither" )
+        if re.search( '\\(\\?P', pattern ):
+            raise Exception( "Pattern {0} of a lineTable rule contains a named group".format( pattern ) )
+        self.rules.append( ( pattern, action, fields, split, items ) )
+
+    def compile(self):
+        """
+        Compiles the patterns of all rules into a single expression.
+
+        This is done automatically the first time the table is used.
+        """
+        if self.dispatcher is not None:
+            return
+        if len(self.rules) == 0:
+            raise Exception( "A lineTable needs at least one rule" )
+        index = {}
+        parts = []
+        group = 1
+        for pattern, action, fields, split, items in self.rules:
+            groups = re.compile( pattern ).groups
+            splitter = None
+            count = groups
+            if split is not None:
+                splitter = re.compile( split )
+                count = len(items)
+            if fields is not None and len(fields) != count:
+                raise Exception( "Rule {0} of a lineTable has {1} fields, but {2} extractors".format( pattern, count, len(fields) ) )
+            converters = None
+            if fields is not None:
+                # Only the fields with an extractor need converting
+                converters = [( i, f ) for i, f in enumerate( fields ) if f is not None]
+            index[group] = ( group, count, action, converters, splitter, items )
+            parts.append( '(' + pattern + ')' )
+            group += groups + 1
+        # Tables are shared by parsers in several threads, which skip compiling once dispatcher is set: the index
+        # must be in place by then
+        self.ruleIndex = index
+        self.dispatcher = re.compile( '(?:' + '|'.join( parts ) + ')' )
+
+    def header(self):
+        """
+        Returns the start of the output: the header line naming the columns, followed by the initial rows.
+
+        @return The header and initial rows, formatted.
+        """
+        return ' '.join( self.columns ) + '\n' + ''.join( [self.rowFormat.format( *row ) for row in self.initialRows] )
+
+    def parseLines(self, lines, handler, state):
+        """
+        Parses a batch of lines.
+
+        @param  lines       The list of lines to parse.
+        @param  handler     The object whose methods are the actions of the rules.
+        @param  state       The lineState object for the log being parsed.
+
+        @return The list of output rows, formatted.
+        """
+        self.compile()
+        match = self.dispatcher.match
+        rowFormat = self.rowFormat
+        index = {}
+        for group, ( offset, count, action, converters, splitter, items ) in self.ruleIndex.iteritems():
+            index[group] = ( offset, offset + count, getattr( handler, action ), converters, splitter, items )
+        out = []
+        for line in lines:
+            m = match( line )
+            if not m:
+                continue
+            start, end, action, converters, splitter, items = index[m.lastindex]
+            if splitter:
+                parts = splitter.split( line )
+                values = [parts[i] for i in items]
+            else:
+                values = m.groups()[start:end]
+            if converters:
+                values = list( values )
+                for i, f in converters:
+                    values[i] = f( values[i] )
+            row = action( state, *values )
+            if row is not None:
+                out.append( rowFormat.format( *row ) )
+        return out
+
+    def consume(self, datafile, handler, state):
+        """
+        Returns a consumer that parses a raw log into a data file, to be fed by core.parser.streamLogs(...).
+
+        @param  datafile    The path to the data file to write.
+        @param  handler     The object whose methods are the actions of the rules.
+        @param  state       The lineState object for the log being parsed.
+
+        @return The consumer, a generator.
+        """
+        fd = None
+        try:
+            fd = open( datafile, 'w' )
+            fd.write( self.header() )
+            lines = yield
+            while lines is not None:
+                fd.writelines( self.parseLines( lines, handler, state ) )
+                lines = yield
+        finally:
+            if fd:
+                fd.close()
+
+def counterDelta(state, name, value, monotonic = False):
+    """
+    Returns the increase of a cumulative counter since its previous reading.
+
+    The previous reading is kept in the attribute name of state, which is set to the new reading. It must be
+    initialized, typically to 0.
+
+    @param  state       The lineState object to keep the reading in.
+    @param  name        The name of the attribute of state to keep the reading in.
+    @param  value       The new reading of the counter.
+    @param  monotonic   Set to True to treat a reading lower than the previous one as equal to it.
+
+    @return The difference between value and the previous reading.
+    """
+    previous = getattr( state, name )
+    if monotonic and value < previous:
+        value = previous
+    setattr( state, name, value )
+    return value - previous
+
+def rate(amount, interval):
+    """
+    Returns the rate in kB/s of a number of bytes transferred in a given interval.
+
+    @param  amount      The number of bytes.
+    @param  interval    The length of the interval in seconds.
+
+    @return The rate in kB/s.
+    """
+    return amount / ( 1024.0 * interval )
+
+def kilobytes(value):
+    """
+    Converts a number of bytes, as text or as a number, to kB.
+
+    Can be used as a field extractor.
+
+    @param  value       The number of bytes; integer only if given as text.
+
+    @return The number of kB.
+    """
+    return int(value) / 1024.0
+
+def percentage(part, whole):
+    """
+    Returns part as a percentage of whole.
+
+    @param  part        The part.
+    @param  whole       The whole, not 0.
+
+    @return The percentage.
+    """
+    return 100.0 * ( float(part) / float(whole) )
@@ -0,0 +1,307 @@
+import os
+import zlib
+
+# Compressed storage of raw logs.
+#
+# Raw logs can be stored compressed: log.log is then replaced by log.log.gz, a gzip file that can be read by any gzip
+# tool, together with log.log.gz.gzi, an index into it. openLog(...) opens a raw log in either form, so parsers read
+# compressed and plain logs alike.
+#
+# The gzip file consists of a separate gzip member for each block of blockSize bytes of the log, which allows reading
+# to start at the member containing any given offset. The index has a line for each member:
+#     offset compressedOffset
+# with offset the offset in the log of the first byte of the member and compressedOffset the offset of the member in
+# the gzip file.
+
+# Extension of a compressed raw log
+COMPRESSED_EXTENSION = '.gz'
+# Extension of the index of a compressed raw log, appended to the name of the compressed log
+INDEX_EXTENSION = '.gzi'
+
+# Number of bytes of a raw log that are compressed into a single gzip member
+blockSize = 1024 * 1024
+
+# Number of compressed bytes that are read at once
+_readSize = 256 * 1024
+
+def _gzipMember(data, level):
+    """
+    Returns data compressed into a single gzip member.
+    """
+    compressor = zlib.compressobj( level, zlib.DEFLATED, 16 + zlib.MAX_WBITS )
+    return compressor.compress( data ) + compressor.flush()
+
+def compressLog(path, level = 6, destination = None):
+    """
+    Replaces a raw log by its compressed form and index.
+
+    The original is removed only once the compressed log and its index have been written completely.
+
+    @param  path        The path to the raw log.
+    @param  level       The zlib compression level, 1 (fastest) to 9 (smallest).
+    @param  destination The path in plain form at which to store the compressed log instead, e.g. .../raw/log.log for
+                        .../raw/log.log.gz. The original is kept in that case.
+    """
+    if destination is None:
+        destination = path
+    gzPath = destination + COMPRESSED_EXTENSION
+    indexPath = gzPath + INDEX_EXTENSION
+    fl = None
+    fc = None
+    fi = None
+    try:
+        fl = open( path, 'rb' )
+        fc = open( gzPath + '.tmp', 'wb' )
+        fi = open( indexPath + '.tmp', 'w' )
+        offset = 0
+        compressedOffset = 0
+        while True:
+            data = fl.read( blockSize )
+            if not data and offset > 0:
+                break
+            member = _gzipMember( data, level )
+            fc.write( member )
+            fi.write( "{0} {1}\n".format( offset, compressedOffset ) )
+            offset += len(data)
+            compressedOffset += len(member)
+            if not data:
+                break
+    finally:
+        for f in [fi, fc, fl]:
+            try:
+                if f:
+                    f.close()
+            except Exception:
+                pass
+    os.rename( gzPath + '.tmp', gzPath )
+    os.rename( indexPath + '.tmp', indexPath )
+    if destination == path:
+        os.remove( path )
+
+def compressLogs(directory, level = 6):
+    """
+    Compresses all raw logs in a directory and its subdirectories that are not compressed yet.
+
+    @param  directory   The path to the directory with the raw logs.
+    @param  level       The zlib compression level, 1 (fastest) to 9 (smallest).
+    """
+    for root, _, files in os.walk( directory ):
+        for name in files:
+            if name[-len(COMPRESSED_EXTENSION):] == COMPRESSED_EXTENSION or name[-len(INDEX_EXTENSION):] == INDEX_EXTENSION or name[-4:] == '.tmp':
+                continue
+            compressLog( os.path.join( root, name ), level )
+
+def logExists(path):
+    """
+    Returns whether a raw log exists, in plain or compressed form.
+
+    @param  path        The path to the raw log in plain form, e.g. .../logs/log.log.
+
+    @return True iff the raw log exists as a file.
+    """
+    return os.path.isfile( path ) or os.path.isfile( path + COMPRESSED_EXTENSION )
+
+def openLog(path, offset = 0):
+    """
+    Opens a raw log for reading, in plain or compressed form.
+
+    @param  path        The path to the raw log in plain form, e.g. .../logs/log.log.
+    @param  offset      The offset in the log to start reading at.
+
+    @return A file-like object that supports read(...), readline(), readlines(...), iteration over the lines, seek(...),
+            tell() and close().
+    """
+    if os.path.isfile( path ) or not os.path.isfile( path + COMPRESSED_EXTENSION ):
+        f = open( path, 'r' )
+        if offset:
+            f.seek( offset )
+        return f
+    return compressedLog( path + COMPRESSED_EXTENSION, offset )
+
+class compressedLog:
+    """
+    A compressed raw log opened for reading, see openLog(...).
+
+    Any gzip file can be read; the index only serves to seek quickly.
+    """
+
+    fileObject = None       # The gzip file
+    index = None            # The list of tuples (offset, compressedOffset) from the index, or None without index
+    decompressor = None     # The zlib decompressor for the current gzip member
+    buf = ''                # The part of the log that has been decompressed
+    pos = 0                 # The offset in buf of the first byte not yet returned
+    bufOffset = 0           # The offset in the log of the first byte of buf
+    eof = False             # True iff the whole gzip file has been decompressed
+
+    def __init__(self, path, offset = 0):
+        """
+        Initialization of a compressed log.
+
+        @param  path        The path to the gzip file.
+        @param  offset      The offset in the log to start reading at.
+        """
+        self.fileObject = open( path, 'rb' )
+        self.index = self.loadIndex( path + INDEX_EXTENSION )
+        self.seek( offset )
+
+    def seek(self, offset):
+        """
+        Continues reading at the given offset in the log.
+
+        With an index reading restarts at the gzip member containing offset, otherwise at the start of the log.
+
+        @param  offset      The offset in the log.
+        """
+        start = ( 0, 0 )
+        if self.index:
+            start = [entry for entry in self.index if entry[0] <= offset][-1]
+        self.fileObject.seek( start[1] )
+        self.decompressor = zlib.decompressobj( 16 + zlib.MAX_WBITS )
+        self.buf = ''
+        self.pos = 0
+        self.bufOffset = start[0]
+        self.eof = False
+        skip = offset - start[0]
+        while skip > 0:
+            skipped = len(self.read( min( skip, blockSize ) ))
+            if skipped == 0:
+                break
+            skip -= skipped
+
+    def tell(self):
+        """
+        Returns the offset in the log of the next byte to be read.
+
+        @return The offset.
+        """
+        return self.bufOffset + self.pos
+
+    def loadIndex(self, path):
+        """
+        Loads the index of the gzip file.
+
+        @param  path        The path to the index.
+
+        @return The list of tuples (offset, compressedOffset), or None if there is no index.
+        """
+        if not os.path.isfile( path ):
+            return None
+        f = None
+        try:
+            f = open( path, 'r' )
+            return [tuple( [int(v) for v in line.split()] ) for line in f if line.strip() != '']
+        finally:
+            if f:
+                f.close()
+
+    def fill(self, size):
+        """
+        Decompresses until at least size bytes are available or the whole log has been decompressed.
+
+        @param  size        The number of bytes needed, or -1 for all.
+        """
+        pieces = [self.buf[self.pos:]]
+        available = len(pieces[0])
+        self.bufOffset += self.pos
+        while ( size < 0 or available < size ) and not self.eof:
+            if self.decompressor.unused_data:
+                # The previous gzip member has ended; the data after it starts the next one
+                data = self.decompressor.unused_data
+                self.decompressor = zlib.decompressobj( 16 + zlib.MAX_WBITS )
+            else:
+                data = self.fileObject.read( _readSize )
+                if not data:
+                    self.eof = True
+                    data = self.decompressor.flush()
+                    pieces.append( data )
+                    available += len(data)
+                    break
+            data = self.decompressor.decompress( data )
+            pieces.append( data )
+            available += len(data)
+        self.buf = ''.join( pieces )
+        self.pos = 0
+
+    def read(self, size = -1):
+        """
+        Reads from the log.
+
+        @param  size        The maximum number of bytes to read, or -1 to read all that is left.
+
+        @return The data read; an empty string at the end of the log.
+        """
+        if size < 0 or len(self.buf) - self.pos < size:
+            self.fill( size )
+        if size < 0:
+            size = len(self.buf) - self.pos
+        data = self.buf[self.pos:self.pos + size]
+        self.pos += len(data)
+        return data
+
+    def readline(self):
+        """
+        Reads a single line from the log.
+
+        @return The line, including the newline if any; an empty string at the end of the log.
+        """
+        end = self.buf.find( '\n', self.pos )
+        while end < 0 and not self.eof:
+            self.fill( len(self.buf) - self.pos + _readSize )
+            end = self.buf.find( '\n', self.pos )
+        if end < 0:
+            end = len(self.buf) - 1
+        line = self.buf[self.pos:end + 1]
+        self.pos = end + 1
+        return line
+
+    def readlines(self, sizehint = 0):
+        """
+        Reads lines from the log.
+
+        @param  sizehint    Read whole lines totalling approximately sizehint bytes, or all lines if 0.
+
+        @return The list of lines; an empty list at the end of the log.
+        """
+        if sizehint <= 0:
+            self.fill( -1 )
+        elif len(self.buf) - self.pos < sizehint:
+            self.fill( sizehint )
+        end = self.buf.rfind( '\n', self.pos )
+        while end < 0 and not self.eof:
+            # A line longer than sizehint
+            self.fill( len(self.buf) - self.pos + _readSize )
+            end = self.buf.rfind( '\n', self.pos )
+        if self.eof:
+            # Everything that is left, including a last line without newline
+            end = len(self.buf) - 1
+        if end < self.pos:
+            return []
+        lines = self.buf[self.pos:end + 1].split( '\n' )
+        self.pos = end + 1
+        last = lines.pop()
+        lines = [line + '\n' for line in lines]
+        if last != '':
+            lines.append( last )
+        return lines
+
+    def __iter__(self):
+        return self
+
+    def next(self):
+        """
+        Returns the next line of the log, for iteration.
+        """
+        line = self.readline()
+        if line == '':
+            raise StopIteration
+        return line
+
+    def close(self):
+        """
+        Closes the log.
+        """
+        if self.fileObject:
+            self.fileObject.close()
+            self.fileObject = None
+        self.buf = ''
+        self.pos = 0
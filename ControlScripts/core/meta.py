@@ -1,6 +1,7 @@
 import os
 import math
 import hashlib
+import pickle
 
 import external.bencode
 
@@ -17,7 +18,9 @@ def buildFileList( path, subdirs = [] ):
         return reduce(lambda x,y: x+y, map(lambda x: buildFileList(path, subdirs+[x]), os.listdir(fullpath)))
 # pylint: enable-msg=W0102,W0142,W0141
 
-def buildPieces( path, fileList_, blocksize ):
+def buildPieces( path, fileList_, blocksize, hashCache = None ):
+    if hashCache is not None:
+        return buildPiecesCached( path, fileList_, blocksize, hashCache )
     fileList = list(fileList_)
     pieces = ''
     leftToRead = blocksize
@@ -41,6 +44,126 @@ def buildPieces( path, fileList_, blocksize ):
         pieces += h.digest()
     return pieces
 
+def fileSignature( path ):
+    """
+    Returns the signature of a local file as used for keying hash caches.
+
+    A file whose signature did not change is assumed to have unchanged contents.
+
+    @param  path    The path to the file.
+
+    @return The tuple (absolute path, size, mtime, inode).
+    """
+    st = os.stat( path )
+    return ( os.path.abspath( path ), st.st_size, st.st_mtime, st.st_ino )
+
+def pruneHashCache( hashCache, signatures ):
+    """
+    Removes all entries from a hash cache for files that are in signatures, but under an outdated signature.
+
+    @param  hashCache   The hash cache, a dictionary from file signature to a dictionary of cached digests.
+    @param  signatures  The list of current file signatures.
+    """
+    current = {}
+    for sig in signatures:
+        current[sig[0]] = sig
+    for sig in hashCache.keys():
+        if sig[0] in current and current[sig[0]] != sig:
+            del hashCache[sig]
+
+def pruneUnusedPieces( hashCache, path, signatures, used ):
+    """
+    Removes the entries from a hash cache that the pieces of the files under path no longer need.
+
+    Dropped are the entries for files under path that are not among signatures and the piece digests of the other
+    files under path that are not in used. Other cached digests of those files, such as root hashes, are kept.
+
+    @param  hashCache   The hash cache, a dictionary from file signature to a dictionary of cached digests.
+    @param  path        The path to the file or directory the pieces were built for.
+    @param  signatures  The list of current file signatures of the files under path.
+    @param  used        The set of tuples (file signature, key) of the piece digests used for the current pieces.
+    """
+    root = os.path.abspath( path )
+    current = set( signatures )
+    for sig in hashCache.keys():
+        if sig[0] != root and not sig[0].startswith( root + os.sep ):
+            continue
+        if sig not in current:
+            del hashCache[sig]
+            continue
+        fileCache = hashCache[sig]
+        for key in fileCache.keys():
+            if key[0] == 'piece' and ( sig, key ) not in used:
+                del fileCache[key]
+        if len(fileCache) == 0:
+            del hashCache[sig]
+
+def buildPiecesCached( path, fileList, blocksize, hashCache ):
+    """
+    Implementation of buildPieces(...) that uses and fills a per-file hash cache.
+
+    Each piece is described by the segments of files it consists of. A segment is identified by the signature of
+    its file and its offset and length inside that file, so a piece whose segments all come from unchanged files
+    is taken from the cache and only pieces touched by changed files are read and hashed again. The cached digest
+    of a piece is stored with the signature of the file of its first segment.
+
+    Afterwards the piece digests that are not used by the current layout are removed from the cache, as are all
+    entries for files under path that are no longer there, so the cache doesn't grow as the files change.
+    """
+    sigs = [fileSignature( os.path.join( path, *(f['path']) ) ) for f in fileList]
+    pruneHashCache( hashCache, sigs )
+    # Cut the concatenation of all files into pieces of segments (fileIndex, offset, length)
+    layout = []
+    piece = []
+    leftInPiece = blocksize
+    for index in range( len(fileList) ):
+        offset = 0
+        length = fileList[index]['length']
+        while offset < length:
+            take = min( leftInPiece, length - offset )
+            piece.append( (index, offset, take) )
+            offset += take
+            leftInPiece -= take
+            if leftInPiece == 0:
+                layout.append( piece )
+                piece = []
+                leftInPiece = blocksize
+    if len(piece) > 0:
+        layout.append( piece )
+    pieces = []
+    reused = 0
+    used = set()
+    f = None
+    fIndex = -1
+    try:
+        for piece in layout:
+            first = piece[0]
+            key = ( 'piece', first[1], first[2], tuple( [( sigs[s[0]], s[1], s[2] ) for s in piece[1:]] ) )
+            fileCache = hashCache.setdefault( sigs[first[0]], {} )
+            used.add( ( sigs[first[0]], key ) )
+            if key in fileCache:
+                pieces.append( fileCache[key] )
+                reused += 1
+                continue
+            h = hashlib.new( 'sha1' )
+            for index, offset, length in piece:
+                if index != fIndex:
+                    if f:
+                        f.close()
+                    f = open( os.path.join( path, *(fileList[index]['path']) ), 'rb' )
+                    fIndex = index
+                f.seek( offset )
+                h.update( f.read( length ) )
+            fileCache[key] = h.digest()
+            pieces.append( fileCache[key] )
+    finally:
+        if f:
+            f.close()
+    pruneUnusedPieces( hashCache, path, sigs, used )
+    if len(layout) > 0:
+        print "Reused {0} out of {1} cached piece hashes for {2}".format( reused, len(layout), path )
+    return ''.join( pieces )
+
 class meta:
     """
     A fully static class with a number of methods to help you build
@@ -54,7 +177,7 @@ class meta:
         raise Exception( "Do not instantiate" )
 
     @staticmethod
-    def calculateMerkleRootHash( path, compact = False, blocksize = 1 ):
+    def calculateMerkleRootHash( path, compact = False, blocksize = 1, hashCache = None ):
         """
         Calculates the Merkle root hash for a file.
 
@@ -101,6 +224,9 @@ class meta:
         @param  path        The path to the file to calculate the root hash for.
         @param  compact     True iff the compact hash calculation is to be used.
         @param  blocksize   The blocksize to use in kilobytes (default: 1).
+        @param  hashCache   A hash cache dictionary as used by meta.loadHashCache(...), or None to not use a cache.
+                            A root hash found in the cache for the unchanged file is returned directly, a calculated
+                            one is added to the cache.
 
         @return The binary string containing the root hash, which is an SHA1 hash.
         """
@@ -113,6 +239,15 @@ class meta:
         if not os.path.isfile( path ):
             raise ValueError( "path must point to a file" )
 
+        if hashCache is not None:
+            sig = fileSignature( path )
+            pruneHashCache( hashCache, [sig] )
+            fileCache = hashCache.setdefault( sig, {} )
+            key = ( 'merkle', compact, blocksize )
+            if key not in fileCache:
+                fileCache[key] = meta.calculateMerkleRootHash( path, compact, blocksize )
+            return fileCache[key]
+
         if compact:
             st = os.stat( path )
             size = math.ceil( st.st_size / ( 1024.0 * blocksize ) )
@@ -171,7 +306,7 @@ class meta:
         return h
 
     @staticmethod
-    def generateTorrentFile( path, torrentPath, blocksize = 1024 * 1024, name = None, announce = 'http://127.0.0.1/announce', nodes = None, httpSeeds = None, URIList = None, private = False ):
+    def generateTorrentFile( path, torrentPath, blocksize = 1024 * 1024, name = None, announce = 'http://127.0.0.1/announce', nodes = None, httpSeeds = None, URIList = None, private = False, hashCache = None ):
         """
         Creates a .torrent file for the given path.
 
@@ -198,6 +333,11 @@ class meta:
         A private torrent can be created by setting private to True. The private key will
         be added as specified in specification BEP-0027.
 
+        Giving a hash cache allows reusing the piece hashes of files that have not changed
+        since the cache was filled. Only the pieces that contain data of changed files are
+        read and hashed again, which makes regenerating torrents for large, mostly unchanged
+        directories cheap.
+
         @param  path        The file or directory to create a torrent for. All files in a
                             directory will be included recursively.
         @param  torrentPath The file to save the torrent file to. Either an existing file
@@ -214,6 +354,7 @@ class meta:
         @param  httpSeeds   A list of HTTP seed scripts, or None.
         @param  URIList     A list of HTTP or FTP URIs for extra seeds, or None.
         @param  private     True for a private torrent.
+        @param  hashCache   A hash cache dictionary as used by meta.loadHashCache(...), or None to not use a cache.
         """
         # A torrent file is just a bencoded dictionary.
         #
@@ -345,10 +486,10 @@ class meta:
         if os.path.isfile( path ):
             st = os.stat( path )
             infodict['length'] = st.st_size
-            infodict['pieces'] = buildPieces( path, [{'length': st.st_size, 'path': []}], blocksize )
+            infodict['pieces'] = buildPieces( path, [{'length': st.st_size, 'path': []}], blocksize, hashCache )
         else:
             infodict['files'] = buildFileList( path )
-            infodict['pieces'] = buildPieces( path, infodict['files'], blocksize )
+            infodict['pieces'] = buildPieces( path, infodict['files'], blocksize, hashCache )
         torrent['info'] = infodict
 
         torrentFileContent = external.bencode.bencode( torrent )
@@ -356,6 +497,82 @@ class meta:
         f.write( torrentFileContent )
         f.close()
 
+    @staticmethod
+    def calculateFileDigests( path, hashCache = None ):
+        """
+        Calculates the SHA1 digest of the contents of each file in a local file or directory.
+
+        @param  path        The path to the file or directory.
+        @param  hashCache   Optional hash cache dictionary as returned by loadHashCache(...). Digests of files with an
+                            unchanged signature are taken from the cache, new digests are added to it.
+
+        @return A dictionary from the path of each file relative to path, as a tuple, to the hexadecimal SHA1 digest of
+                its contents. If path is a file, the only key is the empty tuple.
+        """
+        digests = {}
+        for entry in buildFileList( path ):
+            filePath = os.path.join( path, *entry['path'] )
+            sig = None
+            if hashCache is not None:
+                sig = fileSignature( filePath )
+                pruneHashCache( hashCache, [sig] )
+                if sig in hashCache and ('sha1',) in hashCache[sig]:
+                    digests[tuple(entry['path'])] = hashCache[sig][('sha1',)]
+                    continue
+            h = hashlib.new( 'sha1' )
+            f = open( filePath, 'rb' )
+            try:
+                data = f.read( 1024 * 1024 )
+                while data:
+                    h.update( data )
+                    data = f.read( 1024 * 1024 )
+            finally:
+                f.close()
+            digests[tuple(entry['path'])] = h.hexdigest()
+            if sig is not None:
+                if sig not in hashCache:
+                    hashCache[sig] = {}
+                hashCache[sig][('sha1',)] = digests[tuple(entry['path'])]
+        return digests
+
+    @staticmethod
+    def loadHashCache( cachePath ):
+        """
+        Loads a hash cache from a local file.
+
+        A hash cache is a dictionary from file signatures (absolute path, size, mtime, inode) to dictionaries of
+        digests calculated for those files. It can be passed to calculateMerkleRootHash(...) and
+        generateTorrentFile(...) to prevent recalculating digests of files that have not changed.
+
+        @param  cachePath   The path to the cache file, which is a pickled dictionary. May not exist.
+
+        @return The hash cache dictionary; an empty dictionary if cachePath does not exist.
+        """
+        if not os.path.exists( cachePath ):
+            return {}
+        f = open( cachePath, 'rb' )
+        try:
+            hashCache = pickle.load( f )
+        finally:
+            f.close()
+        if type(hashCache) != dict:
+            raise Exception( "Hash cache file {0} does not contain a map. Type of unpickled object: {1}".format( cachePath, type(hashCache) ) )
+        return hashCache
+
+    @staticmethod
+    def saveHashCache( cachePath, hashCache ):
+        """
+        Saves a hash cache to a local file.
+
+        @param  cachePath   The path to the cache file, which will be overwritten.
+        @param  hashCache   The hash cache dictionary to save.
+        """
+        f = open( cachePath, 'wb' )
+        try:
+            pickle.dump( hashCache, f, pickle.HIGHEST_PROTOCOL )
+        finally:
+            f.close()
+
     @staticmethod
     def APIVersion():
         return "2.4.0-core"
@@ -1,10 +1,125 @@
+import os
+import traceback
+
 from core.parsing import isValidName
 from core.campaign import Campaign
 from core.coreObject import coreObject
+from core.logfile import logExists, openLog
 
 def parseError( msg ):
     raise Exception( "Parse error for parser object on line {0}: {1}".format( Campaign.currentLineNumber, msg ) )
 
+# Number of bytes of a raw log that are read at once by streamLogs(...)
+logBatchSize = 1024 * 1024
+
+def streamLogs( logDir, consumerSets, errors = None ):
+    """
+    Reads raw logs and feeds them to all consumers interested in them, reading each log only once.
+
+    A consumer is a generator, as returned in the dictionaries from parser.logConsumers(...). It is started once
+    its log is about to be read, after which each batch of lines read from the log is sent to it. The end of the log
+    is signalled by sending None, after which the consumer should finish.
+
+    @param  logDir          The path to the directory on the local machine where the logs reside.
+    @param  consumerSets    A list of tuples (owner, consumers), with consumers a dictionary from the name of a log,
+                            relative to logDir, to the consumer of that log and owner the object that returned them.
+    @param  errors          None to stop and raise the exception as soon as any consumer fails. Otherwise a list to
+                            which a tuple (owner, exception, traceback) is appended for each consumer that fails, after
+                            which the other consumers are fed on.
+    """
+    logs = {}
+    for owner, consumers in consumerSets:
+        for name, consumer in consumers.iteritems():
+            if name not in logs:
+                logs[name] = []
+            logs[name].append( ( owner, consumer ) )
+    try:
+        for name in sorted( logs ):
+            fl = None
+            try:
+                try:
+                    fl = openLog( os.path.join( logDir, name ) )
+                except IOError as e:
+                    if errors is None:
+                        raise
+                    for owner, _ in logs[name]:
+                        errors.append( ( owner, e, traceback.format_exc() ) )
+                    continue
+                # Sending None to the consumers first starts them
+                live = _sendToConsumers( logs[name], None, errors )
+                while live:
+                    lines = fl.readlines( logBatchSize )
+                    if not lines:
+                        _sendToConsumers( live, None, errors )
+                        break
+                    live = _sendToConsumers( live, lines, errors )
+            finally:
+                if fl:
+                    fl.close()
+    finally:
+        # Consumers that failed, misbehaved or were never reached still get to clean up after themselves
+        for name in logs:
+            for _, consumer in logs[name]:
+                consumer.close()
+
+def _sendToConsumers( consumers, lines, errors ):
+    """
+    Internal method of streamLogs(...): sends one value to each of a list of consumers.
+
+    @param  consumers       The list of tuples (owner, consumer).
+    @param  lines           The value to send.
+    @param  errors          See streamLogs(...).
+
+    @return The list of tuples (owner, consumer) for the consumers that are ready to receive more.
+    """
+    live = []
+    for owner, consumer in consumers:
+        try:
+            consumer.send( lines )
+        except StopIteration:
+            continue
+        except Exception as e:
+            if errors is None:
+                raise
+            errors.append( ( owner, e, traceback.format_exc() ) )
+            continue
+        live.append( ( owner, consumer ) )
+    return live
+
+def runParserList( parsers, execution, logDir, outputDir, errors = None ):
+    """
+    Runs parsers on the logs of an execution, in the order given.
+
+    The parsers that provide consumers for their logs (see parser.logConsumers(...)) are fed together by
+    streamLogs(...), reading each raw log only once. Before a parser that parses its logs itself is run, the consumers
+    of the parsers before it are fed, so every parser finds the parsed logs of the parsers before it.
+
+    @param  parsers         The list of parser objects, in order.
+    @param  execution       The execution object.
+    @param  logDir          The path to the directory on the local machine where the logs reside.
+    @param  outputDir       The path to the directory on the local machine where the parsed logs are to be stored.
+    @param  errors          None to stop and raise the exception as soon as any parser fails. Otherwise a list to
+                            which a tuple (parser, exception, traceback) is appended for each parser that fails, after
+                            which the other parsers are run on; see streamLogs(...).
+    """
+    consumerSets = []
+    for p in parsers:
+        try:
+            consumers = p.logConsumers( execution, logDir, outputDir )
+            if consumers is None:
+                if consumerSets:
+                    pending = consumerSets
+                    consumerSets = []
+                    streamLogs( logDir, pending, errors )
+                p.parseLogs( execution, logDir, outputDir )
+            else:
+                consumerSets.append( ( p, consumers ) )
+        except Exception as e:
+            if errors is None:
+                raise
+            errors.append( ( p, e, traceback.format_exc() ) )
+    streamLogs( logDir, consumerSets, errors )
+
 class parser(coreObject):
     """
     The parent class for all parsers.
@@ -13,6 +128,8 @@ class parser(coreObject):
     When subclassing parser be sure to use the skeleton class as a basis: it saves you a lot of time.
     """
 
+    settings = None         # The list of (key, value) tuples of the settings given to this parser, in order
+
     def __init__(self, scenario):
         """
         Initialization of a generic parser object.
@@ -20,6 +137,7 @@ class parser(coreObject):
         @param  scenario        The ScenarioRunner object this parser object is part of.
         """
         coreObject.__init__(self, scenario)
+        self.settings = []
 
     def parseSetting(self, key, value):
         """
@@ -80,15 +198,100 @@ class parser(coreObject):
 
         Be sure to document in the header of your module which logs you expect to be present and with which filename.
 
-        Subclassers must override this method.
+        Subclassers must override either this method or logConsumers(...). The default implementation streams the
+        logs to the consumers returned by logConsumers(...).
+
+        @param  execution   The execution for which to parse the logs.
+        @param  logDir      The path to the directory on the local machine where the logs reside.
+        @param  outputDir   The path to the directory on the local machine where the parsed logs are to be stored.
+        """
+        consumers = self.logConsumers( execution, logDir, outputDir )
+        if consumers is None:
+            raise Exception( "Not implemented" )
+        streamLogs( logDir, [( self, consumers )] )
+
+    def logConsumers(self, execution, logDir, outputDir):
+        """
+        Returns the consumers that parse the logs for the current execution while they are being read.
+
+        Parsers that implement this leave reading their raw logs to the core, which can then read each log only once
+        for all parsers of an execution. See streamLogs(...) for how consumers are fed; a consumer typically writes
+        its parsed log as it goes. Any checks on the logs and the parsed logs should be done before returning.
+
+        The default implementation returns None: the parser reads its own logs in parseLogs(...).
 
         @param  execution   The execution for which to parse the logs.
         @param  logDir      The path to the directory on the local machine where the logs reside.
         @param  outputDir   The path to the directory on the local machine where the parsed logs are to be stored.
+
+        @return None, or a dictionary from the name of each raw log, relative to logDir, to its consumer.
         """
-        raise Exception( "Not implemented" )
+        return None
     # pylint: enable-msg=W0613
 
+    def loadClockAlignment(self, logDir):
+        """
+        Loads the clock measurements stored with the raw logs of an execution in clock.log.
+
+        The result can be passed to toScenarioTime(...) to convert times read on the host of the execution to times
+        relative to the start of the scenario.
+
+        @param  logDir      The path to the directory on the local machine where the logs reside.
+
+        @return A tuple (epoch, measurements) with measurements a list of (localTime, offset, rtt) tuples, or None if no clock measurements are available.
+        """
+        clockfile = os.path.join( logDir, 'clock.log' )
+        if not logExists( clockfile ):
+            return None
+        epoch = None
+        measurements = []
+        f = None
+        try:
+            f = openLog( clockfile )
+            for line in f:
+                values = line.split()
+                if len(values) == 3 and values[0] == '#clock':
+                    if values[1] != '1':
+                        raise Exception( "Unsupported clock log version in {0}: {1}".format( clockfile, line.strip() ) )
+                    epoch = float(values[2])
+                elif len(values) == 3:
+                    measurements.append( ( float(values[0]), float(values[1]), float(values[2]) ) )
+        finally:
+            if f:
+                f.close()
+        if epoch is None or len(measurements) == 0:
+            return None
+        measurements.sort()
+        return ( epoch, measurements )
+
+    def toScenarioTime(self, alignment, remoteTime):
+        """
+        Converts a time read on the host of an execution to the time in seconds since the start of the scenario.
+
+        The clock offset at the given time is interpolated linearly between the surrounding measurements, which
+        corrects for the drift of the clock of the host during the scenario.
+
+        @param  alignment   The alignment as returned by loadClockAlignment(...).
+        @param  remoteTime  The time on the clock of the host of the execution, in seconds since the UNIX epoch.
+
+        @return The time in seconds since the start of the scenario, according to the local clock.
+        """
+        epoch, measurements = alignment
+        before = measurements[0]
+        after = measurements[-1]
+        for measurement in measurements:
+            if measurement[0] + measurement[1] <= remoteTime:
+                before = measurement
+            else:
+                after = measurement
+                break
+        if after[0] <= before[0]:
+            offset = before[1]
+        else:
+            fraction = ( remoteTime - before[1] - before[0] ) / ( after[0] - before[0] )
+            offset = before[1] + min( max( fraction, 0.0 ), 1.0 ) * ( after[1] - before[1] )
+        return remoteTime - offset - epoch
+
     def getModuleType(self):
         """
         Return the moduleType string.
@@ -128,7 +331,7 @@ class parser(coreObject):
             - execution.client is available but incomplete
                 - execution.client.name is available and reads '__reparse__'
                 - execution.client.isSideService() is available
-                    - returns True unless any log exists for the execution
+                    - returns True if the execution was a side service or no log exists for it
             - execution.timeout is available and 0.0 unless the data was saved using processor:savetimeout
             - execution.isSeeder() is available and False unless the data was saved using processor:isSeeder (and this was a seeder)
             - execution.host is available but limited 
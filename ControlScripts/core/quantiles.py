@@ -0,0 +1,141 @@
+import math
+
+# Streaming quantile estimation.
+#
+# A quantileSketch summarizes a stream of values in a single pass and in little memory, after which any quantile of
+# the values can be estimated. Values are counted in buckets whose bounds grow geometrically: bucket i holds the
+# values in (gamma^(i-1), gamma^i], with gamma = (1 + accuracy) / (1 - accuracy). Every estimate is then within the
+# relative accuracy of a value that actually has the requested rank, however skewed the values are. Negative values
+# are counted in buckets of their own and values very close to 0 are counted as 0. Values that are not finite, which
+# parsed logs may contain, are ignored.
+#
+# Sketches with the same accuracy can be merged, e.g. to combine the sketches of several executions.
+
+# Values with an absolute value below this are counted as 0
+_zeroThreshold = 1e-9
+
+class quantileSketch:
+    """
+    A sketch of a stream of values from which quantiles can be estimated.
+    """
+
+    accuracy = 0.01         # The relative accuracy of the estimates
+    logGamma = None         # The natural logarithm of the growth factor of the buckets
+    positive = None         # Dictionary from bucket index to the number of positive values in it
+    negative = None         # Dictionary from bucket index to the number of negative values in it, by absolute value
+    zeroCount = 0           # The number of values counted as 0
+    count = 0               # The total number of values
+    minimum = None          # The smallest value, None if there are no values
+    maximum = None          # The largest value, None if there are no values
+
+    def __init__(self, accuracy = 0.01):
+        """
+        Initialization of an empty sketch.
+
+        @param  accuracy    The relative accuracy of the estimates, between 0 and 1.
+        """
+        if not 0 < accuracy < 1:
+            raise Exception( "The relative accuracy of a quantile sketch should be between 0 and 1, not {0}".format( accuracy ) )
+        self.accuracy = accuracy
+        self.logGamma = math.log( ( 1 + accuracy ) / ( 1 - accuracy ) )
+        self.positive = {}
+        self.negative = {}
+        self.zeroCount = 0
+        self.count = 0
+        self.minimum = None
+        self.maximum = None
+
+    def add(self, value):
+        """
+        Adds a single value to the sketch. Values that are not finite (NaN or infinite) are ignored.
+
+        @param  value       The value.
+        """
+        self.addAll( [value] )
+
+    def addAll(self, values):
+        """
+        Adds a sequence of values to the sketch, such as a column loaded through core.datafile. Values that are not
+        finite (NaN or infinite) are ignored.
+
+        @param  values      The sequence of values.
+        """
+        positive = self.positive
+        negative = self.negative
+        logGamma = self.logGamma
+        log = math.log
+        ceil = math.ceil
+        minimum = self.minimum
+        maximum = self.maximum
+        count = 0
+        zeroCount = 0
+        for value in values:
+            # Both NaN and infinite values give NaN here
+            if value - value != 0:
+                continue
+            count += 1
+            if minimum is None or value < minimum:
+                minimum = value
+            if maximum is None or value > maximum:
+                maximum = value
+            if value > _zeroThreshold:
+                index = int( ceil( log( value ) / logGamma ) )
+                positive[index] = positive.get( index, 0 ) + 1
+            elif value < -_zeroThreshold:
+                index = int( ceil( log( -value ) / logGamma ) )
+                negative[index] = negative.get( index, 0 ) + 1
+            else:
+                zeroCount += 1
+        self.count += count
+        self.zeroCount += zeroCount
+        self.minimum = minimum
+        self.maximum = maximum
+
+    def merge(self, other):
+        """
+        Adds all values summarized by another sketch to this sketch.
+
+        @param  other       The other sketch, which must have the same accuracy.
+        """
+        if other.accuracy != self.accuracy:
+            raise Exception( "Can't merge quantile sketches with different accuracies ({0} and {1})".format( self.accuracy, other.accuracy ) )
+        for ours, theirs in [( self.positive, other.positive ), ( self.negative, other.negative )]:
+            for index, n in theirs.iteritems():
+                ours[index] = ours.get( index, 0 ) + n
+        self.zeroCount += other.zeroCount
+        self.count += other.count
+        if other.count > 0:
+            if self.minimum is None or other.minimum < self.minimum:
+                self.minimum = other.minimum
+            if self.maximum is None or other.maximum > self.maximum:
+                self.maximum = other.maximum
+
+    def quantile(self, q):
+        """
+        Estimates a quantile of the values.
+
+        @param  q           The quantile, between 0 and 1; e.g. 0.5 for the median.
+
+        @return The estimate, or NaN if there are no values.
+        """
+        if not 0 <= q <= 1:
+            raise Exception( "A quantile should be between 0 and 1, not {0}".format( q ) )
+        if self.count == 0:
+            return float('nan')
+        rank = q * ( self.count - 1 )
+        seen = 0
+        # From the most negative values up to the most positive ones
+        buckets = [( index, self.negative[index], -1 ) for index in sorted( self.negative, reverse = True )]
+        buckets.append( ( None, self.zeroCount, 0 ) )
+        buckets += [( index, self.positive[index], 1 ) for index in sorted( self.positive )]
+        estimate = self.maximum
+        for index, n, sign in buckets:
+            seen += n
+            if seen > rank:
+                if sign == 0:
+                    estimate = 0.0
+                else:
+                    # The middle of the bucket in relative terms
+                    estimate = sign * 2 * math.exp( index * self.logGamma ) / ( 1 + math.exp( self.logGamma ) )
+                break
+        return min( max( estimate, self.minimum ), self.maximum )
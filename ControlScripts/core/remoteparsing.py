@@ -0,0 +1,254 @@
+import os
+import threading
+import tempfile
+import tarfile
+import hashlib
+import shutil
+
+from core.campaign import Campaign
+from core.logfile import COMPRESSED_EXTENSION, INDEX_EXTENSION
+
+# Parsing raw logs on the hosts.
+#
+# Instead of retrieving the raw logs of an execution and parsing them locally, the parsers that can reparse (those for
+# which canReparse() returns True, which hence need nothing but the logs and their settings) can be run on the host of
+# the execution itself, after which only the parsed logs are retrieved. Optionally the raw logs are retrieved as well,
+# compressed on the host (see core.logfile).
+#
+# The parts of the framework needed for parsing are uploaded once to each host, to
+#     <persistent test dir>/remoteparsing/<hash of the framework>
+# and run there by remoteparse.py, which needs Python 2 as python on the host. For each execution a work directory
+#     <persistent test dir>/remoteparsing/exec_<number>
+# is used, holding the description of the parsers to run (spec), the parsed logs (parsedLogs) and the compressed raw
+# logs (raw). The description has one line per item:
+#     scenario name
+#     execution number seeder timeout
+#     host name
+#     parser module
+#     arg key=value
+# with seeder either YES or NO and each arg line giving a setting of the last parser.
+
+# The framework directories on the hosts, by host object; None for hosts that can't parse remotely
+_preparedHosts = {}
+# The locks that serialize preparing each host, by host object
+_hostLocks = {}
+# Guards _hostLocks
+_hostLocksLock = threading.Lock()
+
+def _frameworkFiles():
+    """
+    Returns the local files of the framework that are needed to parse on a host.
+
+    @return The sorted list of tuples (localPath, archiveName).
+    """
+    controlDir = os.path.join( Campaign.testEnvDir, 'ControlScripts' )
+    files = [( os.path.join( controlDir, name ), name ) for name in ['remoteparse.py', 'run_campaign.py', os.path.join( 'modules', '__init__.py' )]]
+    for subdir in ['core', os.path.join( 'modules', 'parser' )]:
+        for name in os.listdir( os.path.join( controlDir, subdir ) ):
+            if name[-3:] == '.py':
+                files.append( ( os.path.join( controlDir, subdir, name ), os.path.join( subdir, name ) ) )
+    files.sort()
+    return files
+
+def _frameworkHash(files):
+    """
+    Returns a hash of the contents of the files of the framework.
+
+    @param  files       The list of tuples (localPath, archiveName) from _frameworkFiles().
+
+    @return The hash as a hexadecimal string.
+    """
+    h = hashlib.sha1()
+    for localPath, archiveName in files:
+        f = None
+        try:
+            f = open( localPath, 'rb' )
+            h.update( "{0} {1}\n".format( archiveName, hashlib.sha1( f.read() ).hexdigest() ) )
+        finally:
+            if f:
+                f.close()
+    return h.hexdigest()
+
+def prepareHost(host, connection = True):
+    """
+    Makes sure the framework is available on a host to parse there.
+
+    This is done only once for each host; the framework is only uploaded if it's not there yet.
+
+    @param  host        The host object.
+    @param  connection  The connection to use for commands to the host, as for host.sendCommand(...).
+
+    @return The path to the framework on the host, or None if the host can't parse remotely.
+    """
+    _hostLocksLock.acquire()
+    try:
+        if host not in _hostLocks:
+            _hostLocks[host] = threading.Lock()
+        lock = _hostLocks[host]
+    finally:
+        _hostLocksLock.release()
+    lock.acquire()
+    try:
+        if host in _preparedHosts:
+            return _preparedHosts[host]
+        if not host.getPersistentTestDir():
+            _preparedHosts[host] = None
+            return None
+        files = _frameworkFiles()
+        frameworkDir = '{0}/remoteparsing/{1}'.format( host.getPersistentTestDir(), _frameworkHash( files ) )
+        res = host.sendCommand( '[ -f "{0}/remoteparse.py" ] && echo "OK" || echo "NO"'.format( frameworkDir ), connection )
+        if res.splitlines()[-1] != 'OK':
+            # Several hosts may share the persistent test directory and upload at the same time, so each extracts
+            # into a directory of its own which is then moved into place at once; only the first move succeeds
+            uploadDir = '{0}.{1}'.format( frameworkDir, host.name )
+            fd, archivePath = tempfile.mkstemp( '.tar.gz' )
+            os.close( fd )
+            try:
+                archive = tarfile.open( archivePath, 'w:gz' )
+                try:
+                    for localPath, archiveName in files:
+                        archive.add( localPath, archiveName.replace( os.sep, '/' ) )
+                finally:
+                    archive.close()
+                host.sendCommand( 'rm -rf "{0}"; mkdir -p "{0}"'.format( uploadDir ), connection )
+                host.sendFile( archivePath, '{0}.tar.gz'.format( uploadDir ), True, connection )
+            finally:
+                os.remove( archivePath )
+            host.sendCommand( 'tar -xzf "{0}.tar.gz" -C "{0}" && mv -T "{0}" "{1}" 2> /dev/null; rm -rf "{0}" "{0}.tar.gz"'.format( uploadDir, frameworkDir ), connection )
+        res = host.sendCommand( '( cd "{0}" && python remoteparse.py --check 2>&1 )'.format( frameworkDir ), connection )
+        if len(res) < 2 or res[-2:] != 'OK':
+            Campaign.logger.log( "Warning! The logs of executions on host {0} can't be parsed on the host, they will be parsed locally instead. Response to the check: {1}".format( host.name, res ) )
+            frameworkDir = None
+        _preparedHosts[host] = frameworkDir
+        return frameworkDir
+    finally:
+        lock.release()
+
+def writeSpec(execution, parsers, path):
+    """
+    Writes the description of the parsers to run on the host for an execution.
+
+    @param  execution   The execution object.
+    @param  parsers     The list of parser objects to run.
+    @param  path        The local path of the description to write.
+    """
+    f = None
+    try:
+        f = open( path, 'w' )
+        seeder = 'NO'
+        if execution.isSeeder():
+            seeder = 'YES'
+        f.write( "scenario {0}\n".format( execution.scenario.name ) )
+        f.write( "execution {0} {1} {2}\n".format( execution.getNumber(), seeder, float( execution.timeout or 0.0 ) ) )
+        f.write( "host {0}\n".format( execution.host.name ) )
+        for parser in parsers:
+            f.write( "parser {0}\n".format( parser.__class__.__name__ ) )
+            for key, value in parser.settings:
+                f.write( "arg {0}={1}\n".format( key, value ) )
+    finally:
+        if f:
+            f.close()
+
+def listRemoteFiles(host, directory, connection):
+    """
+    Returns the files in a directory on a host, including those in its subdirectories.
+
+    @param  host        The host object.
+    @param  directory   The path to the directory on the host.
+    @param  connection  The connection to use for commands to the host, as for host.sendCommand(...).
+
+    @return The list of paths of the files, relative to directory.
+    """
+    res = host.sendCommand( '[ -d "{0}" ] && ( cd "{0}" && find . -type f ) ; echo "OK"'.format( directory ), connection )
+    lines = res.splitlines()
+    if len(lines) < 1 or lines[-1] != 'OK':
+        raise Exception( "Could not list directory {0} on host {1}. Response: {2}".format( directory, host.name, res ) )
+    return [line[2:] for line in lines[:-1] if line[:2] == './']
+
+def _getFile(host, remotePath, localPath, connection):
+    """
+    Retrieves a file from a host, creating the local directory for it if needed.
+    """
+    if not os.path.exists( os.path.dirname( localPath ) ):
+        os.makedirs( os.path.dirname( localPath ) )
+    host.getFile( remotePath, localPath, True, connection )
+
+def parseRemotely(execution, logDir, outputDir, keepRawLogs = True, compressRawLogs = True):
+    """
+    Runs the parsers of an execution that can reparse on its host and retrieves their parsed logs.
+
+    On success execution.parsedRemotely is set, so execution.runParsers(...) only runs the remaining parsers. The clock
+    log (clock.log) should already be in logDir: it is sent to the host for the parsers to use.
+
+    Nothing is done if none of the parsers can reparse or if the host can't parse remotely.
+
+    @param  execution       The execution object, of which the client has finished.
+    @param  logDir          The path to the directory on the local machine where the raw logs are to be stored.
+    @param  outputDir       The path to the directory on the local machine where the parsed logs are to be stored.
+    @param  keepRawLogs     Set to False to not retrieve the raw logs, unless some parsers still need them.
+    @param  compressRawLogs Set to False to not retrieve the raw logs compressed by the host.
+
+    @return True iff the raw logs still need to be retrieved using execution.client.retrieveLogs(...).
+    """
+    allParsers = execution.getParsers()
+    parsers = [p for p in allParsers if p.canReparse()]
+    remoteLogDir = execution.client.getExecutionLogDir( execution )
+    if len(parsers) == 0 or not remoteLogDir:
+        return True
+    host = execution.host
+    connection = execution.getRunnerConnection()
+    frameworkDir = prepareHost( host, connection )
+    if not frameworkDir:
+        return True
+    workDir = '{0}/remoteparsing/exec_{1}'.format( host.getPersistentTestDir(), execution.getNumber() )
+    retrieveRawLogs = keepRawLogs and compressRawLogs
+    # Everything is retrieved into a local staging directory first and only moved into place once all has been
+    # retrieved, so a failure leaves logDir and outputDir as they were for parsing locally instead
+    stagingDir = tempfile.mkdtemp( '.remoteparsing', '', os.path.dirname( os.path.abspath( outputDir ) ) )
+    retrieved = []
+    host.sendCommand( 'rm -rf "{0}"; mkdir -p "{0}"'.format( workDir ), connection )
+    try:
+        fd, specPath = tempfile.mkstemp( '.spec' )
+        os.close( fd )
+        try:
+            writeSpec( execution, parsers, specPath )
+            host.sendFile( specPath, '{0}/spec'.format( workDir ), True, connection )
+        finally:
+            os.remove( specPath )
+        if os.path.exists( os.path.join( logDir, 'clock.log' ) ):
+            host.sendFile( os.path.join( logDir, 'clock.log' ), '{0}/clock.log'.format( remoteLogDir ), True, connection )
+        compress = 'no'
+        if retrieveRawLogs:
+            compress = 'yes'
+        res = host.sendCommand( '( cd "{0}" && python remoteparse.py "{1}/spec" "{2}" "{1}" {3} 2>&1 )'.format( frameworkDir, workDir, remoteLogDir, compress ), connection )
+        if len(res) < 2 or res[-2:] != 'OK':
+            raise Exception( "Parsing the logs of execution {0} on host {1} failed. Response: {2}".format( execution.getNumber(), host.name, res ) )
+        for name in listRemoteFiles( host, '{0}/parsedLogs'.format( workDir ), connection ):
+            retrieved.append( ( os.path.join( 'parsedLogs', *name.split( '/' ) ), os.path.join( outputDir, *name.split( '/' ) ) ) )
+            _getFile( host, '{0}/parsedLogs/{1}'.format( workDir, name ), os.path.join( stagingDir, retrieved[-1][0] ), connection )
+        if retrieveRawLogs:
+            for name in listRemoteFiles( host, '{0}/raw'.format( workDir ), connection ):
+                localPath = os.path.join( logDir, *name.split( '/' ) )
+                # Logs that are kept locally, such as clock.log, are not overwritten
+                plainPath = localPath
+                for extension in [INDEX_EXTENSION, COMPRESSED_EXTENSION]:
+                    if plainPath[-len(extension):] == extension:
+                        plainPath = plainPath[:-len(extension)]
+                if os.path.exists( plainPath ):
+                    continue
+                retrieved.append( ( os.path.join( 'raw', *name.split( '/' ) ), localPath ) )
+                _getFile( host, '{0}/raw/{1}'.format( workDir, name ), os.path.join( stagingDir, retrieved[-1][0] ), connection )
+        for stagedPath, localPath in retrieved:
+            if not os.path.exists( os.path.dirname( localPath ) ):
+                os.makedirs( os.path.dirname( localPath ) )
+            shutil.move( os.path.join( stagingDir, stagedPath ), localPath )
+    finally:
+        shutil.rmtree( stagingDir, True )
+        try:
+            host.sendCommand( 'rm -rf "{0}"'.format( workDir ), connection )
+        except Exception as e:
+            Campaign.logger.log( "Warning! Could not remove {0} from host {1}: {2}".format( workDir, host.name, e.__str__() ) )
+    execution.parsedRemotely = True
+    if retrieveRawLogs:
+        return False
+    return keepRawLogs or len(parsers) < len(allParsers)
@@ -1,6 +1,9 @@
 import tempfile
 import shutil
 import threading
+import os
+import hashlib
+import re
 from subprocess import Popen
 from subprocess import PIPE
 from subprocess import STDOUT
@@ -50,20 +53,50 @@ class source(coreObject):
         return None
     # pylint: enable-msg=W0613
 
+    def prepareLocalCommand(self, client):
+        """
+        Return the command to prepare the sources on the local machine.
+
+        This is used by prepareLocal(...). The default implementation returns self.prepareCommand(...); override
+        this if the command differs between the local machine and the remote hosts.
+
+        @param  client      The client for which the sources are to be prepared.
+
+        @return The command line to prepare the sources.
+        """
+        return self.prepareCommand(client)
+
+    # This method has unused arguments; that's fine
+    # pylint: disable-msg=W0613
+    def prepareRemoteCommand(self, client, host):
+        """
+        Return the command to prepare the sources on a remote host.
+
+        This is used by prepareRemote(...). The default implementation returns self.prepareCommand(...); override
+        this if the command differs between the local machine and the remote hosts.
+
+        @param  client      The client for which the sources are to be prepared.
+        @param  host        The host on which the sources are to be prepared.
+
+        @return The command line to prepare the sources.
+        """
+        return self.prepareCommand(client)
+    # pylint: enable-msg=W0613
+
     def prepareLocal(self, client):
         """
         Prepare the source code of the client on the local machine.
 
-        The default implementation creates a local temporary directory and runs self.prepareCommand(...) in that
-        directory if it was specified.
+        The default implementation creates a local temporary directory and runs self.prepareLocalCommand(...) in
+        that directory if it was specified.
 
-        If self.prepareCommand(...) returns None the default implementation does nothing.
+        If self.prepareLocalCommand(...) returns None the default implementation does nothing.
 
         @param  client      The client for which the sources are to be prepared.
         
         @return True iff the preparation was succesful.
         """
-        prepareCommand = self.prepareCommand(client)
+        prepareCommand = self.prepareLocalCommand(client)
         if prepareCommand is not None:
             try:
                 self.localSourceDir__lock.acquire()
@@ -101,17 +134,17 @@ class source(coreObject):
         """
         Prepare the source code of the client on the remote host.
 
-        The default implementation creates the directory self.remoteLocation(...) and runs self.prepareCommand(...)
-        in that directory.
+        The default implementation creates the directory self.remoteLocation(...) and runs
+        self.prepareRemoteCommand(...) in that directory.
 
-        If self.prepareCommand(...) returns None the default implementation does nothing.
+        If self.prepareRemoteCommand(...) returns None the default implementation does nothing.
 
         @param  client      The client for which the sources are to be prepared.
         @param  host        The host on which the sources are to be prepared.
         
         @return True iff the preparation was succesful.
         """
-        prepareCommand = self.prepareCommand(client)
+        prepareCommand = self.prepareRemoteCommand(client, host)
         if prepareCommand:
             try:
                 if self.isInCleanup():
@@ -160,6 +193,76 @@ class source(coreObject):
             return "{0}/source".format( client.getClientDir( host ) )
         return None
 
+    def localRevision(self, client, exclude = None):
+        """
+        Returns an identification of the revision of the local sources of the client.
+
+        This is used to find earlier builds of the same sources, so it should change whenever the sources change.
+        It is called after prepareLocal(...) and before the sources are built.
+
+        The default implementation returns the SHA1 hash over the paths and contents of all files in the local
+        location, leaving out version control metadata and the files given in exclude.
+
+        @param  client      The client for which the sources are to be identified.
+        @param  exclude     List of paths relative to the sources that are to be left out, such as build results.
+
+        @return The identification of the revision, or None if the revision can't be identified.
+        """
+        location = self.localLocation(client)
+        if not location or not os.path.isdir( location ):
+            return None
+        if exclude is None:
+            exclude = []
+        files = []
+        for root, dirs, names in os.walk( location, followlinks = True ):
+            dirs[:] = [d for d in dirs if d not in ('.git', '.svn')]
+            for name in names:
+                relPath = os.path.relpath( os.path.join( root, name ), location )
+                if relPath not in exclude:
+                    files.append( relPath )
+        tree = hashlib.sha1()
+        for relPath in sorted( files ):
+            content = hashlib.sha1()
+            f = open( os.path.join( location, relPath ), 'rb' )
+            try:
+                block = f.read( 1048576 )
+                while block:
+                    content.update( block )
+                    block = f.read( 1048576 )
+            finally:
+                f.close()
+            tree.update( '{0}  ./{1}\n'.format( content.hexdigest(), relPath ) )
+        return tree.hexdigest()
+
+    def remoteRevision(self, client, host, exclude = None):
+        """
+        Returns an identification of the revision of the remote sources of the client on the host.
+
+        This is used to find earlier builds of the same sources, so it should change whenever the sources change.
+        It is called after prepareRemote(...) and before the sources are built.
+
+        The default implementation returns the SHA1 hash over the paths and contents of all files in the remote
+        location, leaving out version control metadata and the files given in exclude. It is calculated on the host
+        in the same way as localRevision(...) does locally.
+
+        @param  client      The client for which the sources are to be identified.
+        @param  host        The host on which the sources reside.
+        @param  exclude     List of paths relative to the sources that are to be left out, such as build results.
+
+        @return The identification of the revision, or None if the revision can't be identified.
+        """
+        location = self.remoteLocation(client, host)
+        if not location:
+            return None
+        if exclude is None:
+            exclude = []
+        excludes = ''.join( [' ! -path "./{0}"'.format( e ) for e in exclude] )
+        res = host.sendCommand( '( cd "{0}" && find -L . \\( -name .git -o -name .svn \\) -prune -o -type f{1} -print0 | LC_ALL=C sort -z | xargs -0 -r sha1sum | sha1sum ) 2> /dev/null'.format( location, excludes ) )
+        m = re.match( '^([0-9a-f]{40})', res.splitlines()[-1] if res else '' )
+        if not m:
+            return None
+        return m.group( 1 )
+
     def cleanup(self):
         """
         Cleans up the sources.
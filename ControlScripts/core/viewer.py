@@ -119,7 +119,7 @@ class viewer(coreObject):
             - execution.client is available but incomplete
                 - execution.client.name is available and reads '__reparse__'
                 - execution.client.isSideService() is available
-                    - returns True unless any log exists for the execution
+                    - returns True if the execution was a side service or no log exists for it
             - execution.timeout is available and 0.0 unless the data was saved using processor:savetimeout
             - execution.isSeeder() is available and False unless the data was saved using processor:isSeeder (and this was a seeder)
             - execution.host is available but limited 
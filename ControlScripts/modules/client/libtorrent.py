@@ -113,7 +113,7 @@ class libtorrent(client):
                                                     ),
                                 linkDataIn = dataDir
                                 )
-        execution.host.sendCommand( 'mkdir -p "{0}"'.format( torrentDir ) )
+        self.prepareExecutionDirectory( execution, torrentDir )
     # pylint: enable-msg=W0221
 
     def retrieveLogs(self, execution, localLogDestination):
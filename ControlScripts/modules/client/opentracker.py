@@ -1,4 +1,4 @@
-from core.parsing import isPositiveInt, isValidName
+from core.parsing import isPositiveInt, isPositiveFloat, isValidName
 from core.campaign import Campaign
 from core.client import client
 
@@ -34,9 +34,16 @@ class opentracker(client):
                             updated as if the file object was given as a changeTracker to this object. Note that
                             the metaFile of that very object will be updated, and hence all clients using that
                             file object will see the updated meta file.
+    - statsInterval         The interval in seconds between two samples of the statistics of the tracker, which
+                            are logged for parser:opentracker; may be fractional; optional, defaults to 1.
+
+    The client is run through a wrapper that samples the full scrape statistics of the tracker during the run,
+    giving the seeders, leechers and completed downloads of each torrent over time. This requires wget on the
+    host running the tracker.
     """
     
     port = None                     # The port openTracker will listen on
+    statsInterval = None            # The interval in seconds between two samples of the tracker statistics
     changeTrackers = None           # List of names of file objects for which to change the torrent files
     changeClientTrackers = None     # List of names of client objects for which all torrent files are to be changed
     hasUpdatedTrackers = False      # Flag to keep track of whether the trackers have already been updated or not
@@ -86,6 +93,12 @@ class opentracker(client):
             if not isValidName( value ):
                 parseError( "{0} is not a valid name for a client object.".format( value ) )
             self.changeClientTrackers.append( value )
+        elif key == 'statsInterval':
+            if self.statsInterval:
+                parseError( "Stats interval already set: {0}".format( self.statsInterval ) )
+            if not isPositiveFloat( value, True ):
+                parseError( "Stats interval must be a non-zero positive number of seconds, not {0}".format( value ) )
+            self.statsInterval = float(value)
         else:
             client.parseSetting(self, key, value)
 
@@ -118,6 +131,10 @@ class opentracker(client):
         
         if not self.port:
             raise Exception( "The port parameter is required for host {0}".format( self.name ) )
+        if not self.statsInterval:
+            self.statsInterval = 1
+        if not os.path.exists( os.path.join( Campaign.testEnvDir, 'ClientWrappers', 'opentracker', 'opentracker_logging' ) ):
+            raise Exception( "The opentracker client runner needs the opentracker wrapper script (opentracker_logging). This is expected to be present in ClientWrappers/opentracker/, but it isn't." )
 
     def prepare(self):
         """
@@ -213,7 +230,13 @@ class opentracker(client):
 
         @param  execution           The execution to prepare this client for.
         """
-        client.prepareExecution(self, execution, simpleCommandLine="./opentracker -p {0} -P {0}".format( self.port ) )
+        client.prepareExecution(self, execution, simpleCommandLine='"{0}/opentracker_logging" "{1}" {2} {3} > "{4}/log.log"'.format(
+                                                                                            self.getClientDir(execution.host),
+                                                                                            self.getExecutionClientDir(execution),
+                                                                                            self.port,
+                                                                                            self.statsInterval,
+                                                                                            self.getExecutionLogDir(execution)
+                                                                                            ) )
     # pylint: enable-msg=W0221
 
     def retrieveLogs(self, execution, localLogDestination):
@@ -225,6 +248,8 @@ class opentracker(client):
         @param  execution               The execution for which to retrieve logs.
         @param  localLogDestination     A string that is the path to a local directory in which the logs are to be stored.
         """
+        if self.getExecutionLogDir(execution):
+            execution.host.getFile( '{0}/log.log'.format( self.getExecutionLogDir( execution ) ), os.path.join( localLogDestination, 'log.log' ), reuseConnection = execution.getRunnerConnection() )
         client.retrieveLogs(self, execution, localLogDestination)
 
     def cleanupHost(self, host, reuseConnection = None):
@@ -348,7 +373,7 @@ class opentracker(client):
         
         @return    The files that are always to be uploaded.
         """
-        return None
+        return [(os.path.join( Campaign.testEnvDir, 'ClientWrappers', 'opentracker', 'opentracker_logging' ), 'opentracker_logging')]
     
     def isSideService(self):
         """
@@ -366,6 +391,17 @@ class opentracker(client):
         """
         return True
 
+    def hasSideServiceLogs(self):
+        """
+        Returns whether this client, being a side service, has logs that are to be retrieved and parsed.
+
+        The logs of side services are parsed like those of other clients, but the executions of side services
+        are still ignored by processors and viewers.
+
+        @return     True iff the logs of this side service are to be retrieved and parsed.
+        """
+        return True
+
     @staticmethod
     def APIVersion():
         return "2.4.0"
@@ -1,4 +1,5 @@
 from core.campaign import Campaign
+from core.parsing import isPositiveFloat
 from core.client import client
 
 import os
@@ -17,11 +18,14 @@ class utorrent(client):
                         be found in the names of torrents or other (indirect) parameters of the torrent.
     - dht               If set to "yes" this will enable the use of DHT for uTorrent, which is otherwise
                         disabled.
+    - pollInterval      The interval in seconds between two status polls of the client, which is also the
+                        resolution of the progress in the log. May be a fraction of a second. Defaults to 1.
     """
 
     useWine = False
     stopWhenSeeding = False
     useDHT = False
+    pollInterval = None
 
     def __init__(self, scenario):
         """
@@ -57,6 +61,10 @@ class utorrent(client):
         elif key == 'dht':
             if value == 'yes':
                 self.useDHT = True
+        elif key == 'pollInterval':
+            if not isPositiveFloat( value, True ):
+                raise Exception( "The pollInterval parameter of client:utorrent must be a non-zero positive number of seconds, not {0}".format( value ) )
+            self.pollInterval = float(value)
         else:
             client.parseSetting(self, key, value)
 
@@ -142,18 +150,19 @@ class utorrent(client):
         
         # Build command and prepare
         client.prepareExecution(self, execution, simpleCommandLine = 
-                                    '{5} LD_LIBRARY_PATH=$LD_LIBRARY_PATH:~/lib {0}/ut_server_logging.py {0} {1} {4} {6} 1 {2} 0 > {3}/log.log 2> {3}/errlog.log'.format( 
+                                    '{5} LD_LIBRARY_PATH=$LD_LIBRARY_PATH:~/lib {0}/ut_server_logging.py {0} {1} {4} {6} 1 {2} 0 {7} > {3}/log.log 2> {3}/errlog.log'.format( 
                                         self.getClientDir(execution.host),
                                         self.getExecutionClientDir(execution),
                                         torrentDir,  
                                         self.getExecutionLogDir(execution),
                                         stopWhenSeeding,
                                         torrentLinks,
-                                        dhtArg
+                                        dhtArg,
+                                        self.pollInterval or 1
                                     ), # simpleCommandLine
                                     linkDataIn = dataDir
                                 )
-        execution.host.sendCommand( 'mkdir -p "{0}"'.format( torrentDir ) )
+        self.prepareExecutionDirectory( execution, torrentDir )
     # pylint: enable-msg=W0221
 
     def retrieveLogs(self, execution, localLogDestination):
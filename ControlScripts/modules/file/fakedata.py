@@ -1,6 +1,7 @@
 from core.parsing import isPositiveInt
 from core.campaign import Campaign
 import core.file
+import core.host
 from core.meta import meta
 
 import os
@@ -9,6 +10,8 @@ import tempfile
 import shutil
 import subprocess
 import random
+import hashlib
+import re
 
 def parseError( msg ):
     """
@@ -49,6 +52,16 @@ class fakedata(core.file.file):
     - rootHashCache     Path to a local file. If set, this file is taken to be a root hash cache for fakedata files. The cache
                         is a binary file containing a pickled python dictionary. Any present root hashes will be used from
                         cache, others will be added. Optional, must point to a writable (possibly not existing) file.
+    - generationThreads The number of fake data files each seeding host writes in parallel. All files of this object are
+                        generated on a host by a single command and all seeding hosts generate their files concurrently.
+                        Optional non-negative integer, defaults to 0 which uses the number of online processors of the host.
+                        Ignored if binary is set: such a binary is run once for each file, one file after another.
+    - binaryCache       Path to a local directory in which compiled genfakedata binaries are cached. Binaries are kept per
+                        signature of the machine (architecture as reported by uname -m and the C library) and version of the
+                        sources in Utils/fakedata. For each signature genfakedata is compiled once on one of the seeding hosts,
+                        after which the cached binary is uploaded to the persistent test directory of all hosts with that
+                        signature. A binary already present there is reused. Optional, defaults to Utils/fakedata/prebuilt,
+                        which will be created if needed. Ignored if binary is set.
     
     Selection arguments:
     - '?'               Will select a random file object from this file:fakedata's collection. Especially useful if multiple > 1
@@ -61,6 +74,8 @@ class fakedata(core.file.file):
     binary = None               # Path to the remote binary to use
     filename = None             # The filename the resulting file should have
     multiple = None             # The number of fake data files to generate
+    generationThreads = None    # The number of files generated in parallel on each host, 0 for the number of processors
+    binaryCacheDir = None       # Path to local directory containing cached genfakedata binaries per machine signature
     
     slave = False               # Flag to mark slave objects
     slaveNumber = 0             # Number of the slave object (starts at 1: non-slave is always 0)
@@ -135,6 +150,18 @@ class fakedata(core.file.file):
             if not isPositiveInt( value, True ):
                 parseError( "multiple must be a positive, non-zero integer" )
             self.multiple = int(value)
+        elif key == 'generationThreads':
+            if self.generationThreads is not None:
+                parseError( "generationThreads may be specified only once" )
+            if not isPositiveInt( value ):
+                parseError( "generationThreads must be a non-negative integer" )
+            self.generationThreads = int(value)
+        elif key == 'binaryCache':
+            if self.binaryCacheDir:
+                parseError( "A binary cache directory has already been set: {0}".format( self.binaryCacheDir ) )
+            if os.path.exists( value ) and not os.path.isdir( value ):
+                parseError( "{0} is not a directory".format( value ) )
+            self.binaryCacheDir = value
         elif key == 'generateRootHash':
             fallback = False
             if value[-1:] == 'L':
@@ -191,6 +218,10 @@ class fakedata(core.file.file):
             for f in fakedataGeneratorFiles:
                 if not os.path.exists( os.path.join( Campaign.testEnvDir, 'Utils', 'fakedata', f ) ):
                     raise Exception( "A file seems to be missing from Utils/fakedata: {0} is required to build the fakedata utility.".format( f ) )
+            if not self.binaryCacheDir:
+                self.binaryCacheDir = os.path.join( Campaign.testEnvDir, 'Utils', 'fakedata', 'prebuilt' )
+        if self.generationThreads is None:
+            self.generationThreads = 0
         if not self.multiple:
             self.multiple = 1
         elif self.multiple > 1:
@@ -267,7 +298,7 @@ class fakedata(core.file.file):
                     needGeneration = True
             if needGeneration:
                 if not os.path.exists( os.path.join( Campaign.testEnvDir, 'Utils', 'fakedata', 'genfakedata' ) ):
-                    raise Exception( "The Utils/fakedata/genfakedata utility is required to build a fakedata file for on-the-fly torrent and root hash creation. Please run something like 'g++ *.cpp -o genfakedata' inside Utils/fakedata/ to create it." )
+                    raise Exception( "The Utils/fakedata/genfakedata utility is required to build a fakedata file for on-the-fly torrent and root hash creation. Please run something like 'g++ *.cpp -o genfakedata -pthread' inside Utils/fakedata/ to create it." )
                 try:
                     tempdir = tempfile.mkdtemp()
                     for count in range(self.multiple):
@@ -365,6 +396,8 @@ class fakedata(core.file.file):
                 fd.binary = self.binary
                 fd.filename = self.filename
                 fd.multiple = self.multiple
+                fd.generationThreads = self.generationThreads
+                fd.binaryCacheDir = self.binaryCacheDir
                 fd.slave = True
                 fd.master = self
                 fd.slaveNumber = count
@@ -443,7 +476,8 @@ class fakedata(core.file.file):
 
         Note that self.sendToHost(...) will also be called before this function is called.
 
-        The default implementation does nothing.
+        This implementation generates the fake data files on all seeding hosts of this file object at once, the first time it
+        is called. Later calls for the other seeding hosts will find their files already generated.
 
         @param  host        The host to which to send the files.
         """
@@ -453,43 +487,135 @@ class fakedata(core.file.file):
         
         if host in self.seedingHostSeen:
             return
-        self.seedingHostSeen.append(host)
         
-        core.file.file.sendToSeedingHost(self, host)
+        # Find all seeding hosts of this file object and its slaves, in order to generate on all of them concurrently
+        hosts = [host]
+        fileObjs = self.slaves.values()
+        for e in self.scenario.getObjects('execution'):
+            if e.host in hosts or e.host in self.seedingHostSeen:
+                continue
+            for f in fileObjs:
+                if f in e.host.seedingFiles:
+                    hosts.append( e.host )
+                    break
+        self.seedingHostSeen += hosts
+        
+        for h in hosts:
+            core.file.file.sendToSeedingHost(self, h)
         
         # Figure out command
-        binaryCommand = None
+        binaryCommands = {}
         if not self.binary:
-            remoteBaseDir = '{0}/fakedata-source'.format( self.getFileDir(host) )
-            host.sendCommand( 'mkdir -p "{0}"'.format( remoteBaseDir ) )
-            for f in fakedataGeneratorFiles:
-                host.sendFile( os.path.join( Campaign.testEnvDir, 'Utils', 'fakedata', f ), '{0}/{1}'.format( remoteBaseDir, f ), True )
-            res = host.sendCommand( '( cd "{0}"; g++ *.cpp -o genfakedata && echo && echo "OK" )'.format( remoteBaseDir ) )
+            binaryCommands = self.prepareGenerators( hosts )
+        else:
+            for h in hosts:
+                res = h.sendCommand( '[ -e "{0}" -a -x "{0}" ] && echo "Y" || echo "N"'.format( self.binary ) )
+                if res != 'Y':
+                    raise Exception( "Binary {0} for file {1} does not exist on host {2}".format( self.binary, self.name, h.name ) )
+                binaryCommands[h] = self.binary
+
+        # Generate files: one command per host, all hosts at once
+        commands = {}
+        for h in hosts:
+            if self.binary:
+                # A binary given by the user need not support the batch mode, so it is run once for each file
+                if self.multiple > 1:
+                    jobs = ' && '.join( ['"{0}" "{1}/files/{2}_{4}" {3} {4}'.format( binaryCommands[h], self.getFileDir(h), self.filename, self.size, filecounter ) for filecounter in range(self.multiple)] )
+                else:
+                    jobs = '"{0}" "{1}/files/{2}" {3}'.format( binaryCommands[h], self.getFileDir(h), self.filename, self.size )
+                commands[h] = 'mkdir -p "{0}/files" && {1} && echo && echo "OK"'.format( self.getFileDir(h), jobs )
+                continue
+            if self.multiple > 1:
+                jobs = ' '.join( ['"{0}/files/{1}_{3}" {2} {3}'.format( self.getFileDir(h), self.filename, self.size, filecounter ) for filecounter in range(self.multiple)] )
+            else:
+                jobs = '"{0}/files/{1}" {2} 0'.format( self.getFileDir(h), self.filename, self.size )
+            commands[h] = 'mkdir -p "{0}/files" && "{1}" -p {2} {3} && echo && echo "OK"'.format( self.getFileDir(h), binaryCommands[h], self.generationThreads, jobs )
+        results = core.host.sendCommandToHosts( commands )
+        for h in hosts:
+            res = results[h]
             if len(res) < 2:
-                raise Exception( "Too short a response when trying to build genfakedata for file {0} in directory {1} on host {2}: {3}".format( self.name, remoteBaseDir, host.name, res ) )
+                raise Exception( "Too short a response when trying to generate the fake data files of {0} on host {1}: {2}".format( self.name, h.name, res ) )
             if res[-2:] != "OK":
-                raise Exception( "Could not build genfakedata for file {0} in directory {1} on host {2}. Reponse: {3}".format( self.name, remoteBaseDir, host.name, res ) )
-            binaryCommand = '{0}/genfakedata'.format( remoteBaseDir )
-        else:
-            res = host.sendCommand( '[ -e "{0}" -a -x "{0}" ] && echo "Y" || echo "N"' )
-            if res != 'Y':
-                raise Exception( "Binary {0} for file {1} does not exist on host {2}".format( self.binary, self.name, host.name ) )
-            binaryCommand = self.binary
+                raise Exception( "Could not generate the fake data files of {0} on host {1}: {2}".format( self.name, h.name, res ) )
 
-        # Generate files
-        if self.multiple > 1:
-            for filecounter in range(self.multiple):
-                res = host.sendCommand( '"{0}" "{1}/files/{2}_{4}" {3} {4} && echo && echo "OK"'.format( binaryCommand, self.getFileDir(host), self.filename, self.size, filecounter ) )
+    def prepareGenerators(self, hosts):
+        """
+        Makes sure a genfakedata binary is available on each of the hosts.
+
+        Hosts are grouped by their signature: the architecture, the C library and the version of the genfakedata
+        sources. A binary for a signature that is already in the persistent test directory of a host is reused.
+        Otherwise a binary from the local binary cache is uploaded. Signatures not in the local cache are compiled
+        on one host each, concurrently, after which the binary is added to the cache and uploaded to the other hosts.
+
+        @param  hosts       The list of hosts that need genfakedata.
+
+        @return Dictionary from host to the path of the genfakedata binary on that host.
+        """
+        sourceHash = hashlib.sha1()
+        for f in fakedataGeneratorFiles:
+            fObj = open( os.path.join( Campaign.testEnvDir, 'Utils', 'fakedata', f ), 'rb' )
+            sourceHash.update( fObj.read() )
+            fObj.close()
+        sourceHash = sourceHash.hexdigest()[:12]
+
+        binaryCommands = {}
+        signatures = {}
+        missing = {}
+        for h in hosts:
+            res = h.sendCommand( 'echo "`uname -m`-`ldd --version 2>&1 | head -n 1`"' )
+            signatures[h] = '{0}-{1}'.format( re.sub( '[^A-Za-z0-9._-]+', '_', res.strip() ), sourceHash )
+            remoteDir = '{0}/genfakedata/{1}'.format( h.getPersistentTestDir(), signatures[h] )
+            binaryCommands[h] = '{0}/genfakedata'.format( remoteDir )
+            res = h.sendCommand( '[ -f "{0}" -a -x "{0}" ] && echo "Y" || echo "N"'.format( binaryCommands[h] ) )
+            if res == 'Y':
+                continue
+            h.sendCommand( 'mkdir -p "{0}"'.format( remoteDir ) )
+            if signatures[h] not in missing:
+                missing[signatures[h]] = []
+            missing[signatures[h]].append( h )
+        
+        # Build each signature not in the local cache on one of its hosts
+        builders = {}
+        for sig in missing:
+            if not os.path.isfile( os.path.join( self.binaryCacheDir, sig, 'genfakedata' ) ):
+                builders[sig] = missing[sig][0]
+        if len(builders) > 0:
+            commands = {}
+            for h in builders.values():
+                remoteBaseDir = '{0}/genfakedata/{1}/source'.format( h.getPersistentTestDir(), signatures[h] )
+                h.sendCommand( 'mkdir -p "{0}"'.format( remoteBaseDir ) )
+                for f in fakedataGeneratorFiles:
+                    h.sendFile( os.path.join( Campaign.testEnvDir, 'Utils', 'fakedata', f ), '{0}/{1}'.format( remoteBaseDir, f ), True )
+                commands[h] = '( cd "{0}"; g++ *.cpp -o genfakedata -pthread && mv genfakedata "{1}" && echo && echo "OK" )'.format( remoteBaseDir, binaryCommands[h] )
+            results = core.host.sendCommandToHosts( commands )
+            for sig in builders:
+                h = builders[sig]
+                res = results[h]
                 if len(res) < 2:
-                    raise Exception( "Too short a response when trying to generate the fake data file {0}_{3} on host {1}: {2}".format( self.name, host.name, res, filecounter ) )
+                    raise Exception( "Too short a response when trying to build genfakedata for file {0} on host {1}: {2}".format( self.name, h.name, res ) )
                 if res[-2:] != "OK":
-                    raise Exception( "Could not generate fake data file {0}_{3} on host {1}: {2}".format( self.name, host.name, res, filecounter ) )
-        else:
-            res = host.sendCommand( '"{0}" "{1}/files/{2}" {3} && echo && echo "OK"'.format( binaryCommand, self.getFileDir(host), self.filename, self.size ) )
-            if len(res) < 2:
-                raise Exception( "Too short a response when trying to generate the fake data file {0} on host {1}: {2}".format( self.name, host.name, res ) )
-            if res[-2:] != "OK":
-                raise Exception( "Could not generate fake data file {0} on host {1}: {2}".format( self.name, host.name, res ) )
+                    raise Exception( "Could not build genfakedata for file {0} on host {1}. Reponse: {2}".format( self.name, h.name, res ) )
+                # Store the fresh binary in the local cache; move it into place atomically so concurrent runs never see half a binary
+                localDir = os.path.join( self.binaryCacheDir, sig )
+                if not os.path.exists( localDir ):
+                    os.makedirs( localDir )
+                tmpName = os.path.join( localDir, 'genfakedata.{0}'.format( os.getpid() ) )
+                h.getFile( binaryCommands[h], tmpName, True )
+                os.chmod( tmpName, 0755 )
+                os.rename( tmpName, os.path.join( localDir, 'genfakedata' ) )
+                Campaign.logger.log( "Cached genfakedata for signature {0} in {1}".format( sig, localDir ) )
+        
+        # Upload cached binaries to the remaining hosts
+        for sig in missing:
+            for h in missing[sig]:
+                if sig in builders and builders[sig] == h:
+                    continue
+                h.sendFile( os.path.join( self.binaryCacheDir, sig, 'genfakedata' ), binaryCommands[h], True )
+                res = h.sendCommand( 'chmod +x "{0}" && echo "OK"'.format( binaryCommands[h] ) )
+                if res != "OK":
+                    raise Exception( "Could not make the uploaded genfakedata binary {0} executable on host {1}: {2}".format( binaryCommands[h], h.name, res ) )
+
+        return binaryCommands
 
     def getFileDir(self, host):
         """
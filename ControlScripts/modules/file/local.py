@@ -28,12 +28,17 @@ class local(core.file.file):
     - renameFile            Set this to "yes" to have the file renamed when uploaded to an automatically generated
                             name. This is forbidden when automated torent generation is requested. Not valid if
                             path points to a directory.
+    - hashCache             Path to a local file. If set, this file is taken to be a cache of digests of the local files,
+                            keyed by path, size, modification time and inode of each file. Generating torrents or root
+                            hashes will reuse the digests of unchanged files and only rehash the pieces touched by
+                            changed files. Optional, must point to a writable (possibly not existing) file.
     """
 
     path = None                 # The path of the local file or directory
     generateTorrent = False     # True iff automated torrent generation is requested
     generateRootHashes = None   # List of chunksizes for which root hash calculation is requested
     renameFile = False          # True iff the single file is to be renamed after uploading
+    hashCacheFile = None        # Path to the local file containing the hash cache
     
     tempMetaFile = None         # The temporary file created for the meta file
 
@@ -93,6 +98,14 @@ class local(core.file.file):
         elif key == 'renameFile':
             if value == 'yes':
                 self.renameFile = True
+        elif key == 'hashCache':
+            if self.hashCacheFile:
+                parseError( "A hash cache file has already been set: {0}".format( self.hashCacheFile ) )
+            if os.path.exists( value ) and not os.path.isfile( value ):
+                parseError( "{0} is not a file".format( value ) )
+            if os.path.dirname( value ) == '' or not os.path.isdir( os.path.dirname( value ) ):
+                parseError( "{0} does not point to a new file in an existing directory".format( value ) )
+            self.hashCacheFile = value
         else:
             core.file.file.parseSetting(self, key, value)
 
@@ -119,24 +132,29 @@ class local(core.file.file):
                 raise Exception( "file:local {0} has requested automated root hash calculation, but {1} is a directory, for which root hashes aren't supported".format( self.name, self.path ) )
             if self.renameFile:
                 raise Exception( "file:local {0} has requested the uploaded file to be renamed, but {1} is a directory, for which this is not supported".format( self.name, self.path ) )
+        if self.hashCacheFile and len(self.generateRootHashes) == 0 and not self.generateTorrent:
+            raise Exception( "A hash cache without generating root hashes or torrents? You've forgotten something." )
         if len(self.generateRootHashes) > 0 or self.generateTorrent:
             meta = Campaign.loadCoreModule('meta')
             # PyLint really doesn't understand dynamic loading
             # pylint: disable-msg=E1101
+            hashCache = None
+            if self.hashCacheFile:
+                hashCache = meta.loadHashCache( self.hashCacheFile )
             for cs in self.generateRootHashes:
                 if type(cs) != int and cs[-1:] == 'L':
-                    self.rootHashes[cs] = meta.calculateMerkleRootHash( self.path, False, int(cs[:-1]) ).encode( 'hex' )
+                    self.rootHashes[cs] = meta.calculateMerkleRootHash( self.path, False, int(cs[:-1]), hashCache ).encode( 'hex' )
                 else:
-                    self.rootHashes[cs] = meta.calculateMerkleRootHash( self.path, True, cs).encode( 'hex' )
+                    self.rootHashes[cs] = meta.calculateMerkleRootHash( self.path, True, cs, hashCache ).encode( 'hex' )
                 if cs == 1:
                     self.rootHash = self.rootHashes[1]
-            if self.generateTorrent:
-                if self.isInCleanup():
-                    return
+            if self.generateTorrent and not self.isInCleanup():
                 tempfd, self.tempMetaFile = tempfile.mkstemp('.torrent')
                 os.close(tempfd)
                 self.metaFile = self.tempMetaFile
-                meta.generateTorrentFile( self.path, self.metaFile )
+                meta.generateTorrentFile( self.path, self.metaFile, hashCache = hashCache )
+            if self.hashCacheFile:
+                meta.saveHashCache( self.hashCacheFile, hashCache )
             # pylint: enable-msg=E1101
 
     def resolveNames(self):
@@ -338,6 +356,30 @@ class local(core.file.file):
                     result.append( [name] + d + [a] )
         return result
     
+    def getDataDigests(self):
+        """
+        Returns the SHA1 digests of the data found in getFile(), as known locally.
+        
+        This is used to verify the integrity of the data on the seeding hosts after it has been sent to them.
+        The dictionary maps the path of each file relative to getFile(), as a tuple, to the hexadecimal SHA1 digest
+        of its contents. For a file object pointing to a single file the only key is the empty tuple.
+        
+        The digests are calculated from the local data, using the hash cache if one was given.
+        
+        @return    A dictionary of digests.
+        """
+        meta = Campaign.loadCoreModule('meta')
+        # PyLint really doesn't understand dynamic loading
+        # pylint: disable-msg=E1101
+        hashCache = None
+        if self.hashCacheFile:
+            hashCache = meta.loadHashCache( self.hashCacheFile )
+        digests = meta.calculateFileDigests( self.path, hashCache )
+        if self.hashCacheFile:
+            meta.saveHashCache( self.hashCacheFile, hashCache )
+        # pylint: enable-msg=E1101
+        return digests
+
     def cleanup(self):
         """
         Cleans up the file object.
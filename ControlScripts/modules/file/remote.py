@@ -4,6 +4,7 @@ from core.campaign import Campaign
 import core.file
 
 import posixpath
+import weakref
 
 def parseError( msg ):
     """
@@ -11,6 +12,50 @@ def parseError( msg ):
     """
     raise Exception( "Parse error for file object on line {0}: {1}".format( Campaign.currentLineNumber, msg ) )
 
+# Cache of remote tree listings: maps host objects to a dictionary from remote path to the listing as returned by listRemoteTree(...)
+remoteTreeCache = weakref.WeakKeyDictionary()
+
+def listRemoteTree( host, path ):
+    """
+    Lists the complete tree of a remote file or directory with a single command.
+    
+    The listing is cached per host object, so each path is listed only once per host in a scenario.
+    
+    @param  host    The host on which the file or directory resides.
+    @param  path    The path to the file or directory on the remote host.
+    
+    @return A sorted list of (relativePath, type) tuples with relativePath in list notation ([] for path itself) and type either 'd'
+            (directory) or 'f' (anything else). None if path does not exist on the host.
+    """
+    if host in remoteTreeCache and path in remoteTreeCache[host]:
+        return remoteTreeCache[host][path]
+    # Symbolic links are followed (-L), so they show up as the directory or file they point to
+    res = host.sendCommand( 'echo "____START____!!!!____STARTLIST____" && find -L "{0}" -printf "%y %P\\n" 2>/dev/null; echo "____END____!!!!____ENDLIST____"'.format( path ) )
+    lines = res.splitlines()
+    if '____START____!!!!____STARTLIST____' not in lines or lines[-1] != '____END____!!!!____ENDLIST____':
+        raise Exception( "file:remote got an unexpected response from host {2} when requesting the tree listing of {0}: {1}".format( path, res, host.name ) )
+    tree = []
+    for line in lines[lines.index( '____START____!!!!____STARTLIST____' )+1:-1]:
+        # The root itself has an empty relative path; allow for its trailing space to have been stripped
+        if len(line) < 1 or line[1:2] not in ('', ' '):
+            raise Exception( "file:remote got an unexpected line from host {2} in the tree listing of {0}: {1}".format( path, line, host.name ) )
+        if line[2:] == '':
+            relPath = []
+        else:
+            relPath = line[2:].split( '/' )
+        if line[0] == 'd':
+            tree.append( (relPath, 'd') )
+        else:
+            tree.append( (relPath, 'f') )
+    if len(tree) == 0:
+        tree = None
+    else:
+        tree.sort()
+    if host not in remoteTreeCache:
+        remoteTreeCache[host] = {}
+    remoteTreeCache[host][path] = tree
+    return tree
+
 class remote(core.file.file):
     """
     File implementation for remote files or directories.
@@ -138,37 +183,13 @@ class remote(core.file.file):
         else:
             name = posixpath.basename(self.path)
         # Extract the complete file tree from the remote host
-        remoteTree = []
-        dirStack = [[]]
-        while len(dirStack) > 0:
-            d = dirStack.pop()
-            # pylint: disable-msg=W0142
-            fullpath = posixpath.join( self.path, *d )
-            # pylint: enable-msg=W0142
-            res = host.sendCommand( '[ -d "{0}" ] && echo "D" || echo "F"'.format( fullpath ) )
-            isdir = res.splitlines()[-1]
-            if isdir == 'D':
-                remoteTree.append( ([name] + d, 'd') )
-                res = host.sendCommand( 'echo "____START____!!!!____STARTLIST____" && ls "{0}"'.format( fullpath ) )
-                dirlist = res.splitlines()
-                startFound = False
-                for i in dirlist:
-                    if startFound:
-                        if i == '.' or i == '..':
-                            continue
-                        dirStack.append( d + [i] )
-                    else:
-                        if i == '____START____!!!!____STARTLIST____':
-                            startFound = True
-                if not startFound:
-                    raise Exception( "file:remote got an unexpected response from host {2} when requesting the directory listing of directory {0}: {1}".format( fullpath, res, host.name ) )
-            elif isdir == 'F':
-                if len(remoteTree) == 0 and self.renameFile:
-                    remoteTree.append( ( ['inputFile'], 'f') )
-                else: 
-                    remoteTree.append( ([name] + d, 'f') )
-            else:
-                raise Exception( "file:remote got an unexpected response from host {2} when trying to see if {0} is a directory or a file: {1}".format( self.path, res, host.name ) )
+        listing = listRemoteTree( host, self.path )
+        if listing is None:
+            raise Exception( "file:remote could not find {0} on host {1}".format( self.path, host.name ) )
+        if listing[0][1] == 'f' and self.renameFile:
+            remoteTree = [ ( ['inputFile'], 'f' ) ]
+        else:
+            remoteTree = [ ( [name] + d, t ) for (d, t) in listing ]
         # Compare the file tree to an earlier found one, or set this one as the base comparison
         if len(self.remoteTree) < 1:
             self.remoteTree = remoteTree
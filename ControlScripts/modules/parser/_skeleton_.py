@@ -130,7 +130,7 @@ class _skeleton_(parser):
         """
         # TODO: Parse those logs. Example:
         #
-        #   if not os.path.exists( os.path.join( logDir, 'log.log' ) ):
+        #   if not logExists( os.path.join( logDir, 'log.log' ) ):
         #       raise Exception( "Log file log.log expected for execution {2} of client {0} on host {1}".format( execution.client.name, execution.host.name, execution.getNumber() ) )
         #   f = open( os.path.join( outputDir, 'log.useless' ), 'w' )
         #   if execution.isSeeder():
@@ -141,6 +141,13 @@ class _skeleton_(parser):
         #       f.write( c+"\n" );
         #   f.close()
         #
+        # Raw logs may be stored compressed (see core/logfile.py): check for them with logExists(...) and open them with
+        # openLog(...) instead of os.path.exists(...) and open(...).
+        #
+        # Line based logs are most easily parsed by declaring a lineTable (see core/linetable.py) with the patterns to
+        # look for and the methods that handle them, and implementing logConsumers(...) instead of this method; the
+        # logs are then read only once for all parsers of an execution. parser:libtorrent is a simple example of this.
+        #
         # You really must implement this:
         raise Exception( "Not implemented" )
 
@@ -167,7 +174,7 @@ class _skeleton_(parser):
             - execution.client is available but incomplete
                 - execution.client.name is available and reads '__reparse__'
                 - execution.client.isSideService() is available
-                    - returns True unless any log exists for the execution
+                    - returns True if the execution was a side service or no log exists for it
             - execution.timeout is available and 0.0 unless the data was saved using processor:savetimeout
             - execution.isSeeder() is available and False unless the data was saved using processor:isSeeder (and this was a seeder)
             - execution.host is available but limited 
@@ -1,7 +1,8 @@
 from core.parser import parser
+from core.logfile import logExists
+from core.linetable import lineTable, lineState, kilobytes, percentage
 
 import os
-import re
 
 class aria2(parser):
     """
@@ -24,6 +25,13 @@ class aria2(parser):
     -- download speed (kB/s)
     """
 
+    # The rules for parsing log.log
+    table = lineTable( ['time', 'percent', 'upspeed', 'dlspeed'], [(0, 0, 0, 0)] )
+    table.addRule( '^ \\*\\*\\* Download Progress Summary as of [^ ]* *[^ ]* *([0-9][0-9]*) *([0-9][0-9]*):([0-9][0-9]*):([0-9][0-9]*) .*$', 'parseSummary', [int, int, int, int] )
+    table.addRule( '.*NOTICE - Download complete', 'parseComplete' )
+    table.addRule( '^\\[\\#1 SIZE:0B/0B CN:[0-9]* SPD:0Bs.*', 'parseEmptyProgress' )
+    table.addRule( '^\\[\\#1 SIZE:([0-9]*)B/([0-9]*)B\\([0-9]*%\\) CN:[0-9]* SPD:([0-9]*)Bs ETA:.*\\]$', 'parseProgress' )
+
     def __init__(self, scenario):
         """
         Initialization of a generic parser object.
@@ -70,87 +78,72 @@ class aria2(parser):
         """
         parser.resolveNames(self)
 
-    def parseLogs(self, execution, logDir, outputDir):
+    def logConsumers(self, execution, logDir, outputDir):
         """
-        Parse the logs for the current execution.
-
-        Be sure to document in the header of your module which logs you expect to be present and with which filename.
-
-        Subclassers must override this method.
+        Returns the consumers that parse the logs for the current execution while they are being read.
 
         @param  execution   The execution for which to parse the logs.
         @param  logDir      The path to the directory on the local machine where the logs reside.
         @param  outputDir   The path to the directory on the local machine where the parsed logs are to be stored.
+
+        @return A dictionary from the name of each raw log, relative to logDir, to its consumer.
         """
         logfile = os.path.join(logDir, 'log.log')
         datafile = os.path.join(outputDir, 'log.data')
-        if not os.path.exists( logfile ) or not os.path.isfile( logfile ):
+        if not logExists( logfile ):
             raise Exception( "parser:aria2 expects the file log.log to be available for execution {0} of client {1} on host {2}".format( execution.getNumber(), execution.client.name, execution.host.name ) )
         if os.path.exists( datafile ) and not execution.isFake():
             raise Exception( "parser:aria2 wants to create log.data, but that already exists for execution {0} of client {1} on host {2}".format( execution.getNumber(), execution.client.name, execution.host.name ) )
-        fl = None
-        fd = None
-        try:
-            fl = open( logfile, 'r' )
-            fd = open( datafile, 'w' )
-            fd.write( "time percent upspeed dlspeed\n0 0 0 0\n" )
-            firstTime = -1
-            relTime = -1
-            firstDay = ''
-            lastRelTime = ''
-            
-            for line in fl:
-                m = re.match( '^ \\*\\*\\* Download Progress Summary as of [^ ]* *[^ ]* *([0-9][0-9]*) *([0-9][0-9]*):([0-9][0-9]*):([0-9][0-9]*) .*$', line )
-                if firstTime == -1:
-                    if not m:
-                        continue
-                    firstDay = int(m.group(1))
-                    firstTime = int(m.group(4)) + 60 * int(m.group(3)) + 3600 * int(m.group(2))
-                    relTime = 1
-                    continue
-                
-                if m:
-                    relTime = int(m.group(4)) + 60 * int(m.group(3)) + 3600 * int(m.group(2))
-                    if firstDay != int(m.group(1)):
-                        relTime += 24 * 3600
-                    relTime -= firstTime
-                    continue
-                
-                if re.match( '.*NOTICE - Download complete', line ):
-                    if relTime == -1:
-                        relTime = lastRelTime + 1
-                    fd.write( "{0} 100.0 0 0\n".format( relTime ) )
-                    relTime = -1
-                
-                if relTime == -1:
-                    continue
-                
-                m = re.match( '^\\[\\#1 SIZE:0B/0B CN:[0-9]* SPD:0Bs.*', line )
-                if m:
-                    fd.write( "{0} 0 0 0\n".format( relTime ) )
-                    lastRelTime = relTime
-                    relTime = -1
-                
-                m = re.match( '^\\[\\#1 SIZE:([0-9]*)B/([0-9]*)B\\([0-9]*%\\) CN:[0-9]* SPD:([0-9]*)Bs ETA:.*\\]$', line )
-                if m:
-                    percentDone = 100.0 * ( float(int(m.group(1))) / float(int(m.group(2))) )
-                    downspeed = int(m.group(3)) / 1024.0
-                    
-                    fd.write( "{0} {1} 0 {2}\n".format( relTime, percentDone, downspeed ) )
-                    
-                    lastRelTime = relTime
-                    relTime = -1
-        finally:
-            try:
-                if fd:
-                    fd.close()
-            except Exception:
-                pass
-            try:
-                if fl:
-                    fl.close()
-            except Exception:
-                pass
+        return { 'log.log': self.table.consume( datafile, self, lineState( firstTime = -1, relTime = -1, firstDay = '', lastRelTime = '' ) ) }
+
+    def parseSummary(self, state, day, hours, minutes, seconds):
+        """
+        Handles the header of a progress summary, which gives the time of the progress line that follows it.
+        """
+        if state.firstTime == -1:
+            state.firstDay = day
+            state.firstTime = seconds + 60 * minutes + 3600 * hours
+            state.relTime = 1
+            return None
+        state.relTime = seconds + 60 * minutes + 3600 * hours
+        if state.firstDay != day:
+            state.relTime += 24 * 3600
+        state.relTime -= state.firstTime
+        return None
+
+    def parseComplete(self, state):
+        """
+        Handles the notice that the download has completed.
+        """
+        if state.firstTime == -1:
+            return None
+        if state.relTime == -1:
+            state.relTime = state.lastRelTime + 1
+        row = ( state.relTime, 100.0, 0, 0 )
+        state.relTime = -1
+        return row
+
+    def parseEmptyProgress(self, state):
+        """
+        Handles a progress line from before the size of the download is known.
+        """
+        if state.relTime == -1:
+            return None
+        row = ( state.relTime, 0, 0, 0 )
+        state.lastRelTime = state.relTime
+        state.relTime = -1
+        return row
+
+    def parseProgress(self, state, done, size, speed):
+        """
+        Handles a progress line.
+        """
+        if state.relTime == -1:
+            return None
+        row = ( state.relTime, percentage( int(done), int(size) ), 0, kilobytes( speed ) )
+        state.lastRelTime = state.relTime
+        state.relTime = -1
+        return row
 
     def canReparse(self):
         """
@@ -175,7 +168,7 @@ class aria2(parser):
             - execution.client is available but incomplete
                 - execution.client.name is available and reads '__reparse__'
                 - execution.client.isSideService() is available
-                    - returns True unless any log exists for the execution
+                    - returns True if the execution was a side service or no log exists for it
             - execution.timeout is available and 0.0 unless the data was saved using processor:savetimeout
             - execution.isSeeder() is available and False unless the data was saved using processor:isSeeder (and this was a seeder)
             - execution.host is available but limited 
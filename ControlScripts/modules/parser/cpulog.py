@@ -1,4 +1,6 @@
 from core.parser import parser
+from core.logfile import logExists, openLog
+from core.campaign import Campaign
 
 import os
 import re
@@ -8,10 +10,17 @@ class cpulog(parser):
     Parser for the cpu.log file created by having the profile parameter on a client active.
     
     Extra parameters:
-    - [none]
+    - alignTime  Set to any non-empty value to have the times in the parsed logs be relative to the start of the
+                 scenario, corrected for the clock offset of the host, instead of relative to the first sample. This
+                 makes the times of executions on different hosts comparable. Only the logs written by the profiling
+                 sampler can be aligned and only if clock measurements were stored with the logs (clock.log).
     
     Raw logs expected:
-    - cpu.log    A cpu log as created by the profiling function. Not being present is not a problem.
+    - cpu.log    A cpu log as created by the profiling function. Not being present is not a problem. Both the columnar
+                 logs written by the profiling sampler (Utils/procsampler) and the logs of the older profiling loop
+                 are understood.
+    - io.log     An I/O log as created by the profiling sampler. Not being present is not a problem.
+    - net.log    A network log as created by the profiling sampler. Not being present is not a problem.
     
     Parse log files created:
     - cpu.data
@@ -23,8 +32,28 @@ class cpulog(parser):
     -- total CPU time (seconds, float)
     -- peak resident memory size (bytes)
     -- peak virtual memory size (bytes)
+    - io.data (only if io.log is present)
+    -- relative time (seconds, float)
+    -- storage read rate (bytes/s, float)
+    -- storage write rate (bytes/s, float)
+    -- total bytes read from storage (bytes)
+    -- total bytes written to storage (bytes)
+    -- number of open sockets
+    -- total bytes in the send queues of the TCP sockets (bytes)
+    -- total bytes in the receive queues of the TCP sockets (bytes)
+    - net.data (only if net.log is present)
+    -- relative time (seconds, float)
+    -- receive rate (bytes/s, float)
+    -- send rate (bytes/s, float)
+    -- total bytes received (bytes)
+    -- total bytes sent (bytes)
+    Note that the network counters are those of all interfaces of the host (or rather: of the network namespace of
+    the client), so they include the traffic of any other process on the host. The relative times in io.data and
+    net.data start at the first sample, as do the totals.
     """
 
+    alignTime = False       # True iff the times in the parsed logs should be aligned to the start of the scenario
+
     def __init__(self, scenario):
         """
         Initialization of a generic parser object.
@@ -50,7 +79,10 @@ class cpulog(parser):
         @param  key     The name of the parameter, i.e. the key from the key=value pair.
         @param  value   The value of the parameter, i.e. the value from the key=value pair.
         """
-        parser.parseSetting(self, key, value)
+        if key == 'alignTime':
+            self.alignTime = ( value != '' )
+        else:
+            parser.parseSetting(self, key, value)
 
     def checkSettings(self):
         """
@@ -73,6 +105,13 @@ class cpulog(parser):
     
     fullDatePattern = '^([0-9]*-[0-9]*-[0-9]*) ([0-9]*):([0-9]*):([0-9]*)\\.([0-9]*)$'
     brokenDatePattern = '^([0-9]*-[0-9]*-[0-9]*) ([0-9]*):([0-9]*):([0-9]*)\\.%N$'
+    # pid (comm) state ppid pgrp session tty_nr tpgid flags minflt cminflt majflt cmajflt utime stime cutime cstime
+    # %d  (%s)   %c    %d   %d   %d      %d     %d    %d    %d     %d      %d     %d      %d    %d    %d     %d
+    statPattern = '^{0}\\([^)\\n]*\\) +. +{0}{0}{0}{0}{0}{0}{0}{0}{0}{0}({0})({0})({0})({0})'.format( '-?[0-9]* +' )
+    # VSZ, RSS
+    memPattern = '^[ \\t]*([0-9]*)[ \\t]+([0-9]*)$'
+    # The number of bytes of a log that is read and matched at once
+    batchSize = 4 * 1024 * 1024
     
     def fullDateToSecs(self, m):
         return self.brokenDateToSecs(m) + float(m.group(5)) * 10**(-1 * len(m.group(5))) 
@@ -80,6 +119,20 @@ class cpulog(parser):
     def brokenDateToSecs(self, m):
         return int(m.group(2)) * 3600 + 60 * int(m.group(3)) + int(m.group(4))
 
+    def readBatches(self, fl):
+        """
+        Reads the remainder of a log in batches of complete lines.
+
+        @param  fl      The file object of the log.
+
+        @return A generator of strings, each holding a number of complete lines of the log.
+        """
+        while True:
+            lines = fl.readlines( cpulog.batchSize )
+            if not lines:
+                return
+            yield ''.join( lines )
+
     def parseLogs(self, execution, logDir, outputDir):
         """
         Parse the logs for the current execution.
@@ -92,10 +145,17 @@ class cpulog(parser):
         @param  logDir      The path to the directory on the local machine where the logs reside.
         @param  outputDir   The path to the directory on the local machine where the parsed logs are to be stored.
         """
+        alignment = None
+        if self.alignTime:
+            alignment = self.loadClockAlignment( logDir )
+            if alignment is None:
+                Campaign.logger.log( "parser:cpulog can't align the times for execution {0} of client {1} on host {2}: no clock measurements available. Using times relative to the first sample.".format( execution.getNumber(), execution.client.name, execution.host.name ) )
+        self.parseIOLog( execution, logDir, outputDir, alignment )
+        self.parseNetLog( execution, logDir, outputDir, alignment )
         logfile = os.path.join(logDir, 'cpu.log')
         datafile = os.path.join(outputDir, 'cpu.data')
         peakfile = os.path.join(outputDir, 'peak.data')
-        if not os.path.exists( logfile ) or not os.path.isfile( logfile ):
+        if not logExists( logfile ):
             return
         if os.path.exists( datafile ) and not execution.isFake():
             raise Exception( "parser:cpulog wants to create cpu.data, but that already exists for execution {0} of client {1} on host {2}".format( execution.getNumber(), execution.client.name, execution.host.name ) )
@@ -105,98 +165,306 @@ class cpulog(parser):
         fd = None
         fp = None
         try:
-            fl = open( logfile, 'r' )
+            fl = openLog( logfile )
             fd = open( datafile, 'w' )
             fp = open( peakfile, 'w' )
             fd.write( "time cpu% mem\n0 0 0\n" )
             fp.write( "cputime maxmem maxvirtmem\n")
-            startTime = -1
-            startDate = None
-            datePattern = cpulog.fullDatePattern
-            dateFunc = cpulog.fullDateToSecs
-            # pid (comm) state ppid pgrp session tty_nr tpgid flags minflt cminflt majflt cmajflt utime stime cutime cstime
-            # %d  (%s)   %c    %d   %d   %d      %d     %d    %d    %d     %d      %d     %d      %d    %d    %d     %d
-            statPattern = '^{0}\([^)]*\) +. +{0}{0}{0}{0}{0}{0}{0}{0}{0}{0}({0})({0})({0})({0})'.format( '-?[0-9]* +' )
-            relTime = -1
-            clockticks = -1
-            cpuTime = -1
-            utime = 0
-            stime = 0
-            cutime = 0
-            cstime = 0
-            cpuTime = 0.0
-            prevRelTime = -1.0
-            maxcputime = 0.0
-            maxmemsize = 0
-            maxvirtmemsize = 0
-            for line in fl:
-                # First line must be clocks ticks per sec (sysconf(_SC_CLK_TCK))
-                if clockticks == -1:
-                    clockticks = float(line)
-                    continue                
-                #12-03-15 12:22:12.386824326
-                m = re.match(datePattern, line)
-                if startTime == -1:
-                    if m:
-                        startDate = m.group(1)
-                        startTime = dateFunc(self, m)
+            header = fl.readline()
+            if header[:13] == '#procsampler ':
+                self.parseSamplerLog( header, fl, fd, fp, alignment )
+                return
+            fl.seek( 0 )
+            self.parsePsLog( fl, fd, fp )
+        finally:
+            try:
+                if fp:
+                    fp.close()
+            except Exception:
+                pass
+            try:
+                if fd:
+                    fd.close()
+            except Exception:
+                pass
+            try:
+                if fl:
+                    fl.close()
+            except Exception:
+                pass
+
+    def outputTime(self, alignment, sampleTime, startTime):
+        """
+        Returns the time of a sample as it is to be written to the parsed logs.
+
+        @param  alignment   The clock alignment as returned by loadClockAlignment(...), or None for times relative to the first sample.
+        @param  sampleTime  The time of the sample according to the clock of the host.
+        @param  startTime   The time of the first sample according to the clock of the host.
+
+        @return The time in seconds since the start of the scenario if aligned, or since the first sample otherwise.
+        """
+        if alignment:
+            return self.toScenarioTime( alignment, sampleTime )
+        return sampleTime - startTime
+
+    def parsePsLog(self, fl, fd, fp):
+        """
+        Parse a cpu log as written by the older profiling loop.
+
+        The log consists of the number of clock ticks per second on the first line, followed by one block per sample
+        of a date line, the line from /proc/PID/stat and a line with the VSZ and RSS from ps.
+
+        The lines are classified and their fields extracted in batches by a single regular expression.
+
+        @param  fl          The file object of the log, positioned at the start.
+        @param  fd          The file object to write the cpu data to.
+        @param  fp          The file object to write the peak data to.
+        """
+        maxcputime = 0.0
+        maxmemsize = 0
+        maxvirtmemsize = 0
+        # First line must be clocks ticks per sec (sysconf(_SC_CLK_TCK))
+        line = fl.readline()
+        if line == '':
+            fp.write( '{0} {1} {2}\n'.format( maxcputime, maxmemsize, maxvirtmemsize ) )
+            return
+        clockticks = float(line)
+        # The first date line gives the start; it also tells whether ps supported %N
+        #12-03-15 12:22:12.386824326
+        startTime = -1
+        datePattern = cpulog.fullDatePattern
+        for line in iter( fl.readline, '' ):
+            m = re.match( cpulog.fullDatePattern, line )
+            if m:
+                startDate = m.group(1)
+                startTime = self.fullDateToSecs(m)
+                break
+            # See if we need to fall back to full secs due to unextended ps
+            m = re.match( cpulog.brokenDatePattern, line )
+            if m:
+                datePattern = cpulog.brokenDatePattern
+                startDate = m.group(1)
+                startTime = self.brokenDateToSecs(m)
+                break
+        # One alternative per kind of line, each captured as a whole; a match gives a tuple with the whole line and the
+        # fields in the groups of its alternative and empty strings elsewhere
+        linePattern = re.compile( '^(?:({0})|({1})|({2}))'.format( datePattern[1:], cpulog.statPattern[1:], cpulog.memPattern[1:] ), re.M )
+        fullDates = ( datePattern == cpulog.fullDatePattern )
+        statIndex = re.compile( datePattern ).groups + 1
+        memIndex = statIndex + 5
+        relTime = 0
+        cpuTime = 0.0
+        utime = 0
+        stime = 0
+        cutime = 0
+        cstime = 0
+        prevRelTime = -1.0
+        for batch in self.readBatches( fl ):
+            out = []
+            for r in linePattern.findall( batch ):
+                if r[0]:
+                    if fullDates:
+                        relTime = (int(r[2]) * 3600 + 60 * int(r[3]) + int(r[4]) + float(r[5]) * 10**(-1 * len(r[5]))) - startTime
                     else:
-                        # See if we need to fall back to full secs due to unextended ps
-                        m = re.match(cpulog.brokenDatePattern, line)
-                        if m:
-                            datePattern = cpulog.brokenDatePattern
-                            dateFunc = cpulog.brokenDateToSecs
-                            startDate = m.group(1)
-                            startTime = dateFunc(self, m)
-                    relTime = 0
-                    continue
-                if m:
-                    relTime = dateFunc(self, m) - startTime
-                    if m.group(1) != startDate:
+                        relTime = (int(r[2]) * 3600 + 60 * int(r[3]) + int(r[4])) - startTime
+                    if r[1] != startDate:
                         relTime += 24 * 3600
-                    continue
-                # pid (comm) state ppid pgrp session tty_nr tpgid flags minflt cminflt majflt cmajflt utime stime cutime cstime
-                # %d  (%s)   %c    %d   %d   %d      %d     %d    %d    %d     %d      %d     %d      %d    %d    %d     %d
-                m = re.match(statPattern, line)
-                if m:
-                    newutime = int(m.group(1))
-                    newstime = int(m.group(2))
-                    newcutime = int(m.group(3))
-                    newcstime = int(m.group(4))
+                elif r[statIndex]:
+                    newutime = int(r[statIndex + 1])
+                    newstime = int(r[statIndex + 2])
+                    newcutime = int(r[statIndex + 3])
+                    newcstime = int(r[statIndex + 4])
                     cpuTime = (((newutime - utime) + (newstime - stime) + (newcutime - cutime) + (newcstime - cstime)) / (clockticks * (relTime - prevRelTime))) * 100.0
                     utime = newutime
                     stime = newstime
                     cutime = newcutime
                     cstime = newcstime
-                    maxcputime = 1.0 * (utime + stime + cutime + cstime) / clockticks
                     # By definition maxcputime will always grow (since the base data is cumulative and will always grow)
-                    continue 
-                # VSZ, RSS
-                m = re.match('^[ \\t]*([0-9]*)[ \\t]+([0-9]*)$', line)
-                if m:
-                    if int(m.group(2)) > maxmemsize:
-                        maxmemsize = int(m.group(2))
-                    if int(m.group(1)) > maxvirtmemsize:
-                        maxvirtmemsize = int(m.group(1))
-                    fd.write( '{0} {1} {2} {3}\n'.format( relTime, cpuTime, m.group(2), m.group(1) ) )
+                    maxcputime = 1.0 * (utime + stime + cutime + cstime) / clockticks
+                else:
+                    if int(r[memIndex + 2]) > maxmemsize:
+                        maxmemsize = int(r[memIndex + 2])
+                    if int(r[memIndex + 1]) > maxvirtmemsize:
+                        maxvirtmemsize = int(r[memIndex + 1])
+                    out.append( '{0} {1} {2} {3}\n'.format( relTime, cpuTime, r[memIndex + 2], r[memIndex + 1] ) )
                     prevRelTime = relTime
-            fp.write( '{0} {1} {2}\n'.format( maxcputime, maxmemsize, maxvirtmemsize ) )
+            fd.write( ''.join( out ) )
+        fp.write( '{0} {1} {2}\n'.format( maxcputime, maxmemsize, maxvirtmemsize ) )
+
+    def parseSamplerLog(self, header, fl, fd, fp, alignment = None):
+        """
+        Parse a cpu log as written by the profiling sampler.
+
+        The log consists of the header line
+            #procsampler 1 clockticks pagesize
+        followed by one line per sample
+            time utime stime cutime cstime vsize rss
+        with time in seconds, the CPU times in clock ticks, vsize in bytes and rss in pages.
+
+        @param  header      The header line of the log.
+        @param  fl          The file object of the log, positioned after the header.
+        @param  fd          The file object to write the cpu data to.
+        @param  fp          The file object to write the peak data to.
+        @param  alignment   The clock alignment as returned by loadClockAlignment(...), or None for times relative to the first sample.
+        """
+        fields = header.split()
+        if len(fields) != 4 or fields[1] != '1':
+            raise Exception( "parser:cpulog found an unsupported cpu log header: {0}".format( header.strip() ) )
+        clockticks = float(fields[2])
+        pagesizeKB = int(fields[3]) / 1024.0
+        startTime = None
+        prevTime = 0.0
+        prevTicks = 0
+        ticks = 0
+        maxmemsize = 0
+        maxvirtmemsize = 0
+        for line in fl:
+            values = line.split()
+            if len(values) != 7:
+                continue
+            sampleTime = float(values[0])
+            ticks = int(values[1]) + int(values[2]) + int(values[3]) + int(values[4])
+            virtmemsize = int(values[5]) / 1024
+            memsize = int(int(values[6]) * pagesizeKB)
+            if startTime is None:
+                startTime = sampleTime
+                cpuTime = 0.0
+            elif sampleTime > prevTime:
+                cpuTime = ((ticks - prevTicks) / (clockticks * (sampleTime - prevTime))) * 100.0
+            else:
+                continue
+            if memsize > maxmemsize:
+                maxmemsize = memsize
+            if virtmemsize > maxvirtmemsize:
+                maxvirtmemsize = virtmemsize
+            fd.write( '{0} {1} {2} {3}\n'.format( self.outputTime( alignment, sampleTime, startTime ), cpuTime, memsize, virtmemsize ) )
+            prevTime = sampleTime
+            prevTicks = ticks
+        fp.write( '{0} {1} {2}\n'.format( ticks / clockticks, maxmemsize, maxvirtmemsize ) )
+
+    def parseIOLog(self, execution, logDir, outputDir, alignment = None):
+        """
+        Parse the I/O log of the profiling sampler into io.data.
+
+        @param  execution   The execution for which to parse the logs.
+        @param  logDir      The path to the directory on the local machine where the logs reside.
+        @param  outputDir   The path to the directory on the local machine where the parsed logs are to be stored.
+        @param  alignment   The clock alignment as returned by loadClockAlignment(...), or None for times relative to the first sample.
+        """
+        logfile = os.path.join(logDir, 'io.log')
+        datafile = os.path.join(outputDir, 'io.data')
+        if not logExists( logfile ):
+            return
+        if os.path.exists( datafile ) and not execution.isFake():
+            raise Exception( "parser:cpulog wants to create io.data, but that already exists for execution {0} of client {1} on host {2}".format( execution.getNumber(), execution.client.name, execution.host.name ) )
+        fl = None
+        fd = None
+        try:
+            fl = openLog( logfile )
+            fd = open( datafile, 'w' )
+            fd.write( "time readrate writerate read written sockets sendqueue recvqueue\n" )
+            startTime = None
+            prevTime = 0.0
+            startRead = 0
+            startWritten = 0
+            prevRead = 0
+            prevWritten = 0
+            for line in fl:
+                values = line.split()
+                if len(values) != 10 or values[0][:1] == '#':
+                    continue
+                sampleTime = float(values[0])
+                # Storage counters are -1 if /proc/PID/io could not be read
+                read = max( int(values[5]), 0 )
+                written = max( int(values[6]), 0 )
+                if startTime is None:
+                    startTime = sampleTime
+                    startRead = read
+                    startWritten = written
+                    readRate = 0.0
+                    writeRate = 0.0
+                elif sampleTime > prevTime:
+                    readRate = (read - prevRead) / (sampleTime - prevTime)
+                    writeRate = (written - prevWritten) / (sampleTime - prevTime)
+                else:
+                    continue
+                fd.write( '{0} {1} {2} {3} {4} {5} {6} {7}\n'.format( self.outputTime( alignment, sampleTime, startTime ), readRate, writeRate, read - startRead, written - startWritten, values[7], values[8], values[9] ) )
+                prevTime = sampleTime
+                prevRead = read
+                prevWritten = written
         finally:
             try:
-                if fp:
-                    fp.close()
+                if fd:
+                    fd.close()
             except Exception:
                 pass
             try:
-                if fd:
-                    fd.close()
+                if fl:
+                    fl.close()
             except Exception:
                 pass
+
+    def parseNetLog(self, execution, logDir, outputDir, alignment = None):
+        """
+        Parse the network log of the profiling sampler into net.data.
+
+        The counters of all interfaces are summed.
+
+        @param  execution   The execution for which to parse the logs.
+        @param  logDir      The path to the directory on the local machine where the logs reside.
+        @param  outputDir   The path to the directory on the local machine where the parsed logs are to be stored.
+        @param  alignment   The clock alignment as returned by loadClockAlignment(...), or None for times relative to the first sample.
+        """
+        logfile = os.path.join(logDir, 'net.log')
+        datafile = os.path.join(outputDir, 'net.data')
+        if not logExists( logfile ):
+            return
+        if os.path.exists( datafile ) and not execution.isFake():
+            raise Exception( "parser:cpulog wants to create net.data, but that already exists for execution {0} of client {1} on host {2}".format( execution.getNumber(), execution.client.name, execution.host.name ) )
+        # Sum the counters of all interfaces per sample; the lines of one sample share the same time
+        samples = []
+        fl = None
+        try:
+            fl = openLog( logfile )
+            for line in fl:
+                values = line.split()
+                if len(values) != 6 or values[0][:1] == '#':
+                    continue
+                if len(samples) == 0 or samples[-1][0] != values[0]:
+                    samples.append( [values[0], 0, 0] )
+                samples[-1][1] += int(values[2])
+                samples[-1][2] += int(values[4])
+        finally:
             try:
                 if fl:
                     fl.close()
             except Exception:
                 pass
+        fd = None
+        try:
+            fd = open( datafile, 'w' )
+            fd.write( "time recvrate sendrate received sent\n" )
+            if len(samples) == 0:
+                return
+            startTime = float(samples[0][0])
+            prevTime = startTime
+            prevReceived = samples[0][1]
+            prevSent = samples[0][2]
+            fd.write( '{0} 0.0 0.0 0 0\n'.format( self.outputTime( alignment, startTime, startTime ) ) )
+            for sample in samples[1:]:
+                sampleTime = float(sample[0])
+                if sampleTime <= prevTime:
+                    continue
+                fd.write( '{0} {1} {2} {3} {4}\n'.format( self.outputTime( alignment, sampleTime, startTime ), (sample[1] - prevReceived) / (sampleTime - prevTime), (sample[2] - prevSent) / (sampleTime - prevTime), sample[1] - samples[0][1], sample[2] - samples[0][2] ) )
+                prevTime = sampleTime
+                prevReceived = sample[1]
+                prevSent = sample[2]
+        finally:
+            try:
+                if fd:
+                    fd.close()
+            except Exception:
+                pass
 
     def canReparse(self):
         """
@@ -221,7 +489,7 @@ class cpulog(parser):
             - execution.client is available but incomplete
                 - execution.client.name is available and reads '__reparse__'
                 - execution.client.isSideService() is available
-                    - returns True unless any log exists for the execution
+                    - returns True if the execution was a side service or no log exists for it
             - execution.timeout is available and 0.0 unless the data was saved using processor:savetimeout
             - execution.isSeeder() is available and False unless the data was saved using processor:isSeeder (and this was a seeder)
             - execution.host is available but limited 
@@ -1,6 +1,7 @@
 from core.parser import parser
+from core.logfile import logExists
+from core.linetable import lineTable, lineState, kilobytes
 import os
-import re
 
 class libtorrent(parser):
     """
@@ -19,6 +20,10 @@ class libtorrent(parser):
     -- download speed (kB/s)
     """
 
+    # The rules for parsing log.log
+    table = lineTable( ['time', 'percent', 'upspeed', 'dlspeed'], [(0, 0, 0, 0)] )
+    table.addRule( '^([0-9\\.]+)[ \\t]+([0-9\\.]+)[ \\t]+([0-9\\.]+)[ \\t]+([0-9\\.]+)[ \\t]*$', 'parseSample', [None, None, kilobytes, kilobytes] )
+
     def __init__(self, scenario):
         """
         Initialization of a generic parser object.
@@ -57,51 +62,29 @@ class libtorrent(parser):
         """
         parser.checkSettings(self)
 
-    def parseLogs(self, execution, logDir, outputDir):
+    def logConsumers(self, execution, logDir, outputDir):
         """
-        Parse the logs for the current execution.
-
-        Be sure to document in the header of your module which logs you expect to be present and with which filename.
-
-        Subclassers must override this method.
+        Returns the consumers that parse the logs for the current execution while they are being read.
 
         @param  execution   The execution for which to parse the logs.
         @param  logDir      The path to the directory on the local machine where the logs reside.
         @param  outputDir   The path to the directory on the local machine where the parsed logs are to be stored.
+
+        @return A dictionary from the name of each raw log, relative to logDir, to its consumer.
         """
         logfile = os.path.join(logDir, 'log.log')
         datafile = os.path.join(outputDir, 'log.data')
-        if not os.path.exists( logfile ) or not os.path.isfile( logfile ):
+        if not logExists( logfile ):
             raise Exception( "parser:libtorrent expects the file log.log to be available for execution {0} of client {1} on host {2}".format( execution.getNumber(), execution.client.name, execution.host.name ) )
         if os.path.exists( datafile ) and not execution.isFake():
             raise Exception( "parser:libtorrent wants to create log.data, but that already exists for execution {0} of client {1} on host {2}".format( execution.getNumber(), execution.client.name, execution.host.name ) )
-        fl = None
-        fd = None
-        try:
-            fl = open( logfile, 'r' )
-            fd = open( datafile, 'w' )
-            fd.write( "time percent upspeed dlspeed\n0 0 0 0\n" )
-            
-            for line in fl:
-                m = re.match( '^([0-9\\.]+)[ \\t]+([0-9\\.]+)[ \\t]+([0-9\\.]+)[ \\t]+([0-9\\.]+)[ \\t]*$', line )
-                if m:
-                    time = m.group(1)
-                    percent = m.group(2)
-                    up = int(m.group(3))/1024.0
-                    down = int(m.group(4))/1024.0
-                        
-                    fd.write( "{0} {1} {2} {3}\n".format( time, percent, up, down ) )
-        finally:
-            try:
-                if fd:
-                    fd.close()
-            except Exception:
-                pass
-            try:
-                if fl:
-                    fl.close()
-            except Exception:
-                pass
+        return { 'log.log': self.table.consume( datafile, self, lineState() ) }
+
+    def parseSample(self, state, time, percent, up, down):
+        """
+        Handles a line with a single sample.
+        """
+        return ( time, percent, up, down )
 
     def canReparse(self):
         """
@@ -126,7 +109,7 @@ class libtorrent(parser):
             - execution.client is available but incomplete
                 - execution.client.name is available and reads '__reparse__'
                 - execution.client.isSideService() is available
-                    - returns True unless any log exists for the execution
+                    - returns True if the execution was a side service or no log exists for it
             - execution.timeout is available and 0.0 unless the data was saved using processor:savetimeout
             - execution.isSeeder() is available and False unless the data was saved using processor:isSeeder (and this was a seeder)
             - execution.host is available but limited 
@@ -1,7 +1,8 @@
 from core.parser import parser
+from core.logfile import logExists
+from core.linetable import lineTable, lineState, counterDelta
 
 import os
-import re
 
 class lighttpd(parser):
     """
@@ -21,6 +22,11 @@ class lighttpd(parser):
     -- download speed (kB/s)
     """
 
+    # The rules for parsing log.log
+    table = lineTable( ['time', 'percent', 'upspeed', 'dlspeed'], [(0, 100.0, 0, 0)] )
+    table.addRule( '^([0-9]*\\.[0-9]*)$', 'parseTime', [float] )
+    table.addRule( '^Total kBytes: ([0-9]*)$', 'parseTotal' )
+
     def __init__(self, scenario):
         """
         Initialization of a generic parser object.
@@ -67,64 +73,43 @@ class lighttpd(parser):
         """
         parser.resolveNames(self)
 
-    def parseLogs(self, execution, logDir, outputDir):
+    def logConsumers(self, execution, logDir, outputDir):
         """
-        Parse the logs for the current execution.
-
-        Be sure to document in the header of your module which logs you expect to be present and with which filename.
-
-        Subclassers must override this method.
+        Returns the consumers that parse the logs for the current execution while they are being read.
 
         @param  execution   The execution for which to parse the logs.
         @param  logDir      The path to the directory on the local machine where the logs reside.
         @param  outputDir   The path to the directory on the local machine where the parsed logs are to be stored.
+
+        @return A dictionary from the name of each raw log, relative to logDir, to its consumer.
         """
         logfile = os.path.join(logDir, 'log.log')
         datafile = os.path.join(outputDir, 'log.data')
-        if not os.path.exists( logfile ) or not os.path.isfile( logfile ):
+        if not logExists( logfile ):
             raise Exception( "parser:lighttpd expects the file log.log to be available for execution {0} of client {1} on host {2}".format( execution.getNumber(), execution.client.name, execution.host.name ) )
         if os.path.exists( datafile ) and not execution.isFake():
             raise Exception( "parser:lighttpd wants to create log.data, but that already exists for execution {0} of client {1} on host {2}".format( execution.getNumber(), execution.client.name, execution.host.name ) )
-        fl = None
-        fd = None
-        try:
-            fl = open( logfile, 'r' )
-            fd = open( datafile, 'w' )
-            fd.write( "time percent upspeed dlspeed\n0 100.0 0 0\n" )
-            firstTime = -1
-            relTime = -1
-            lastUploaded = 0
-            
-            for line in fl:
-                if firstTime == -1:
-                    if re.match( '^[0-9]*\\.[0-9]*$', line ):
-                        firstTime = float(line)
-                    continue
-                
-                if re.match( '^[0-9]*\\.[0-9]*$', line ):
-                    relTime = float(line) - firstTime
-                    continue
-                
-                if relTime == -1:
-                    continue
-                
-                m = re.match( '^Total kBytes: ([0-9]*)$', line )
-                if m:
-                    upspeed = int(m.group(1)) - lastUploaded
-                    lastUploaded = int(m.group(1))
-                    fd.write( "{0} 100.0 {1} 0\n".format( relTime, upspeed ) )
-                    relTime = -1
-        finally:
-            try:
-                if fd:
-                    fd.close()
-            except Exception:
-                pass
-            try:
-                if fl:
-                    fl.close()
-            except Exception:
-                pass
+        return { 'log.log': self.table.consume( datafile, self, lineState( firstTime = -1, relTime = -1, lastUploaded = 0 ) ) }
+
+    def parseTime(self, state, time):
+        """
+        Handles a timestamp.
+        """
+        if state.firstTime == -1:
+            state.firstTime = time
+        else:
+            state.relTime = time - state.firstTime
+        return None
+
+    def parseTotal(self, state, total):
+        """
+        Handles the total amount uploaded so far.
+        """
+        if state.relTime == -1:
+            return None
+        row = ( state.relTime, 100.0, counterDelta( state, 'lastUploaded', int(total) ), 0 )
+        state.relTime = -1
+        return row
 
     def canReparse(self):
         """
@@ -149,7 +134,7 @@ class lighttpd(parser):
             - execution.client is available but incomplete
                 - execution.client.name is available and reads '__reparse__'
                 - execution.client.isSideService() is available
-                    - returns True unless any log exists for the execution
+                    - returns True if the execution was a side service or no log exists for it
             - execution.timeout is available and 0.0 unless the data was saved using processor:savetimeout
             - execution.isSeeder() is available and False unless the data was saved using processor:isSeeder (and this was a seeder)
             - execution.host is available but limited 
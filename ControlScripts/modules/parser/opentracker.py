@@ -1,20 +1,42 @@
 from core.parser import parser
+from core.logfile import logExists, openLog
+from core.campaign import Campaign
+
+import os
+import re
 
 class opentracker(parser):
     """
-    A dummy parser.
+    A parser for the tracker statistics sampled by client:opentracker.
     
-    This parser will just ignore the logs of the client.
+    This parser turns the samples of the full scrape statistics of the tracker into time series of the swarms.
     
-    This parser is basically just a copy of none with a different name.
+    Extra parameters:
+    - alignTime     Set to any non-empty value to have the times in the data files be relative to the start of the
+                    scenario, corrected for the clock offset of the host, instead of relative to the start of the
+                    tracker. This makes the times comparable with those of the executions on other hosts. Requires
+                    clock measurements to have been stored with the logs (clock.log).
 
     Raw logs expected:
-    - none or any
+    - log.log
 
     Parse log files created:
-    - none
+    - swarm.data
+    -- relative time (seconds)
+    -- number of torrents known to the tracker
+    -- total number of seeders over all torrents
+    -- total number of leechers over all torrents
+    -- total number of completed downloads over all torrents
+    - torrents.data
+    -- relative time (seconds)
+    -- infohash of the torrent (hexadecimal)
+    -- number of seeders of the torrent
+    -- number of leechers of the torrent
+    -- number of completed downloads of the torrent (0 if the tracker does not report these)
     """
 
+    alignTime = False       # True iff the times in the data files should be aligned to the start of the scenario
+
     def __init__(self, scenario):
         """
         Initialization of a generic parser object.
@@ -40,7 +62,10 @@ class opentracker(parser):
         @param  key     The name of the parameter, i.e. the key from the key=value pair.
         @param  value   The value of the parameter, i.e. the value from the key=value pair.
         """
-        parser.parseSetting(self, key, value)
+        if key == 'alignTime':
+            self.alignTime = ( value != '' )
+        else:
+            parser.parseSetting(self, key, value)
 
     def checkSettings(self):
         """
@@ -73,7 +98,113 @@ class opentracker(parser):
         @param  logDir      The path to the directory on the local machine where the logs reside.
         @param  outputDir   The path to the directory on the local machine where the parsed logs are to be stored.
         """
-        pass
+        logfile = os.path.join(logDir, 'log.log')
+        swarmfile = os.path.join(outputDir, 'swarm.data')
+        torrentsfile = os.path.join(outputDir, 'torrents.data')
+        if not logExists( logfile ):
+            raise Exception( "parser:opentracker expects the file log.log to be available for execution {0} of client {1} on host {2}".format( execution.getNumber(), execution.client.name, execution.host.name ) )
+        for datafile in [swarmfile, torrentsfile]:
+            if os.path.exists( datafile ) and not execution.isFake():
+                raise Exception( "parser:opentracker wants to create {3}, but that already exists for execution {0} of client {1} on host {2}".format( execution.getNumber(), execution.client.name, execution.host.name, os.path.basename( datafile ) ) )
+        alignment = None
+        if self.alignTime:
+            alignment = self.loadClockAlignment( logDir )
+            if alignment is None:
+                Campaign.logger.log( "parser:opentracker can't align the times for execution {0} of client {1} on host {2}: no clock measurements available. Using times relative to the start of the tracker.".format( execution.getNumber(), execution.client.name, execution.host.name ) )
+        fl = None
+        fs = None
+        ft = None
+        try:
+            fl = openLog( logfile )
+            fs = open( swarmfile, 'w' )
+            ft = open( torrentsfile, 'w' )
+            fs.write( "time torrents seeders leechers completed\n" )
+            ft.write( "time infohash seeders leechers completed\n" )
+            firstTime = -1
+            relTime = -1
+            # Totals of the current sample: [torrents, seeders, leechers, completed]
+            totals = None
+            
+            for line in fl:
+                if re.match( '^[0-9]*\\.[0-9]*$', line ):
+                    if totals is not None:
+                        fs.write( "{0} {1} {2} {3} {4}\n".format( relTime, *totals ) )
+                    if firstTime == -1:
+                        # The first time logged is the start of the tracker, not a sample
+                        firstTime = float(line)
+                        totals = None
+                        continue
+                    if alignment:
+                        relTime = self.toScenarioTime( alignment, float(line) )
+                    else:
+                        relTime = float(line) - firstTime
+                    totals = [0, 0, 0, 0]
+                    continue
+                
+                if totals is None:
+                    continue
+                
+                m = re.match( '^([0-9a-fA-F]{40}):([0-9]+):([0-9]+)(?::([0-9]+))?$', line.strip() )
+                if m:
+                    completed = 0
+                    if m.group(4) is not None:
+                        completed = int(m.group(4))
+                    ft.write( "{0} {1} {2} {3} {4}\n".format( relTime, m.group(1).lower(), m.group(2), m.group(3), completed ) )
+                    totals[0] += 1
+                    totals[1] += int(m.group(2))
+                    totals[2] += int(m.group(3))
+                    totals[3] += completed
+            if totals is not None:
+                fs.write( "{0} {1} {2} {3} {4}\n".format( relTime, *totals ) )
+        finally:
+            try:
+                if ft:
+                    ft.close()
+            except Exception:
+                pass
+            try:
+                if fs:
+                    fs.close()
+            except Exception:
+                pass
+            try:
+                if fl:
+                    fl.close()
+            except Exception:
+                pass
+
+    def canReparse(self):
+        """
+        Return whether this parser can be used to reparse after a run has already been torn down.
+        
+        This mainly signals that this parser functions within the following constraints:
+        - resolveNames is never called
+        - host, client and file object are explicitly unavailable
+        - Only part of the scenario object is available:
+            - scenario.isFake() is available and returns True
+            - scenario.name is available and correct
+            - scenario.getObjects(...) is available and will return all executions but an empty list otherwise
+            - scenario.getObjectsDict(...) is available and will return all executions but an empty dictionary otherwise
+            - The executions returned by this scenario are limited as described below
+            - The methods are not available during initialization
+        - Only part of the static Campaign object is available:
+            - Campaign.logger is available as normally and logs to stdout
+            - Campaign.which is available as normally
+        - Only part of the execution object is available:
+            - execution.isFake() is available and returns True
+            - execution.getNumber() is available and limited
+            - execution.client is available but incomplete
+                - execution.client.name is available and reads '__reparse__'
+                - execution.client.isSideService() is available
+                    - returns True if the execution was a side service or no log exists for it
+            - execution.timeout is available and 0.0 unless the data was saved using processor:savetimeout
+            - execution.isSeeder() is available and False unless the data was saved using processor:isSeeder (and this was a seeder)
+            - execution.host is available but limited 
+                - execution.host.name is available and reads '__reparse__' unless the data was saved using processor:savehostname
+        
+        @return    True iff this parser can reparse.
+        """
+        return True
 
     @staticmethod
     def APIVersion():
@@ -1,4 +1,6 @@
 from core.parser import parser
+from core.logfile import logExists
+from core.linetable import lineTable, lineState, counterDelta, percentage
 
 import os
 
@@ -22,6 +24,12 @@ class swift(parser):
     -- download speed (kB/s)
     """
 
+    # The rules for parsing log.log
+    table = lineTable( ['time', 'percent', 'upspeed', 'dlspeed'], [(0, 0, 0, 0)] )
+    table.addRule( 'SLEEP', 'parseSleep' )
+    # Fields of the done lines are separated by ' ', ',', '(' or ')'
+    table.addRule( 'done|DONE', 'parseDone', [int, int, int, int], '[ ,()]', [1, 3, 10, 16] )
+
     def __init__(self, scenario):
         """
         Initialization of a generic parser object.
@@ -68,61 +76,43 @@ class swift(parser):
         """
         parser.resolveNames(self)
 
-    def parseLogs(self, execution, logDir, outputDir):
+    def logConsumers(self, execution, logDir, outputDir):
         """
-        Parse the logs for the current execution.
-
-        Be sure to document in the header of your module which logs you expect to be present and with which filename.
-
-        Subclassers must override this method.
+        Returns the consumers that parse the logs for the current execution while they are being read.
 
         @param  execution   The execution for which to parse the logs.
         @param  logDir      The path to the directory on the local machine where the logs reside.
         @param  outputDir   The path to the directory on the local machine where the parsed logs are to be stored.
+
+        @return A dictionary from the name of each raw log, relative to logDir, to its consumer.
         """
         logfile = os.path.join(logDir, 'log.log')
         datafile = os.path.join(outputDir, 'log.data')
-        if not os.path.exists( logfile ) or not os.path.isfile( logfile ):
+        if not logExists( logfile ):
             raise Exception( "parser:swift expects the file log.log to be available for execution {0} of client {1} on host {2}".format( execution.getNumber(), execution.client.name, execution.host.name ) )
         if os.path.exists( datafile ) and not execution.isFake():
             raise Exception( "parser:swift wants to create log.data, but that already exists for execution {0} of client {1} on host {2}".format( execution.getNumber(), execution.client.name, execution.host.name ) )
-        fl = None
-        fd = None
-        try:
-            fl = open( logfile, 'r' )
-            fd = open( datafile, 'w' )
-            fd.write( "time percent upspeed dlspeed\n0 0 0 0\n" )
-            relTime = 0
-            up_bytes = 0
-            down_bytes = 0
-            for line in fl:
-                if line[:5] == 'SLEEP':
-                    relTime += 1
-                elif line[:4] == 'done' or line[:4] == 'DONE':
-                    # Split over ' ', then over ',', then over '(', then over ')', and keep it all in one array
-                    split = reduce( lambda x,y: x + y.split( ')' ), reduce(lambda x,y: x + y.split( '(' ), reduce(lambda x,y: x + y.split( ',' ), line.split( ' ' ), []), []), [])
-                    dlspeed = (int(split[16]) - down_bytes) / 1024.0
-                    down_bytes = int(split[16])
-                    upspeed = (int(split[10]) - up_bytes) / 1024.0
-                    up_bytes = int(split[10])
-                                        
-                    percent = 0
-                    if int(split[3]) > 0:
-                        percent = 100.0 * ( float(int(split[1])) / float(int(split[3])) )
-                        
-                    fd.write( "{0} {1} {2} {3}\n".format( relTime, percent, upspeed, dlspeed ) )
-                    relTime += 1
-        finally:
-            try:
-                if fd:
-                    fd.close()
-            except Exception:
-                pass
-            try:
-                if fl:
-                    fl.close()
-            except Exception:
-                pass
+        return { 'log.log': self.table.consume( datafile, self, lineState( relTime = 0, upBytes = 0, downBytes = 0 ) ) }
+
+    def parseSleep(self, state):
+        """
+        Handles the mark that a second has passed without a progress report.
+        """
+        state.relTime += 1
+        return None
+
+    def parseDone(self, state, done, size, upBytes, downBytes):
+        """
+        Handles a progress report.
+        """
+        dlspeed = counterDelta( state, 'downBytes', downBytes ) / 1024.0
+        upspeed = counterDelta( state, 'upBytes', upBytes ) / 1024.0
+        percent = 0
+        if size > 0:
+            percent = percentage( done, size )
+        row = ( state.relTime, percent, upspeed, dlspeed )
+        state.relTime += 1
+        return row
 
     def canReparse(self):
         """
@@ -147,7 +137,7 @@ class swift(parser):
             - execution.client is available but incomplete
                 - execution.client.name is available and reads '__reparse__'
                 - execution.client.isSideService() is available
-                    - returns True unless any log exists for the execution
+                    - returns True if the execution was a side service or no log exists for it
             - execution.timeout is available and 0.0 unless the data was saved using processor:savetimeout
             - execution.isSeeder() is available and False unless the data was saved using processor:isSeeder (and this was a seeder)
             - execution.host is available but limited 
@@ -1,8 +1,9 @@
 from core.parser import parser
+from core.logfile import logExists
+from core.linetable import lineTable, lineState, counterDelta, rate
 from core.campaign import Campaign
 
 import os
-import re
 
 class utorrent(parser):
     """
@@ -10,6 +11,12 @@ class utorrent(parser):
     
     This module parses the uTorrent logs to create a simple data file.
     
+    Extra parameters:
+    - alignTime     Set to any non-empty value to have the times in log.data be relative to the start of the scenario,
+                    corrected for the clock offset of the host, instead of relative to the first log entry. This makes
+                    the times of executions on different hosts comparable. Requires clock measurements to have been
+                    stored with the logs (clock.log).
+    
     Raw logs expected by this module:
     - log.log
     
@@ -21,6 +28,13 @@ class utorrent(parser):
     -- download speed (kB/s)
     """
 
+    alignTime = False       # True iff the times in log.data should be aligned to the start of the scenario
+
+    # The rules for parsing log.log
+    table = lineTable( ['time', 'percent', 'upspeed', 'dlspeed'], [(0, 0, 0, 0)] )
+    table.addRule( '^([0-9]*\\.[0-9]*)$', 'parseTime', [float] )
+    table.addRule( '^([^,]*) ([^,]*) ([^,]*)', 'parseSample' )
+
     def __init__(self, scenario):
         """
         Initialization of a generic parser object.
@@ -46,7 +60,10 @@ class utorrent(parser):
         @param  key     The name of the parameter, i.e. the key from the key=value pair.
         @param  value   The value of the parameter, i.e. the value from the key=value pair.
         """
-        parser.parseSetting(self, key, value)
+        if key == 'alignTime':
+            self.alignTime = ( value != '' )
+        else:
+            parser.parseSetting(self, key, value)
 
     def checkSettings(self):
         """
@@ -67,90 +84,56 @@ class utorrent(parser):
         """
         parser.resolveNames(self)
 
-    def parseLogs(self, execution, logDir, outputDir):
+    def logConsumers(self, execution, logDir, outputDir):
         """
-        Parse the logs for the current execution.
-
-        Be sure to document in the header of your module which logs you expect to be present and with which filename.
-
-        Subclassers must override this method.
+        Returns the consumers that parse the logs for the current execution while they are being read.
 
         @param  execution   The execution for which to parse the logs.
         @param  logDir      The path to the directory on the local machine where the logs reside.
         @param  outputDir   The path to the directory on the local machine where the parsed logs are to be stored.
+
+        @return A dictionary from the name of each raw log, relative to logDir, to its consumer.
         """
         logfile = os.path.join(logDir, 'log.log')
         datafile = os.path.join(outputDir, 'log.data')
-        if not os.path.exists( logfile ) or not os.path.isfile( logfile ):
+        if not logExists( logfile ):
             raise Exception( "parser:utorrent expects the file log.log to be available for execution {0} of client {1} on host {2}".format( execution.getNumber(), execution.client.name, execution.host.name ) )
         if os.path.exists( datafile ) and not execution.isFake():
             raise Exception( "parser:utorrent wants to create log.data, but that already exists for execution {0} of client {1} on host {2}".format( execution.getNumber(), execution.client.name, execution.host.name ) )
-        fl = None
-        fd = None
-        try:
-            fl = open( logfile, 'r' )
-            fd = open( datafile, 'w' )
-            fd.write( "time percent upspeed dlspeed\n0 0 0 0\n" )
-            firstTime = -1
-            relTime = -1
-            percentDone = ''
-            prevDown = 0
-            prevUp = 0
-            prevRelTime = -1
-            count = 0
-            
-            for line in fl:
-                count += 1
-                if firstTime == -1:
-                    if not re.match( '^[0-9]*\\.[0-9]*$', line ):
-                        continue
-                    firstTime = float(line)
-                
-                if re.match( '^[0-9]*\\.[0-9]*$', line ):
-                    relTime = float(line) - firstTime
-                    if prevRelTime == relTime:
-                        relTime = -1
-                    continue
-                
-                if relTime == -1:
-                    continue
-                
-                m = re.match( '^([^,]*) ([^,]*) ([^,]*)', line )
-                if m:
-                    percentDone = float(m.group(1))
-                    down = float(m.group(2))
-                    up = float(m.group(3))
-                    if up < prevUp:
-                        up = prevUp
-                    if down < prevDown:
-                        down = prevDown
-                    div = 1024.0 * (relTime - prevRelTime)
-                    try:
-                        1 / div
-                    except ZeroDivisionError:
-                        Campaign.logger.log( "Line {0} of log file {1} == {2}".format( count, logfile, line ) )
-                        Campaign.logger.log( "ZeroDivisionError: relTime == {0} and prevRelTime == {1}".format( relTime, prevRelTime ) )
-                        div = 1
-                    downspeed = ( down - prevDown ) / ( 1024.0 * (relTime - prevRelTime) )
-                    upspeed = ( up - prevUp ) / ( 1024.0 * (relTime - prevRelTime) )
-                    prevDown = down
-                    prevUp = up
-                    
-                    fd.write( "{0} {1} {2} {3}\n".format( relTime, percentDone, upspeed, downspeed ) )
-                    
-                    prevRelTime = relTime
-                    relTime = -1
-        finally:
-            try:
-                if fd:
-                    fd.close()
-            except Exception:
-                pass
-            try:
-                if fl:
-                    fl.close()
-            except Exception:
-                pass
+        alignment = None
+        if self.alignTime:
+            alignment = self.loadClockAlignment( logDir )
+            if alignment is None:
+                Campaign.logger.log( "parser:utorrent can't align the times for execution {0} of client {1} on host {2}: no clock measurements available. Using times relative to the first log entry.".format( execution.getNumber(), execution.client.name, execution.host.name ) )
+        return { 'log.log': self.table.consume( datafile, self, lineState( alignment = alignment, firstTime = -1, relTime = -1, prevDown = 0, prevUp = 0, prevRelTime = -1 ) ) }
+
+    def parseTime(self, state, time):
+        """
+        Handles a timestamp, which gives the time of the sample that follows it.
+        """
+        if state.firstTime == -1:
+            state.firstTime = time
+        if state.alignment:
+            state.relTime = self.toScenarioTime( state.alignment, time )
+        else:
+            state.relTime = time - state.firstTime
+        if state.prevRelTime == state.relTime:
+            state.relTime = -1
+        return None
+
+    def parseSample(self, state, percent, down, up):
+        """
+        Handles a sample: the percentage done and the total amounts downloaded and uploaded.
+        """
+        if state.relTime == -1:
+            return None
+        interval = state.relTime - state.prevRelTime
+        downspeed = rate( counterDelta( state, 'prevDown', float(down), True ), interval )
+        upspeed = rate( counterDelta( state, 'prevUp', float(up), True ), interval )
+        row = ( state.relTime, float(percent), upspeed, downspeed )
+        state.prevRelTime = state.relTime
+        state.relTime = -1
+        return row
 
     def canReparse(self):
         """
@@ -175,7 +158,7 @@ class utorrent(parser):
             - execution.client is available but incomplete
                 - execution.client.name is available and reads '__reparse__'
                 - execution.client.isSideService() is available
-                    - returns True unless any log exists for the execution
+                    - returns True if the execution was a side service or no log exists for it
             - execution.timeout is available and 0.0 unless the data was saved using processor:savetimeout
             - execution.isSeeder() is available and False unless the data was saved using processor:isSeeder (and this was a seeder)
             - execution.host is available but limited 
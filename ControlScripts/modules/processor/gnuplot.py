@@ -1,10 +1,12 @@
 from core.campaign import Campaign
 from core.processor import processor
+from core.parsing import isPositiveInt
 
 import os
 import tempfile
-import subprocess
-from subprocess import Popen, PIPE
+import threading
+import multiprocessing
+from subprocess import Popen, PIPE, STDOUT
 
 def parseError( msg ):
     """
@@ -12,6 +14,81 @@ def parseError( msg ):
     """
     raise Exception( "Parse error for processor object on line {0}: {1}".format( Campaign.currentLineNumber, msg ) )
 
+# The line printed by gnuplot once it has run the script for an execution
+_doneMarker = '__processor_gnuplot_done__'
+
+class gnuplotWorker:
+    """
+    A long-lived gnuplot process that runs the script for one execution after another, fed over its standard input.
+
+    gnuplot keeps reading commands from its standard input after an error, so each script is written to a temporary
+    file and run using load: an error aborts the loaded file only, as it would abort a script run by itself, after
+    which GPVAL_ERRNO tells whether an error occurred. Should the process stop anyway, it is started anew for the next
+    execution.
+    """
+
+    process = None          # The gnuplot process, None if not running
+
+    def run(self, commands, setup = ''):
+        """
+        Runs commands in the gnuplot process and waits until they are done.
+
+        @param  commands    The commands, a string of lines, which are aborted at the first error.
+        @param  setup       Commands to run before, such as resetting the session.
+
+        @return None if the commands ran without error, otherwise the output of gnuplot.
+        """
+        if self.process is None:
+            self.process = Popen( [gnuplot.gnuplot], stdin = PIPE, stdout = PIPE, stderr = STDOUT, bufsize = 8192, close_fds = True )
+        fd, path = tempfile.mkstemp( '.gnuplot' )
+        try:
+            f = None
+            try:
+                f = os.fdopen( fd, 'w' )
+                fd = None
+                f.write( commands )
+            finally:
+                if f:
+                    f.close()
+                elif fd is not None:
+                    os.close( fd )
+            try:
+                # Close any output file, so the plots are complete, and have gnuplot signal it's done and whether an
+                # error occurred
+                self.process.stdin.write( "{0}\nload '{1}'\nunset output\nset print\nprint '{2} ', GPVAL_ERRNO\nreset errors\n".format( setup, path, _doneMarker ) )
+                self.process.stdin.flush()
+            except IOError:
+                # gnuplot has stopped already; its output tells why
+                pass
+            output = []
+            for line in iter( self.process.stdout.readline, '' ):
+                if line[:len(_doneMarker) + 1] == _doneMarker + ' ':
+                    if line[len(_doneMarker) + 1:].strip() == '0':
+                        return None
+                    return ''.join( output )
+                output.append( line )
+        finally:
+            os.remove( path )
+        # gnuplot stopped before it was done: either the script quits by itself or an error occurred
+        returncode = self.process.wait()
+        self.process = None
+        if returncode == 0:
+            return None
+        return ''.join( output )
+
+    def close(self):
+        """
+        Stops the gnuplot process.
+        """
+        if self.process is None:
+            return
+        try:
+            self.process.stdin.close()
+        except IOError:
+            pass
+        self.process.wait()
+        self.process = None
+
 class gnuplot(processor):
     """
     A gnuplot processor.
@@ -22,9 +99,15 @@ class gnuplot(processor):
     - rawdir       The path to the directory on the local machine containing the raw logs
     - outdir       The path to the directory on the local machine where the output files should be stored
     - execnum      The number of the execution begin processed
+
+    The executions are divided over a few long-lived gnuplot processes that run in parallel, each running the script
+    for one execution after another. Before each execution the gnuplot session is reset, which clears the variables
+    of the script as well if gnuplot supports 'reset session' (gnuplot 5 and up).
     
     Extra parameters:
     - script       Path to the fnuplot script to be run
+    - processes    The number of gnuplot processes to run in parallel. Optional, defaults to the number of cores of the
+                   local machine.
     - showErrors   Set to 'yes' to have processor:gnuplot show errors found when running gnuplot; these are normally
                    hidden since it's not uncommon to have gnuplot scripts that can run for only a part of the executions
                    but hence would spam the log with output. Be sure to enable this while testing new gnuplot scripts.
@@ -41,9 +124,12 @@ class gnuplot(processor):
     
     script = None       # Location of the script file
     showErrors = False  # Whether to show gnuplot errors
+    processes = None    # The number of gnuplot processes to run in parallel
     
     # @static
     gnuplot = None      # The location of gnuplot
+    # @static
+    resetCommand = None # The command that resets the gnuplot session between executions
 
     def __init__(self, scenario):
         """
@@ -59,9 +145,9 @@ class gnuplot(processor):
                 gnuplot.gnuplot = '/usr/bin/gnuplot'
             else:
                 out, _ = Popen( 'which gnuplot', stdout = PIPE, shell = True ).communicate()
-                if out is None or out == '' or not os.path.exists( 'out' ):
+                if out is None or out.strip() == '' or not os.path.exists( out.strip() ):
                     raise Exception( "processor:gnuplot requires the gnuplot utility to be present" )
-                gnuplot.gnuplot = out
+                gnuplot.gnuplot = out.strip()
 
     def parseSetting(self, key, value):
         """
@@ -89,6 +175,12 @@ class gnuplot(processor):
         elif key == 'showErrors':
             if value == 'yes':
                 self.showErrors = True
+        elif key == 'processes':
+            if self.processes:
+                parseError( "The number of processes has already been set: {0}".format( self.processes ) )
+            if not isPositiveInt( value, True ):
+                parseError( "The number of processes should be a positive, non-zero integer, not {0}".format( value ) )
+            self.processes = int(value)
         else:
             processor.parseSetting(self, key, value)
 
@@ -105,6 +197,11 @@ class gnuplot(processor):
         
         if not self.script:
             raise Exception( "Gnuplot processor must have a script defined" )
+        if not self.processes:
+            try:
+                self.processes = multiprocessing.cpu_count()
+            except NotImplementedError:
+                self.processes = 1
 
     def resolveNames(self):
         """
@@ -129,41 +226,89 @@ class gnuplot(processor):
         @param  outputDir   The path to the directory on the local machine where the processed logs are to be stored.
         """
         f = None
-        tmpFile = None
-        tmpfd = None
         try:
             f = open( self.script, 'r' )
             scriptdata = f.read()
-            f.close()
-            f = None
-            tmpfd, tmpFile = tempfile.mkstemp()
-            os.close(tmpfd)
-            tmpfd = None
-            for e in self.scenario.getObjects('execution'):
-                if e.client.isSideService():
-                    continue
-                f = open( tmpFile, 'w' )
-                f.write( "indir='{0}'\n".format( self.getParsedLogDir(e, baseDir) ) )
-                f.write( "rawdir='{0}'\n".format( self.getRawLogDir(e, baseDir) ) )
-                f.write( "outdir='{0}'\n".format( outputDir ) )
-                f.write( "execnum='{0}'\n".format( e.getNumber() ) )
-                f.write( scriptdata )
-                f.close()
-                try:
-                    subprocess.check_output( [gnuplot.gnuplot, tmpFile], bufsize=8192, stderr=subprocess.STDOUT )
-                except subprocess.CalledProcessError as e:
-                    if self.showErrors:
-                        Campaign.logger.log( "Running gnuplot failed: {0}. Ignoring.".format( e.output ) )
         finally:
             if f:
+                f.close()
+        executions = [e for e in self.scenario.getObjects('execution') if not e.client.isSideService()]
+        if len(executions) == 0:
+            return
+        resetCommand = gnuplot.getResetCommand()
+        # The executions yet to be plotted, taken from the end by the workers
+        pending = list( reversed( executions ) )
+        lock = threading.Lock()
+        errors = []
+        threads = []
+        for _ in range( min( self.processes, len(executions) ) ):
+            thread = threading.Thread( target = self.runWorker, args = ( pending, lock, errors, resetCommand, scriptdata, baseDir, outputDir ) )
+            thread.start()
+            threads.append( thread )
+        for thread in threads:
+            thread.join()
+        if len(errors) > 0:
+            raise errors[0]
+
+    def runWorker(self, pending, lock, errors, resetCommand, scriptdata, baseDir, outputDir):
+        """
+        Runs the script for executions taken from pending in a single gnuplot process until none are left.
+
+        This is run by a thread of processLogs(...) for each gnuplot process.
+
+        @param  pending         The list of executions yet to be plotted, shared by all workers.
+        @param  lock            The lock that guards pending and errors.
+        @param  errors          The list of exceptions that stopped workers, shared by all workers.
+        @param  resetCommand    The command that resets the gnuplot session.
+        @param  scriptdata      The contents of the script.
+        @param  baseDir         The base directory for the logs.
+        @param  outputDir       The path to the directory on the local machine where the processed logs are to be stored.
+        """
+        worker = gnuplotWorker()
+        try:
+            while True:
+                lock.acquire()
                 try:
-                    f.close()
-                except Exception:
-                    pass
-            elif tmpfd is not None:
-                os.close(tmpfd)
-            if tmpFile:
-                os.remove( tmpFile )
+                    if len(pending) == 0 or len(errors) > 0:
+                        return
+                    e = pending.pop()
+                finally:
+                    lock.release()
+                commands = "indir='{0}'\n".format( self.getParsedLogDir(e, baseDir) )
+                commands += "rawdir='{0}'\n".format( self.getRawLogDir(e, baseDir) )
+                commands += "outdir='{0}'\n".format( outputDir )
+                commands += "execnum='{0}'\n".format( e.getNumber() )
+                commands += scriptdata
+                output = worker.run( commands, resetCommand )
+                if output is not None and self.showErrors:
+                    Campaign.logger.log( "Running gnuplot failed: {0}. Ignoring.".format( output ) )
+        except Exception as exc:
+            lock.acquire()
+            try:
+                errors.append( exc )
+            finally:
+                lock.release()
+        finally:
+            worker.close()
+
+    @staticmethod
+    def getResetCommand():
+        """
+        Returns the command that resets the gnuplot session between executions.
+
+        This is 'reset session' if gnuplot supports it, which also clears all variables, and 'reset' otherwise. Since
+        gnuplot continues after an error in commands from its standard input, support is judged by GPVAL_ERRNO.
+
+        @return The command.
+        """
+        if not gnuplot.resetCommand:
+            p = Popen( [gnuplot.gnuplot], stdin = PIPE, stdout = PIPE, stderr = STDOUT, close_fds = True )
+            out, _ = p.communicate( "reset session\nset print\nprint 'ERRNO ', GPVAL_ERRNO\n" )
+            if ['ERRNO', '0'] in [line.split() for line in out.splitlines()]:
+                gnuplot.resetCommand = 'reset session'
+            else:
+                gnuplot.resetCommand = 'reset'
+        return gnuplot.resetCommand
 
     def canReprocess(self):
         """
@@ -188,7 +333,7 @@ class gnuplot(processor):
             - execution.client is available but incomplete
                 - execution.client.name is available and reads '__reparse__'
                 - execution.client.isSideService() is available
-                    - returns True unless any log exists for the execution
+                    - returns True if the execution was a side service or no log exists for it
             - execution.timeout is available and 0.0 unless the data was saved using processor:savetimeout
             - execution.isSeeder() is available and False unless the data was saved using processor:isSeeder (and this was a seeder)
             - execution.host is available but limited 
@@ -1,9 +1,21 @@
 # These imports are needed to access the parsing functions (which you're likely to use in parameter parsing),
 # the Campaign data object and the processor parent class.
+from core.campaign import Campaign
+from core.parsing import isPositiveFloat
 from core.processor import processor
+from core.datafile import loadDataFile
+from core.quantiles import quantileSketch
 
 import os
-import re
+
+def parseError( msg ):
+    """
+    A simple helper function to make parsing a lot of parameters a bit nicer.
+    """
+    raise Exception( "Parse error for processor object on line {0}: {1}".format( Campaign.currentLineNumber, msg ) )
+
+# The metrics of which quantiles are estimated, in the order in which they are written
+_metrics = ['downloadtime', 'peakmem', 'cputime', 'downloadspeed', 'uploadspeed']
 
 class statistics(processor):
     """
@@ -13,8 +25,16 @@ class statistics(processor):
     
     Results are skewed if the expected logs only exist for a part of the executions.
     
+    Besides the counts, maxima and means, quantiles are estimated of the download time, peak residential memory usage
+    and final cumulative CPU time of the executions, and of the download and upload speeds in each line of their
+    log.data, i.e. of the speeds over each interval in which the speeds are sampled. These are estimated in a single
+    pass over the data using quantile sketches (see core/quantiles.py), within 1% of a value of the requested rank.
+    
     Extra parameters:
-    - [none]
+    - quantiles   Comma separated list of the quantiles to estimate, as percentages. Optional, defaults to 50,90,99.
+    - groupBy     Set to client, host or file to also estimate the quantiles for each group of executions with the same
+                  client, host or files. May be given multiple times to group in several ways. Optional, defaults to
+                  estimating quantiles over all executions only.
     
     Raw logs expected:
     - [none]
@@ -22,6 +42,8 @@ class statistics(processor):
     Parsed logs expected:
     - log.data    (optional, completion and download statistics are 0 without this)
     - peak.data   (optional, memory and CPU statistics are 0 without this)
+    - io.data     (optional, storage statistics are 0 without this)
+    - net.data    (optional, network statistics are 0 without this)
     
     Processed log files created:
     - stats.leecher
@@ -34,6 +56,10 @@ class statistics(processor):
     -- average of final completion of each leecher (percentage, float)
     -- maximum of peak virtual memory usage of each leecher (bytes)
     -- average of peak virtual memory usage of each leecher (bytes)
+    -- average of total bytes read from storage by each leecher (bytes)
+    -- average of total bytes written to storage by each leecher (bytes)
+    -- average of total bytes received on the host of each leecher (bytes)
+    -- average of total bytes sent on the host of each leecher (bytes)
     - stats.seeder
     -- number of seeders
     -- maximum of peak memory usage of each seeder (bytes)
@@ -41,8 +67,28 @@ class statistics(processor):
     -- average of final cumulative CPU time of each seeder (seconds, float)
     -- maximum of peak virtual memory usage of each seeder (bytes)
     -- average of peak virtual memory usage of each seeder (bytes)
+    -- average of total bytes read from storage by each seeder (bytes)
+    -- average of total bytes written to storage by each seeder (bytes)
+    -- average of total bytes received on the host of each seeder (bytes)
+    -- average of total bytes sent on the host of each seeder (bytes)
+    
+    - stats.quantiles
+    -- a header line: grouping group class metric count, followed by a column pN for each quantile N
+    -- a line for each grouping (all, and those given by groupBy), group, class (leecher or seeder) and metric
+       (downloadtime, peakmem, cputime, downloadspeed and uploadspeed for leechers; peakmem, cputime and uploadspeed for
+       seeders) for which values were found, with count the number of values and the estimated quantiles (seconds,
+       bytes, seconds and kB/s, respectively); the grouping all has a single group, all
+    
+    The storage and network averages are taken over the executions for which io.data and net.data, respectively,
+    are present.
+    
+    When reprocessing, executions can only be grouped by host if the host names were saved using processor:savehostname;
+    the client and files of all executions are then __reparse__.
     """
 
+    quantiles = None    # The list of quantiles to estimate, as percentages
+    groupBy = None      # The list of ways to group the executions for the quantiles: client, host and/or file
+
     def __init__(self, scenario):
         """
         Initialization of a generic processor object.
@@ -50,6 +96,7 @@ class statistics(processor):
         @param  scenario        The ScenarioRunner object this processor object is part of.
         """
         processor.__init__(self, scenario)
+        self.groupBy = []
 
     def parseSetting(self, key, value):
         """
@@ -68,7 +115,22 @@ class statistics(processor):
         @param  key     The name of the parameter, i.e. the key from the key=value pair.
         @param  value   The value of the parameter, i.e. the value from the key=value pair.
         """
-        processor.parseSetting(self, key, value)
+        if key == 'quantiles':
+            if self.quantiles:
+                parseError( "The quantiles have already been set" )
+            quantiles = [v.strip() for v in value.split( ',' )]
+            for v in quantiles:
+                if not isPositiveFloat( v ) or float(v) > 100:
+                    parseError( "Quantiles should be given as percentages from 0 to 100, not {0}".format( v ) )
+            self.quantiles = [float(v) for v in quantiles]
+        elif key == 'groupBy':
+            if value not in ['client', 'host', 'file']:
+                parseError( "Executions can be grouped by client, host or file, not {0}".format( value ) )
+            if value in self.groupBy:
+                parseError( "Executions are already grouped by {0}".format( value ) )
+            self.groupBy.append( value )
+        else:
+            processor.parseSetting(self, key, value)
 
     def checkSettings(self):
         """
@@ -80,6 +142,8 @@ class statistics(processor):
         An Exception is raised in the case of insanity.
         """
         processor.checkSettings(self)
+        if not self.quantiles:
+            self.quantiles = [50.0, 90.0, 99.0]
 
     def resolveNames(self):
         """
@@ -107,6 +171,8 @@ class statistics(processor):
             raise Exception( 'processor:statistics wanted to create stats.leecher, but it already exists' )
         if os.path.exists( os.path.join( outputDir, 'stats.seeder' ) ) and not self.scenario.isFake():
             raise Exception( 'processor:statistics wanted to create stats.seeder, but it already exists' )
+        if os.path.exists( os.path.join( outputDir, 'stats.quantiles' ) ) and not self.scenario.isFake():
+            raise Exception( 'processor:statistics wanted to create stats.quantiles, but it already exists' )
         maxmemleech = 0
         maxmemseed = 0
         totalmemleech = 0
@@ -122,74 +188,87 @@ class statistics(processor):
         totalvirtmemseed = 0
         maxvirtmemleech = 0
         totalvirtmemleech = 0
+        # Totals of [read, written] and [received, sent], and the number of executions they were found for
+        totaliolog = {True: [0, 0], False: [0, 0]}
+        iocount = {True: 0, False: 0}
+        totalnetlog = {True: [0, 0], False: [0, 0]}
+        netcount = {True: 0, False: 0}
+        # The quantile sketches by (grouping, group, class, metric)
+        sketches = {}
         for execution in self.scenario.getObjects('execution'):
             if execution.client.isSideService():
                 continue
+            groups = self.getGroups( execution )
+            role = 'leecher'
+            if execution.isSeeder():
+                role = 'seeder'
+            # log.data: time percent upspeed dlspeed
+            data = loadDataFile( os.path.join( self.getParsedLogDir( execution, baseDir ), 'log.data' ) )
+            if data and len(data[0]) >= 4:
+                names, columns = data
+                self.addToSketches( sketches, groups, role, 'uploadspeed', columns[names[2]] )
+                if not execution.isSeeder():
+                    self.addToSketches( sketches, groups, role, 'downloadspeed', columns[names[3]] )
             if not execution.isSeeder():
-                if os.path.exists( os.path.join( self.getParsedLogDir( execution, baseDir ), 'log.data' ) ):
-                    fObj = None
-                    try:
-                        fObj = open( os.path.join( self.getParsedLogDir( execution, baseDir ), 'log.data' ), 'r' )
-                        downloadTime = -1
-                        completion = 0.0
-                        for l in fObj.readlines():
+                if data:
+                    names, columns = data
+                    downloadTime = -1
+                    completion = 0.0
+                    if len(names) >= 3:
+                        times = columns[names[0]]
+                        percents = columns[names[1]]
+                        for i in xrange( len(percents) ):
                             # Download time is the time of the first line with completion == 100%
                             # Completion is tracked all the time
-                            if l[:4] == 'time':
-                                # header
-                                continue
-                            m = re.match( '^([^ ]*) ([^ ]*) .*', l )
-                            if not m:
-                                # should be last line only
+                            if percents[i] != percents[i]:
+                                # incomplete line, should be last line only
                                 continue
-                            completion = float(m.group(2))
-                            if downloadTime == -1 and completion > 99.999999:
-                                downloadTime = float(m.group(1))
+                            completion = float(percents[i])
+                            if completion > 99.999999:
+                                downloadTime = float(times[i])
                                 completion = 100.0
                                 break
-                    finally:
-                        if fObj:
-                            fObj.close()
                     totalcompletionleech += completion
                     if downloadTime > -0.5:
                         leechcompletedcount += 1
                         totaldownloadtimeleech += downloadTime
-            if os.path.exists( os.path.join( self.getParsedLogDir( execution, baseDir ), 'peak.data' ) ):
-                fObj = None
-                try:
-                    fObj = open( os.path.join( self.getParsedLogDir( execution, baseDir ), 'peak.data' ), 'r' )
-                    for l in fObj.readlines():
-                        if l[:7] == 'cputime':
-                            # header
-                            continue
-                        m = re.match( '^([^ ]*) ([0-9]*) ([0-9]*)', l )
-                        if not m:
-                            # should be last line only
-                            continue
-                        cputime = float(m.group(1))
-                        peakmem = int(m.group(2))
-                        peakvirtmem = int(m.group(3))
-                        if execution.isSeeder():
-                            totalCPUseed += cputime
-                            totalmemseed += peakmem
-                            if peakmem > maxmemseed:
-                                maxmemseed = peakmem
-                            totalvirtmemseed += peakvirtmem
-                            if peakvirtmem > maxvirtmemseed:
-                                maxvirtmemseed = peakvirtmem
-                        else:
-                            totalCPUleech += cputime
-                            totalmemleech += peakmem
-                            if peakmem > maxmemleech:
-                                maxmemleech = peakmem
-                            totalvirtmemleech += peakvirtmem
-                            if peakvirtmem > maxvirtmemleech:
-                                maxvirtmemleech = peakvirtmem
-                        # Should be only one line, so be done with it
-                        break
-                finally:
-                    if fObj:
-                        fObj.close()
+                        self.addToSketches( sketches, groups, role, 'downloadtime', [downloadTime] )
+            # peak.data: cputime maxmem maxvirtmem, a single line
+            data = self.getFirstValues( os.path.join( self.getParsedLogDir( execution, baseDir ), 'peak.data' ) )
+            if data and len(data) >= 3:
+                cputime = float(data[0])
+                peakmem = int(data[1])
+                peakvirtmem = int(data[2])
+                self.addToSketches( sketches, groups, role, 'peakmem', [peakmem] )
+                self.addToSketches( sketches, groups, role, 'cputime', [cputime] )
+                if execution.isSeeder():
+                    totalCPUseed += cputime
+                    totalmemseed += peakmem
+                    if peakmem > maxmemseed:
+                        maxmemseed = peakmem
+                    totalvirtmemseed += peakvirtmem
+                    if peakvirtmem > maxvirtmemseed:
+                        maxvirtmemseed = peakvirtmem
+                else:
+                    totalCPUleech += cputime
+                    totalmemleech += peakmem
+                    if peakmem > maxmemleech:
+                        maxmemleech = peakmem
+                    totalvirtmemleech += peakvirtmem
+                    if peakvirtmem > maxvirtmemleech:
+                        maxvirtmemleech = peakvirtmem
+            # io.data: time readrate writerate read written ...
+            final = self.getFinalValues( os.path.join( self.getParsedLogDir( execution, baseDir ), 'io.data' ) )
+            if final and len(final) >= 5:
+                totaliolog[execution.isSeeder()][0] += int(final[3])
+                totaliolog[execution.isSeeder()][1] += int(final[4])
+                iocount[execution.isSeeder()] += 1
+            # net.data: time recvrate sendrate received sent
+            final = self.getFinalValues( os.path.join( self.getParsedLogDir( execution, baseDir ), 'net.data' ) )
+            if final and len(final) >= 5:
+                totalnetlog[execution.isSeeder()][0] += int(final[3])
+                totalnetlog[execution.isSeeder()][1] += int(final[4])
+                netcount[execution.isSeeder()] += 1
             if execution.isSeeder():
                 seedcount += 1
             else:
@@ -212,21 +291,134 @@ class statistics(processor):
             avgmemseed = int(totalmemseed / seedcount)
             avgcpuseed = totalCPUseed / seedcount
             avgvirtmemseed = int(totalvirtmemseed / seedcount)
+        avgio = {True: [0, 0], False: [0, 0]}
+        avgnet = {True: [0, 0], False: [0, 0]}
+        for seeder in [True, False]:
+            if iocount[seeder] > 0:
+                avgio[seeder] = [total / iocount[seeder] for total in totaliolog[seeder]]
+            if netcount[seeder] > 0:
+                avgnet[seeder] = [total / netcount[seeder] for total in totalnetlog[seeder]]
         
         fObj = None
         try:
             fObj = open( os.path.join( outputDir, 'stats.leecher' ), 'w' )
-            fObj.write( '{0} {1} {2} {3} {4} {5} {6} {7} {8}\n'.format( leechcount, maxmemleech, avgmemleech, avgcpuleech, leechcompletedcount, avgcompletiontime, avgcompletion, maxvirtmemleech, avgvirtmemleech ) )
+            fObj.write( '{0} {1} {2} {3} {4} {5} {6} {7} {8} {9} {10} {11} {12}\n'.format( leechcount, maxmemleech, avgmemleech, avgcpuleech, leechcompletedcount, avgcompletiontime, avgcompletion, maxvirtmemleech, avgvirtmemleech, avgio[False][0], avgio[False][1], avgnet[False][0], avgnet[False][1] ) )
         finally:
             if fObj:
                 fObj.close()
         fObj = None
         try:
             fObj = open( os.path.join( outputDir, 'stats.seeder' ), 'w' )
-            fObj.write( '{0} {1} {2} {3} {4} {5}\n'.format( seedcount, maxmemseed, avgmemseed, avgcpuseed, maxvirtmemseed, avgvirtmemseed ) )
+            fObj.write( '{0} {1} {2} {3} {4} {5} {6} {7} {8} {9}\n'.format( seedcount, maxmemseed, avgmemseed, avgcpuseed, maxvirtmemseed, avgvirtmemseed, avgio[True][0], avgio[True][1], avgnet[True][0], avgnet[True][1] ) )
         finally:
             if fObj:
                 fObj.close()
+        self.writeQuantiles( os.path.join( outputDir, 'stats.quantiles' ), sketches )
+
+    def getGroups(self, execution):
+        """
+        Returns the groups an execution belongs to for the quantiles.
+
+        @param  execution   The execution.
+
+        @return The list of tuples (grouping, group): ('all', 'all') and one for each way of grouping in self.groupBy.
+        """
+        groups = [( 'all', 'all' )]
+        for grouping in self.groupBy:
+            if grouping == 'client':
+                groups.append( ( grouping, execution.client.name ) )
+            elif grouping == 'host':
+                groups.append( ( grouping, execution.host.name ) )
+            elif execution.isFake():
+                groups.append( ( grouping, '__reparse__' ) )
+            else:
+                groups.append( ( grouping, '+'.join( [f.name for f in execution.files] ) or '-' ) )
+        return groups
+
+    def addToSketches(self, sketches, groups, role, metric, values):
+        """
+        Adds values of a metric of an execution to the quantile sketches of all groups the execution belongs to.
+
+        @param  sketches    The dictionary of sketches by (grouping, group, class, metric).
+        @param  groups      The groups of the execution, as returned by getGroups(...).
+        @param  role        The class of the execution, leecher or seeder.
+        @param  metric      The name of the metric.
+        @param  values      The sequence of values.
+        """
+        # The values are sketched only once, after which that sketch is merged into those of all groups
+        added = quantileSketch()
+        added.addAll( values )
+        for grouping, group in groups:
+            key = ( grouping, group, role, metric )
+            if key not in sketches:
+                sketches[key] = quantileSketch()
+            sketches[key].merge( added )
+
+    def writeQuantiles(self, path, sketches):
+        """
+        Writes the estimated quantiles to stats.quantiles.
+
+        @param  path        The path to the file to write.
+        @param  sketches    The dictionary of sketches by (grouping, group, class, metric).
+        """
+        fObj = None
+        try:
+            fObj = open( path, 'w' )
+            fObj.write( 'grouping group class metric count {0}\n'.format( ' '.join( ['p{0:g}'.format( q ) for q in self.quantiles] ) ) )
+            for grouping in ['all'] + self.groupBy:
+                for group in sorted( set( [key[1] for key in sketches if key[0] == grouping] ) ):
+                    for role in ['leecher', 'seeder']:
+                        for metric in _metrics:
+                            sketch = sketches.get( ( grouping, group, role, metric ) )
+                            if sketch is None or sketch.count == 0:
+                                continue
+                            values = [sketch.quantile( q / 100.0 ) for q in self.quantiles]
+                            fObj.write( '{0} {1} {2} {3} {4} {5}\n'.format( grouping, group, role, metric, sketch.count, ' '.join( [str(v) for v in values] ) ) )
+        finally:
+            if fObj:
+                fObj.close()
+
+    def getFirstValues(self, path):
+        """
+        Returns the values on the first line of a parsed log, after the header.
+
+        @param  path    The path to the parsed log. It need not exist.
+
+        @return The list of values on the first line, or None if the log does not exist or has no data.
+        """
+        return self.getValues( path, 0 )
+
+    def getFinalValues(self, path):
+        """
+        Returns the values on the last line of a parsed log.
+
+        @param  path    The path to the parsed log. It need not exist.
+
+        @return The list of values on the last non-empty line, or None if the log does not exist or has no data.
+        """
+        return self.getValues( path, -1 )
+
+    def getValues(self, path, row):
+        """
+        Returns the values on a line of a parsed log, loaded through core.datafile.
+
+        @param  path    The path to the parsed log. It need not exist.
+        @param  row     The index of the line, not counting the header; negative to count from the end.
+
+        @return The list of values on the line, or None if the log does not exist or has no such line. Values missing
+                from the end of the line are left out.
+        """
+        data = loadDataFile( path )
+        if not data:
+            return None
+        names, columns = data
+        if len(names) == 0 or not -len(columns[names[0]]) <= row < len(columns[names[0]]):
+            return None
+        values = [columns[name][row] for name in names]
+        # Missing values are NaN
+        while len(values) > 0 and isinstance( values[-1], float ) and values[-1] != values[-1]:
+            values.pop()
+        return values
 
     def canReprocess(self):
         """
@@ -251,7 +443,7 @@ class statistics(processor):
             - execution.client is available but incomplete
                 - execution.client.name is available and reads '__reparse__'
                 - execution.client.isSideService() is available
-                    - returns True unless any log exists for the execution
+                    - returns True if the execution was a side service or no log exists for it
             - execution.timeout is available and 0.0 unless the data was saved using processor:savetimeout
             - execution.isSeeder() is available and False unless the data was saved using processor:isSeeder (and this was a seeder)
             - execution.host is available but limited 
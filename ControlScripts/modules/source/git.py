@@ -1,5 +1,11 @@
 from core.source import source
 
+import os
+import re
+import hashlib
+from subprocess import Popen
+from subprocess import PIPE
+
 # You can define anything you like in the scope of your own module: the only thing that will be imported from it
 # is the actual object you're creating, which, incidentally, must be named equal to the module it is in. For example:
 # suppose you copy this file to modules/source/svn.py then the name of your class would be svn.
@@ -9,6 +15,11 @@ class git(source):
     git source implementation using the command line utility git.
 
     client.location is interpreted as a git repository ready to be cloned.
+
+    If the client has a source cache (client parameter sourceCache) a bare mirror of the repository is kept in
+    that directory locally, and in the persistent test directory on remote hosts. The mirror is updated
+    incrementally with git fetch and the sources are cloned from the mirror, so the full repository is only
+    transferred the first time.
     """
 
     def __init__(self, scenario):
@@ -35,6 +46,99 @@ class git(source):
         """
         return 'git clone {0} .'.format( client.location )
 
+    def mirrorCommand(self, client, mirrorDir):
+        """
+        Return the command to clone the sources through a bare mirror of the repository.
+
+        The mirror is created if it doesn't exist and is brought up to date otherwise. Access to the mirror is
+        serialized with flock, if available.
+
+        @param  client      The client for which the sources are to be prepared.
+        @param  mirrorDir   The directory in which the mirrors are kept.
+
+        @return The command line to prepare the sources.
+        """
+        mirror = '{0}/{1}.git'.format( mirrorDir, hashlib.sha1( client.location ).hexdigest() )
+        return (
+            'mkdir -p "{0}" && '
+            '( flock 9 2> /dev/null; '
+                'if [ -d "{1}" ]; then git --git-dir="{1}" fetch --quiet --prune origin; '
+                'else rm -rf "{1}.tmp" && git clone --quiet --mirror {2} "{1}.tmp" && mv "{1}.tmp" "{1}"; fi '
+            ') 9> "{1}.lock" && '
+            'git clone --quiet "{1}" . && git remote set-url origin {2}'
+            ).format( mirrorDir, mirror, client.location )
+
+    def prepareLocalCommand(self, client):
+        """
+        Return the command to prepare the sources on the local machine.
+
+        This clones through a mirror in the source cache of the client, if it has one.
+
+        @param  client      The client for which the sources are to be prepared.
+
+        @return The command line to prepare the sources.
+        """
+        if not client.sourceCacheDir:
+            return self.prepareCommand(client)
+        return self.mirrorCommand( client, os.path.abspath( client.sourceCacheDir ) )
+
+    def prepareRemoteCommand(self, client, host):
+        """
+        Return the command to prepare the sources on a remote host.
+
+        This clones through a mirror in the persistent test directory of the host, if the client has a source cache.
+
+        @param  client      The client for which the sources are to be prepared.
+        @param  host        The host on which the sources are to be prepared.
+
+        @return The command line to prepare the sources.
+        """
+        if not client.sourceCacheDir:
+            return self.prepareCommand(client)
+        return self.mirrorCommand( client, '{0}/gitmirrors'.format( host.getPersistentTestDir() ) )
+
+    # This method has unused arguments; that's fine
+    # pylint: disable-msg=W0613
+    def localRevision(self, client, exclude = None):
+        """
+        Returns an identification of the revision of the local sources of the client.
+
+        The sources are a fresh clone, so the commit that was checked out identifies them.
+
+        @param  client      The client for which the sources are to be identified.
+        @param  exclude     List of paths relative to the sources that are to be left out, such as build results.
+
+        @return The identification of the revision, or None if the revision can't be identified.
+        """
+        proc = Popen( ['git', 'rev-parse', 'HEAD'], stdout=PIPE, stderr=PIPE, cwd=self.localLocation(client) )
+        out = proc.communicate()[0]
+        m = re.match( '^([0-9a-f]{40})', out )
+        if proc.returncode != 0 or not m:
+            return None
+        return m.group( 1 )
+    # pylint: enable-msg=W0613
+
+    # This method has unused arguments; that's fine
+    # pylint: disable-msg=W0613
+    def remoteRevision(self, client, host, exclude = None):
+        """
+        Returns an identification of the revision of the remote sources of the client on the host.
+
+        The sources are a fresh clone, so the commit that was checked out identifies them.
+
+        @param  client      The client for which the sources are to be identified.
+        @param  host        The host on which the sources reside.
+        @param  exclude     List of paths relative to the sources that are to be left out, such as build results.
+
+        @return The identification of the revision, or None if the revision can't be identified.
+        """
+        res = host.sendCommand( '( cd "{0}" && git rev-parse HEAD ) 2> /dev/null'.format( self.remoteLocation(client, host) ) )
+        m = re.match( '^([0-9a-f]{40})', res.splitlines()[-1] if res else '' )
+        if not m:
+            return None
+        return m.group( 1 )
+    # pylint: enable-msg=W0613
+
     @staticmethod
     def APIVersion():
         return "2.4.0"
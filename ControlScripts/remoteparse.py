@@ -0,0 +1,134 @@
+#!/usr/bin/python
+
+from run_campaign import loadModule
+from core.parsing import getParameterName, getParameterValue
+from core.parser import runParserList
+from core.logfile import compressLog
+import os
+import sys
+
+if __name__ != "__main__":
+    raise Exception( "Do not import" )
+
+# Runs parsers on the host of an execution. This is uploaded to the hosts and started by core.remoteparsing, which also
+# describes the description file; it is not meant to be run by hand.
+
+if len(sys.argv) == 2 and sys.argv[1] == '--check':
+    print "OK"
+    sys.exit()
+if len(sys.argv) != 5 or sys.argv[4] not in ['yes', 'no']:
+    raise Exception( "Usage: remoteparse.py description logDir workDir compress, with compress either yes or no" )
+specFile = sys.argv[1]
+logDir = sys.argv[2]
+workDir = sys.argv[3]
+compress = ( sys.argv[4] == 'yes' )
+
+# Fake classes, as for reparse.py
+class FakeScenario:
+    executions = []
+    executionDict = {}
+    name = ''
+    def __init__(self, name):
+        self.executions = []
+        self.executionDict = {}
+        self.name = name
+    def getObjects(self, name):
+        if name != 'execution':
+            return []
+        return self.executions
+    def getObjectsDict(self, name):
+        if name != 'execution':
+            return {}
+        return self.executionDict
+    def addExecution(self, execution):
+        self.executions.append( execution )
+        self.executionDict[execution.getNumber()] = execution
+    def isFake(self):
+        return True
+
+class FakeHost:
+    name = '__reparse__'
+    def __init__(self):
+        pass
+
+class FakeClient:
+    name = '__reparse__'
+    def __init__(self):
+        pass
+    def isSideService(self):
+        return False
+
+class FakeExecution:
+    n = -1
+    client = None
+    host = None
+    seeder = False
+    timeout = 0.0
+    def __init__(self, n, seeder, timeout):
+        self.n = n
+        self.seeder = seeder
+        self.timeout = timeout
+        self.client = FakeClient()
+        self.host = FakeHost()
+    def getNumber(self):
+        return self.n
+    def isSeeder(self):
+        return self.seeder
+    def isFake(self):
+        return True
+
+# Read the description
+scenarioObject = None
+executionObject = None
+parserObjects = []
+f = None
+try:
+    f = open( specFile, 'r' )
+    for line in f:
+        line = line.rstrip( '\n' )
+        if line == '':
+            continue
+        kind, _, value = line.partition( ' ' )
+        if kind == 'scenario':
+            scenarioObject = FakeScenario( value )
+        elif kind == 'execution':
+            values = value.split()
+            executionObject = FakeExecution( int(values[0]), values[1] == 'YES', float(values[2]) )
+            scenarioObject.addExecution( executionObject )
+        elif kind == 'host':
+            executionObject.host.name = value
+        elif kind == 'parser':
+            parserClass = loadModule( 'parser', value )
+            parserObject = parserClass( scenarioObject )
+            if not parserObject.canReparse():
+                raise Exception( "Parser {0} can't be used to parse remotely (canReparse() returns False).".format( value ) )
+            parserObjects.append( parserObject )
+        elif kind == 'arg':
+            parserObjects[-1].parseSetting( getParameterName( value ), getParameterValue( value ) )
+        else:
+            raise Exception( "Unexpected line in description {0}: {1}".format( specFile, line ) )
+finally:
+    if f:
+        f.close()
+if executionObject is None:
+    raise Exception( "Description {0} names no execution".format( specFile ) )
+for parserObject in parserObjects:
+    parserObject.checkSettings()
+
+# Parse the logs, as execution.runParsers(...) does
+outputDir = os.path.join( workDir, 'parsedLogs' )
+os.makedirs( outputDir )
+runParserList( parserObjects, executionObject, logDir, outputDir )
+
+# Compress the raw logs to be retrieved, keeping the originals
+if compress:
+    rawDir = os.path.join( workDir, 'raw' )
+    os.makedirs( rawDir )
+    for root, _, files in os.walk( logDir ):
+        for name in files:
+            destination = os.path.join( rawDir, os.path.relpath( os.path.join( root, name ), logDir ) )
+            if not os.path.exists( os.path.dirname( destination ) ):
+                os.makedirs( os.path.dirname( destination ) )
+            compressLog( os.path.join( root, name ), destination = destination )
+
+print "OK"
@@ -2,16 +2,23 @@
 
 from run_campaign import loadModule
 from core.parsing import isPositiveInt, getParameterName, getParameterValue
+from core.datafile import convertDataFiles, COLUMNS_EXTENSION
+from core.parser import runParserList
 import os
 import traceback
 import sys
 import time
+import hashlib
+import inspect
+import multiprocessing
 
 if __name__ != "__main__":
     raise Exception( "Do not import" )
 
 leechers = True
 seeders = True
+force = False
+processes = 1
 dirNames = []
 parserNames = []
 processorNames = []
@@ -48,6 +55,17 @@ for arg in sys.argv[1:]:
         if not lastObject:
             raise Exception( "Given --arg before an object (--parser, --processor or --viewer)." )
         lastObject.args.append( arg[6:] )
+    elif arg == '--force':
+        force = True
+    elif arg == '--parallel':
+        try:
+            processes = multiprocessing.cpu_count()
+        except NotImplementedError:
+            processes = 1
+    elif arg[:11] == '--parallel=':
+        if not isPositiveInt( arg[11:], True ):
+            raise Exception( "--parallel= expects a positive number of processes, not {0}".format( arg[11:] ) )
+        processes = int(arg[11:])
     elif arg == '--help':
         print """
 reparse.py [options] [directory [directory [...]]
@@ -60,9 +78,18 @@ Arguments:
     --processor=name  Use processor:name to process the scenario
     --viewer=name     Use viewer:name to view the scenario
     --arg=argument    Add argument as an argument to the last declared object
+    --parallel        Parse the executions, and process and view the directories, in a pool of processes, one
+                      for each core
+    --parallel=n      Like --parallel, but with a pool of n processes
+    --force           Reparse all executions, not only those of which the logs, the parsed logs or the parsers
+                      changed since they were last reparsed
     --help            This text and exit
 
 Arguments to objects have the same syntax as in normal scenario declaration files.
+
+Each reparsed execution gets a manifest (parsedLogs/reparse.manifest) listing the parsers used, with a hash of their
+code and their arguments, and hashes of its logs and parsed logs. Executions of which the manifest still matches are
+not reparsed again, unless --force is given.
 Example:
     reparse.py --seeders --parser=cpulog --processor=gnuplot --arg=script=TestSpecs/processors/simple_cpu_plot --viewer=htmlcollection /path/to/results/scenarios/scenario_1 /path/to/results/scenarios/scenario_2
 """
@@ -117,6 +144,8 @@ class FakeExecution:
     def __init__(self, n, basedir):
         self.n = n
         sideservice = len( os.listdir( os.path.join( basedir, 'executions', 'exec_{0}'.format( n ), 'logs' ) ) ) == 0
+        if os.path.exists( os.path.join( basedir, 'executions', 'exec_{0}'.format( n ), 'sideservice' ) ):
+            sideservice = True
         self.client = FakeClient(sideservice)
         self.host = FakeHost()
         if os.path.exists( os.path.join( basedir, 'processed', 'timeout_{0}'.format( n ) ) ):
@@ -156,22 +185,178 @@ class FakeExecution:
     def isFake(self):
         return True
 
-# Go over all directories
-seenDirNames = {}
-for dirName in dirNames:
-    if dirName in seenDirNames:
-        print "Warning! Directory {0} already seen, skipping.".format( dirName )
-        continue
-    seenDirNames[dirName] = True
+# Functions for reparsing
+def hashFile( path ):
+    """
+    Returns the SHA1 hash of the contents of a file.
+
+    @param  path        The path to the file.
+
+    @return The hash as a hexadecimal string.
+    """
+    h = hashlib.sha1()
+    f = None
+    try:
+        f = open( path, 'rb' )
+        while True:
+            data = f.read( 1024 * 1024 )
+            if not data:
+                break
+            h.update( data )
+    finally:
+        if f:
+            f.close()
+    return h.hexdigest()
+
+def hashDirectory( kind, directory, skip = None ):
+    """
+    Returns the manifest lines for all files in a directory and its subdirectories.
+
+    @param  kind        The kind of the files, the first word of each line.
+    @param  directory   The path to the directory.
+    @param  skip        A function that returns True for the names of the files to leave out, or None.
+
+    @return The list of lines, each '<kind> <hash> <relative path>'.
+    """
+    lines = []
+    for root, dirs, files in os.walk( directory ):
+        dirs.sort()
+        for name in sorted( files ):
+            if skip and skip( name ):
+                continue
+            path = os.path.join( root, name )
+            lines.append( "{0} {1} {2}".format( kind, hashFile( path ), os.path.relpath( path, directory ) ) )
+    return lines
+
+def hashParserCode( parserClass ):
+    """
+    Returns a hash of the code of a parser.
+
+    This covers the modules of the parser class and its base classes, and the core and extension modules whose
+    classes or functions those use.
+
+    @param  parserClass     The class of the parser.
+
+    @return The hash as a hexadecimal string.
+    """
+    modules = {}
+    for cls in inspect.getmro( parserClass ):
+        module = sys.modules.get( cls.__module__ )
+        if module is None:
+            continue
+        modules[module.__name__] = module
+        for value in module.__dict__.values():
+            if not ( inspect.isclass( value ) or inspect.isfunction( value ) ):
+                continue
+            used = inspect.getmodule( value )
+            if used is not None and ( used.__name__[:5] == 'core.' or used.__name__[:8] == 'modules.' ):
+                modules[used.__name__] = used
+    h = hashlib.sha1()
+    for name in sorted( modules ):
+        path = inspect.getsourcefile( modules[name] )
+        if path is None:
+            continue
+        h.update( name + ' ' + hashFile( path ) + '\n' )
+    return h.hexdigest()
+
+def isManifestSkipped( name ):
+    """
+    Returns whether a file in parsedLogs is left out of the manifest: the manifest itself and the columnar copies,
+    which are regenerated as needed anyway.
+    """
+    return name == manifestName or name[-len(COLUMNS_EXTENSION):] == COLUMNS_EXTENSION
+
+def makeManifest( logDir, parsedLogDir ):
+    """
+    Returns the manifest of an execution as it currently is.
+
+    @param  logDir          The path to the logs of the execution.
+    @param  parsedLogDir    The path to the parsed logs of the execution.
+
+    @return The manifest, a string.
+    """
+    lines = parserManifest + hashDirectory( 'log', logDir ) + hashDirectory( 'parsed', parsedLogDir, isManifestSkipped )
+    return '\n'.join( lines ) + '\n'
+
+def readManifest( parsedLogDir ):
+    """
+    Returns the stored manifest of an execution.
+
+    @param  parsedLogDir    The path to the parsed logs of the execution.
+
+    @return The manifest, a string, or None if there is none.
+    """
+    path = os.path.join( parsedLogDir, manifestName )
+    if not os.path.isfile( path ):
+        return None
+    f = None
+    try:
+        f = open( path, 'r' )
+        return f.read()
+    finally:
+        if f:
+            f.close()
+
+def writeManifest( parsedLogDir, manifest ):
+    """
+    Stores the manifest of an execution.
+
+    @param  parsedLogDir    The path to the parsed logs of the execution.
+    @param  manifest        The manifest, a string.
+    """
+    f = None
+    try:
+        f = open( os.path.join( parsedLogDir, manifestName ), 'w' )
+        f.write( manifest )
+    finally:
+        if f:
+            f.close()
+
+def removeManifest( parsedLogDir ):
+    """
+    Removes the manifest of an execution, if any, so it will be reparsed next time.
+
+    @param  parsedLogDir    The path to the parsed logs of the execution.
+    """
+    path = os.path.join( parsedLogDir, manifestName )
+    if os.path.exists( path ):
+        os.remove( path )
+
+class ReparseDirectory:
+    """
+    A scenario directory that is being reparsed, with the objects to do so.
+    """
+    dirName = ''
+    scenarioObject = None
+    parserObjects = []
+    processorObjects = []
+    viewerObjects = []
+    executionNumbers = []
+    def __init__(self, dirName, scenarioObject, parserObjects, processorObjects, viewerObjects, executionNumbers):
+        self.dirName = dirName
+        self.scenarioObject = scenarioObject
+        self.parserObjects = parserObjects
+        self.processorObjects = processorObjects
+        self.viewerObjects = viewerObjects
+        self.executionNumbers = executionNumbers
+
+def loadDirectory( dirName ):
+    """
+    Checks a scenario directory and creates the objects to reparse it.
+
+    @param  dirName     The path to the scenario directory.
+
+    @return The ReparseDirectory object, or None if the directory is to be skipped.
+    """
     if not ( os.path.exists( dirName ) and os.path.isdir( dirName ) ):
         print "Warning! Directory {0} seems not to exist, skipping.".format( dirName )
-        continue
+        return None
     execDir = os.path.join( dirName, 'executions' )
     processedDir = os.path.join( dirName, 'processed' )
     viewDir = os.path.join( dirName, 'views' )
     if not ( os.path.exists( execDir ) and os.path.isdir( dirName ) and os.path.exists( processedDir ) and os.path.isdir( processedDir ) and os.path.exists( viewDir ) and os.path.isdir( viewDir ) ):
         print "Warning! Directory {0} seems not to be a scenario directory, skipping.".format( dirName )
-        continue
+        return None
     print "=== {0} ===".format( dirName )
     print time.strftime( "%H.%M.%S", time.localtime() )
 
@@ -264,7 +449,7 @@ for dirName in dirNames:
                 break
         if len(executionNumbers) == 0:
             print "Warning! --seeders or --leechers was specified, but the seeder data of directory {0} could not be read correctly, skipping.".format( dirName )
-            continue
+            return None
     else:
         for d in os.listdir( execDir ):
             if d[:5] != 'exec_':
@@ -282,7 +467,7 @@ for dirName in dirNames:
             executionNumbers.append( int(d[5:]) )
         if len(executionNumbers) == 0:
             print "Warning! Could not find the execution numbers of directory {0}, skipping.".format( dirName )
-            continue
+            return None
     realExecutionNumbers = []
     for e in executionNumbers:
         logDir = os.path.join( execDir, 'exec_{0}'.format( e ), 'logs' )
@@ -303,28 +488,156 @@ for dirName in dirNames:
             continue
         executionObject = FakeExecution( e, dirName )
         scenarioObject.addExecution( executionObject )
-    print "- Parsing"
-    for e in executionNumbers:
-        logDir = os.path.join( execDir, 'exec_{0}'.format( e ), 'logs' )
-        parsedLogDir = os.path.join( execDir, 'exec_{0}'.format( e ), 'parsedLogs' )
-        executionObject = FakeExecution( e, dirName )
-        for p in parserObjects:
-            try:
-                p.parseLogs( executionObject, logDir, parsedLogDir )
-            except Exception as e:
-                print "Warning! Exception occurred while running parser {0} on execution {1} of directory {2}, ignoring.".format( p.__class__.__name__, e, dirName )
-                print traceback.format_exc()
-    print "- Processing"
-    for p in processorObjects:
+    return ReparseDirectory( dirName, scenarioObject, parserObjects, processorObjects, viewerObjects, executionNumbers )
+
+def parseExecution( task ):
+    """
+    Runs the parsers on a single execution of a scenario directory, unless its manifest shows it to be up to date.
+
+    @param  task        A tuple (index, e) with index the index of the directory in reparseDirectories and e the
+                        execution number.
+
+    @return True iff the execution was parsed.
+    """
+    index, e = task
+    directory = reparseDirectories[index]
+    dirName = directory.dirName
+    execDir = os.path.join( dirName, 'executions' )
+    logDir = os.path.join( execDir, 'exec_{0}'.format( e ), 'logs' )
+    parsedLogDir = os.path.join( execDir, 'exec_{0}'.format( e ), 'parsedLogs' )
+    if not force:
+        try:
+            manifest = readManifest( parsedLogDir )
+            if manifest is not None and manifest == makeManifest( logDir, parsedLogDir ):
+                return False
+        except Exception as exc:
+            print "Warning! Could not check the manifest of execution {0} of directory {1}, reparsing.".format( e, dirName )
+            print traceback.format_exc()
+    # Only executions that are parsed without problems get a manifest again
+    failed = False
+    try:
+        removeManifest( parsedLogDir )
+    except Exception as exc:
+        print "Warning! Could not remove the manifest of execution {0} of directory {1}, ignoring.".format( e, dirName )
+        print traceback.format_exc()
+        failed = True
+    executionObject = FakeExecution( e, dirName )
+    errors = []
+    try:
+        runParserList( directory.parserObjects, executionObject, logDir, parsedLogDir, errors )
+    except Exception as exc:
+        print "Warning! Exception occurred while reading the logs of execution {0} of directory {1}, ignoring.".format( e, dirName )
+        print traceback.format_exc()
+        failed = True
+    for p, exc, trace in errors:
+        print "Warning! Exception occurred while running parser {0} on execution {1} of directory {2}, ignoring.".format( p.__class__.__name__, e, dirName )
+        print trace
+        failed = True
+    try:
+        convertDataFiles( parsedLogDir )
+    except Exception as exc:
+        print "Warning! Could not store the columnar copies of the parsed logs of execution {0} of directory {1}, ignoring.".format( e, dirName )
+        print traceback.format_exc()
+    if not failed:
+        try:
+            writeManifest( parsedLogDir, makeManifest( logDir, parsedLogDir ) )
+        except Exception as exc:
+            print "Warning! Could not store the manifest of execution {0} of directory {1}, ignoring.".format( e, dirName )
+            print traceback.format_exc()
+    return True
+
+def processDirectory( index ):
+    """
+    Runs the processors and viewers on a scenario directory.
+
+    @param  index       The index of the directory in reparseDirectories.
+    """
+    directory = reparseDirectories[index]
+    dirName = directory.dirName
+    processedDir = os.path.join( dirName, 'processed' )
+    viewDir = os.path.join( dirName, 'views' )
+    for p in directory.processorObjects:
         try:
             p.processLogs( os.path.join( dirName, 'executions' ), processedDir )
         except Exception as e:
             print "Warning! Exception occurred while running processor {0} on directory {1}, ignoring.".format( p.__class__.__name__, dirName )
             print traceback.format_exc()
-    print "- Viewing"
-    for v in viewerObjects:
+    for v in directory.viewerObjects:
         try:
             v.createView( processedDir, viewDir )
         except Exception as e:
             print "Warning! Exception occurred while running viewer {0} on directory {1}, ignoring.".format( v.__class__.__name__, dirName )
             print traceback.format_exc()
+
+def runTasks( function, tasks ):
+    """
+    Runs a function on each of a list of tasks, in a pool of processes if running in parallel.
+
+    The processes are forked when this is called and hence see reparseDirectories as it is at that moment.
+
+    @param  function    The function to run, defined at module level.
+    @param  tasks       The list of arguments to run the function on, one at a time.
+
+    @return The list of results, one for each task.
+    """
+    count = min( processes, len(tasks) )
+    if count <= 1:
+        return [function( task ) for task in tasks]
+    pool = multiprocessing.Pool( count )
+    try:
+        # A timeout on get keeps the wait interruptible
+        results = pool.map_async( function, tasks, 1 ).get( 365 * 24 * 3600 )
+        pool.close()
+    except:
+        pool.terminate()
+        raise
+    finally:
+        pool.join()
+    return results
+
+def printParseResults( results ):
+    """
+    Prints how many executions were parsed and how many were skipped for being up to date.
+
+    @param  results     The list of results of parseExecution(...).
+    """
+    print "Parsed {0} executions, {1} were up to date".format( results.count( True ), results.count( False ) )
+
+# The parsers, with a hash of their code and their arguments, are the same for every execution
+manifestName = 'reparse.manifest'
+parserManifest = []
+for parser in parserNames:
+    parserManifest.append( "parser {0} {1}".format( parser.name, hashParserCode( loadModule( 'parser', parser.name ) ) ) )
+    for arg in parser.args:
+        parserManifest.append( "arg {0}".format( arg ) )
+
+# Go over all directories
+# Without a pool each directory is reparsed completely before the next is loaded. With a pool all directories are
+# loaded first, after which all executions are parsed by the pool and then all directories are processed and viewed.
+reparseDirectories = []
+seenDirNames = {}
+for dirName in dirNames:
+    if dirName in seenDirNames:
+        print "Warning! Directory {0} already seen, skipping.".format( dirName )
+        continue
+    seenDirNames[dirName] = True
+    directory = loadDirectory( dirName )
+    if directory is None:
+        continue
+    reparseDirectories.append( directory )
+    if processes > 1:
+        continue
+    index = len(reparseDirectories) - 1
+    print "- Parsing"
+    printParseResults( runTasks( parseExecution, [( index, e ) for e in directory.executionNumbers] ) )
+    print "- Processing and viewing"
+    processDirectory( index )
+
+if processes > 1 and len(reparseDirectories) > 0:
+    print "=== Parsing ==="
+    tasks = []
+    for index in range( len(reparseDirectories) ):
+        tasks += [( index, e ) for e in reparseDirectories[index].executionNumbers]
+    printParseResults( runTasks( parseExecution, tasks ) )
+    print "=== Processing and viewing ==="
+    runTasks( processDirectory, range( len(reparseDirectories) ) )
@@ -15,11 +15,17 @@ import shutil
 import threading
 import re
 import subprocess
+import multiprocessing
+import traceback
 
 # P2P Testing Framework imports
 from core.campaign import Campaign
 from core.parsing import isSectionHeader, getModuleType, getSectionName, getModuleSubType, getParameterName, getParameterValue, isPositiveInt, isValidName
 import core.debuglogger
+from core.logfile import compressLogs
+from core.remoteparsing import parseRemotely
+import core.host
+import core.client
 
 # Global API version of the core
 APIVersion="2.4.0"
@@ -82,6 +88,28 @@ def loadModule( moduleType, moduleSubType ):
             raise Exception( "Module modules.{0}.{1} was made for API version {2}, which is different from the core (version {3})".format( moduleType, moduleSubType, objectClass.APIVersion(), APIVersion ) )
         return objectClass
 
+# The list of tuples (execution, execdir) whose logs are being parsed by runParserTask(...)
+parserTasks = None
+
+def runParserTask( index ):
+    """
+    Runs the parsers of a single execution on its retrieved logs.
+
+    This is run by the processes of the parser pool of ScenarioRunner.parseRetrievedLogs(...), which are forked
+    after parserTasks has been set and hence find the execution there; only the index and the result are passed
+    between the processes.
+
+    @param  index       The index of the execution in parserTasks.
+
+    @return None if the parsers succeeded, otherwise a tuple (message, traceback) of the exception raised.
+    """
+    execution, execdir = parserTasks[index]
+    try:
+        execution.runParsers( os.path.join( execdir, 'logs' ), os.path.join( execdir, 'parsedLogs' ) )
+    except Exception as exc:
+        return ( exc.__str__(), traceback.format_exc() )
+    return None
+
 class BusyExecutionThread(threading.Thread):
     """A small extension for Thread that can be tested for the run method currently being active."""
     busy = False
@@ -196,6 +224,8 @@ class ClientRunner(BusyExecutionThread):
     startTime = -1
     doneStart = False
     endTime = -1
+    startEpoch = -1         # The local time the delays of the executions are relative to, or -1 to use the time the runner starts
+    scheduled = False       # True iff the client should be dispatched right away and started by the remote host at its start time
     
     def doTask(self):
         """
@@ -206,9 +236,23 @@ class ClientRunner(BusyExecutionThread):
         Also be sure to place yield at the end!
         """
         # First initialize starting time: clients can be delayed in their start
-        self.startTime = time.time() + self.execution.timeout
+        if self.startEpoch >= 0:
+            self.startTime = self.startEpoch + self.execution.timeout
+        else:
+            self.startTime = time.time() + self.execution.timeout
         self.doneStart = False
         yield
+        if self.scheduled:
+            # Dispatch right away and have the remote host wait for the start time on its own clock
+            if not self.inCleanup and ( self.endTime < 0 or self.startTime <= self.endTime ):
+                it = self.execution.client.start( self.execution, self.startTime + self.execution.host.getClockOffset() )
+                it.next()
+                self.doneStart = True
+                yield
+                self.doneStart = False
+                it.next()
+            yield
+            return
         # Calculate time until we need to start
         diffTime = self.startTime - time.time()
         while diffTime > 0:
@@ -318,6 +362,9 @@ class ClientRunner(BusyExecutionThread):
 
     def cleanup(self):
         """Cleans up the thread's execution, which is just setting self.cleanup by default."""
+        # Don't let clients that are still waiting for their start time start anyway
+        if self.scheduled and not self.execution.client.hasStarted( self.execution ):
+            self.execution.client.cancelStart( self.execution )
         # Also kill clients that are already/still running
         if not self.execution.client.isStopped( self.execution ) and self.execution.client.isRunning( self.execution ):
             self.execution.client.kill( self.execution )
@@ -340,17 +387,26 @@ class LogProcessor(BusyExecutionThread):
     """Simple runner for client.retrieveLogs() and execution.runParsers()."""
     execdir = ''
     salvage = False
-    def __init__(self, execution, execdir, salvage = False):
+    parse = True
+    compress = True
+    remoteParsing = ''
+    def __init__(self, execution, execdir, salvage = False, parse = True, compress = True, remoteParsing = ''):
         """
         Initializes a LogProcessor thread.
         
         @param    execution    The execution object to run this thread for, passed to BusyExecutionThread.
         @param    execdir      Path to the base directory of the execution on the local machine.
         @param    salvage      Set to True to run in salvage mode, which will safeguard everything in a desperate attempt to get as much data as possible, without errors breaking it.
+        @param    parse        Set to False to only retrieve the logs, leaving the parsing to the caller.
+        @param    compress     Set to False to keep the retrieved raw logs uncompressed.
+        @param    remoteParsing    Set to 'yes' to run the parsers that can reparse on the host, see core.remoteparsing, or to 'parsedonly' to also not retrieve the raw logs unless needed. Not used when salvaging.
         """
         self.execdir = execdir
         BusyExecutionThread.__init__(self, execution)
         self.salvage = salvage
+        self.parse = parse
+        self.compress = compress
+        self.remoteParsing = remoteParsing
 
     def doTask(self):
         """
@@ -360,18 +416,35 @@ class LogProcessor(BusyExecutionThread):
         
         Also be sure to place yield at the end!
         """
-        # First retrieve the logs; safeguard if salvaging
-        if self.salvage:
-            try:
+        self.writeClockLog()
+        # Parse on the host if requested, which may leave nothing more to retrieve
+        retrieveLogs = True
+        if self.remoteParsing and not self.salvage:
+            retrieveLogs = self.parseRemotely()
+        # Then retrieve the logs; safeguard if salvaging
+        if retrieveLogs:
+            if self.salvage:
+                try:
+                    self.execution.client.retrieveLogs( self.execution, os.path.join( self.execdir, 'logs' ) )
+                except Exception as e:
+                    Campaign.logger.log( "Ignoring exception while salvaging logs: {0}".format( e.__str__() ) )
+                    Campaign.logger.exceptionTraceback()
+            else:
                 self.execution.client.retrieveLogs( self.execution, os.path.join( self.execdir, 'logs' ) )
-            except Exception as e:
-                Campaign.logger.log( "Ignoring exception while salvaging logs: {0}".format( e.__str__() ) )
-                Campaign.logger.exceptionTraceback()
-        else:
-            self.execution.client.retrieveLogs( self.execution, os.path.join( self.execdir, 'logs' ) )
+        self.writeSideServiceMarker()
+        # Store the raw logs compressed; safeguard if salvaging
+        if self.compress:
+            if self.salvage:
+                try:
+                    compressLogs( os.path.join( self.execdir, 'logs' ) )
+                except Exception as e:
+                    Campaign.logger.log( "Ignoring exception while compressing salvaged logs: {0}".format( e.__str__() ) )
+                    Campaign.logger.exceptionTraceback()
+            else:
+                compressLogs( os.path.join( self.execdir, 'logs' ) )
         yield
         # Then run the parsers on those logs; safeguard if salvaging
-        if not self.inCleanup:
+        if self.parse and not self.inCleanup:
             if self.salvage:
                 try:
                     self.execution.runParsers( os.path.join( self.execdir, 'logs' ), os.path.join( self.execdir, 'parsedLogs' ) )
@@ -382,6 +455,60 @@ class LogProcessor(BusyExecutionThread):
                 self.execution.runParsers( os.path.join( self.execdir, 'logs' ), os.path.join( self.execdir, 'parsedLogs' ) )
         yield
 
+    def parseRemotely(self):
+        """
+        Runs the parsers that can reparse on the host of the execution and retrieves their parsed logs.
+
+        If this fails all parsers are run locally later on, as usual.
+
+        @return True iff the raw logs are still to be retrieved.
+        """
+        try:
+            return parseRemotely( self.execution, os.path.join( self.execdir, 'logs' ), os.path.join( self.execdir, 'parsedLogs' ), self.remoteParsing != 'parsedonly', self.compress )
+        except Exception as e:
+            Campaign.logger.log( "Warning! Could not parse the logs of execution {0} of client {1} on host {2}, parsing them locally instead: {3}".format( self.execution.getNumber(), self.execution.client.name, self.execution.host.name, e.__str__() ) )
+            Campaign.logger.exceptionTraceback()
+            self.execution.parsedRemotely = False
+            return True
+
+    def writeSideServiceMarker(self):
+        """
+        Marks the execution directory of a side service with an empty file named sideservice.
+
+        Side services with logs can't be told apart from other executions by their logs alone; reparse.py uses
+        the marker to keep ignoring them for processors and viewers.
+        """
+        if not self.execution.client.isSideService():
+            return
+        f = None
+        try:
+            f = open( os.path.join( self.execdir, 'sideservice' ), 'w' )
+        finally:
+            if f:
+                f.close()
+
+    def writeClockLog(self):
+        """
+        Stores the clock measurements of the host of the execution with the raw logs as clock.log.
+
+        The log starts with the line
+            #clock 1 epoch
+        with epoch the local time at which the scenario started running, followed by one line per measurement
+            localtime offset rtt
+        which parsers can use to align the times in their logs to the epoch.
+        """
+        if self.execution.scenario.epoch is None or not self.execution.host.clockMeasurements:
+            return
+        f = None
+        try:
+            f = open( os.path.join( self.execdir, 'logs', 'clock.log' ), 'w' )
+            f.write( "#clock 1 {0:.6f}\n".format( self.execution.scenario.epoch ) )
+            for measurement in self.execution.host.clockMeasurements:
+                f.write( "{0:.6f} {1:.6f} {2:.6f}\n".format( *measurement ) )
+        finally:
+            if f:
+                f.close()
+
 class ScenarioRunner:
     """
     Scenario runner class that will initialize a complete scenario and run it.
@@ -391,6 +518,12 @@ class ScenarioRunner:
     files = None            # List of files that make up the scenario description
     timelimit = 0           # The time in seconds the scenario may at most be running
     doParallel = True       # Whether the scenario should be made sequential
+    doVerify = False        # Whether the data on the seeding hosts should be verified after it has been sent
+    doScheduledStart = False    # Whether the clients should be dispatched ahead of time and started by the remote hosts themselves
+    doCompressLogs = True   # Whether the raw logs should be stored compressed
+    remoteParsing = ''      # '' to parse locally, 'yes' to parse on the hosts where possible or 'parsedonly' to also retrieve raw logs only where needed
+    scheduleLead = 10       # The time in seconds between dispatching scheduled clients and the start of the scenario
+    epoch = None            # The local time at which the scenario started running, i.e. the time the client delays are relative to
     resultsDir = ''         # The directory where the results of this scenario will be placed
 
     campaign = None         # The campaignRunner object this scenario is part of
@@ -398,7 +531,7 @@ class ScenarioRunner:
     objects = None          # A dictionary from all module types to dictionaries of those objects by name
     threads = None          # Threads that do simple tasks, such as running a client. All these have the cleanup method and the isBusy method.
 
-    def __init__(self, scenarioName, scenarioFiles, scenarioTime, scenarioParallel, campaign):
+    def __init__(self, scenarioName, scenarioFiles, scenarioTime, scenarioParallel, campaign, scenarioVerify = False, scenarioScheduledStart = False, scenarioCompressLogs = True, scenarioRemoteParsing = ''):
         """
         Sets up the scenario object and checks some sanity.
 
@@ -407,6 +540,10 @@ class ScenarioRunner:
         @param  scenarioTime        The time in seconds the scenario may last at most.
         @param  scenarioParallel    False iff the scenario should be run with clients being started sequentially.
         @param  campaign            The Campaign Runner this scenario is part of.
+        @param  scenarioVerify      True iff the data on the seeding hosts should be verified after it has been sent.
+        @param  scenarioScheduledStart  True iff the clients should be dispatched ahead of time and started by the remote hosts themselves.
+        @param  scenarioCompressLogs    True iff the raw logs should be stored compressed.
+        @param  scenarioRemoteParsing   '' to parse locally, 'yes' to parse on the hosts where possible or 'parsedonly' to also retrieve raw logs only where needed.
         """
         if scenarioName == '':
             raise Exception( "Scenario started on line {0} has no name parameter".format( Campaign.currentLineNumber ) )
@@ -416,6 +553,10 @@ class ScenarioRunner:
         self.files = scenarioFiles
         self.timelimit = scenarioTime
         self.doParallel = scenarioParallel
+        self.doVerify = scenarioVerify
+        self.doScheduledStart = scenarioScheduledStart
+        self.doCompressLogs = scenarioCompressLogs
+        self.remoteParsing = scenarioRemoteParsing
         self.campaign = campaign
         self.resultsDir = os.path.join( campaign.campaignResultsDir, 'scenarios', scenarioName )
         self.objects = {}
@@ -537,6 +678,9 @@ class ScenarioRunner:
                 parameterName = getParameterName( line )
                 parameterValue = getParameterValue( line )
                 obj.parseSetting( parameterName, parameterValue )
+                if obj.getModuleType() == 'parser':
+                    # Kept to recreate the parser on the hosts, see core.remoteparsing
+                    obj.settings.append( ( parameterName, parameterValue ) )
         if obj is None:
             raise Exception( "No objects found in scenario {0}".format( self.name ) )
         obj.checkSettings()
@@ -653,6 +797,16 @@ class ScenarioRunner:
         Campaign.logger.log( "PROFILE: Clients prepared in {0}".format( time.time()-startTime ), True )
         startTime = time.time()
 
+        # Hosts that share their filesystem only need to build remotely built clients once
+        if not testRun:
+            remoteBuildClients = [client for client in self.getObjects('client') if client.isRemote and client.builder]
+            if len(remoteBuildClients) > 0:
+                sharedFilesystemGroups = core.host.getSharedFilesystemGroups( executionHosts )
+                for client in remoteBuildClients:
+                    client.setRemoteBuildHosts( sharedFilesystemGroups )
+                Campaign.logger.log( "PROFILE: Shared filesystems detected in {0}".format( time.time()-startTime ), True )
+                startTime = time.time()
+
         # Prepare TC and clients
         for host in executionHosts:
             # Build traffic control instructions for each host, based on how the clients can be controlled
@@ -758,6 +912,65 @@ class ScenarioRunner:
                 for f in host.seedingFiles:
                     f.sendToSeedingHost( host )
             Campaign.logger.log( "PROFILE: Files prepared their hosts in {0}".format( time.time()-startTime ), True )
+            if self.doVerify:
+                startTime = time.time()
+                self.verifyFiles( executionHosts )
+                Campaign.logger.log( "PROFILE: Files verified on their hosts in {0}".format( time.time()-startTime ), True )
+
+    def verifyFiles(self, executionHosts):
+        """
+        Verifies the integrity of the data of all files on their seeding hosts.
+
+        The SHA1 digests of the data are calculated on all hosts concurrently and compared to the digests as known
+        locally by the file objects. Files that do not know their digests are not verified.
+
+        An Exception is raised if any data is missing or corrupted.
+
+        @param  executionHosts  The hosts that are used in executions.
+        """
+        digests = {}
+        commands = {}
+        for host in executionHosts:
+            checks = []
+            for f in host.seedingFiles:
+                root = f.getFile( host )
+                if root is None:
+                    continue
+                if f not in digests:
+                    digests[f] = f.getDataDigests()
+                    if digests[f] is None:
+                        Campaign.logger.log( "Data of file {0} can't be verified: its digests are not known locally".format( f.name ) )
+                if digests[f] is None:
+                    continue
+                checks.append( 'find -L "{0}" -type f -exec sha1sum {{}} +'.format( root ) )
+            if len(checks) > 0:
+                commands[host] = '{0}; echo "____END____!!!!____ENDDIGESTS____"'.format( '; '.join( checks ) )
+        if len(commands) == 0:
+            return
+        results = core.host.sendCommandToHosts( commands )
+        errors = []
+        for h in commands:
+            res = results[h].splitlines()
+            if len(res) < 1 or res[-1] != '____END____!!!!____ENDDIGESTS____':
+                raise Exception( "Unexpected response from host {0} when verifying the data of its files: {1}".format( h.name, results[h] ) )
+            remoteDigests = {}
+            for line in res[:-1]:
+                m = re.match( '^([0-9a-f]{40})  (.*)$', line )
+                if m:
+                    remoteDigests[m.group( 2 )] = m.group( 1 )
+            for f in h.seedingFiles:
+                if f not in digests or digests[f] is None:
+                    continue
+                root = f.getFile( h )
+                for relPath in digests[f]:
+                    path = '/'.join( [root] + list(relPath) )
+                    if path not in remoteDigests:
+                        errors.append( "file {0} is missing {1} on host {2}".format( f.name, path, h.name ) )
+                    elif remoteDigests[path] != digests[f][relPath]:
+                        errors.append( "file {0} has corrupted data in {1} on host {2}".format( f.name, path, h.name ) )
+        if len(errors) > 0:
+            raise Exception( "Verification of the data on the seeding hosts failed: {0}".format( '; '.join( errors ) ) )
+        print "Data of {0} seeding host(s) verified".format( len(commands) )
 
     def executeRun(self):
         """
@@ -769,9 +982,14 @@ class ScenarioRunner:
         Campaign.logger.log( "PROFILE: Run starting @ 0", True )
         startTime = time.time()
         
-        # Prepare all clients for execution
+        # Prepare all clients for execution, batching the remote work per host
+        executionsByHost = {}
         for execution in self.getObjects('execution'):
-            execution.client.prepareExecution( execution )
+            if execution.host not in executionsByHost:
+                executionsByHost[execution.host] = []
+            executionsByHost[execution.host].append( execution )
+        for host in executionsByHost:
+            core.client.prepareExecutions( host, executionsByHost[host] )
 
         Campaign.logger.log( "PROFILE: Clients prepared their executions in {0}".format( time.time() - startTime ), True )
         startTime = time.time()
@@ -806,8 +1024,22 @@ class ScenarioRunner:
             Campaign.logger.log( "PROFILE: Connections prepared in {0}".format( time.time() - startTime ), True )
             startTime = time.time()
             
+            print "Measuring clock offsets of the hosts"
+            self.measureClocks( executionHosts )
+
+            Campaign.logger.log( "PROFILE: Clock offsets measured in {0}".format( time.time() - startTime ), True )
+            startTime = time.time()
+
+            if self.doScheduledStart:
+                # All clients are dispatched before the scenario starts and wait on their hosts until their start time
+                self.epoch = time.time() + self.scheduleLead
+                for thread in execThreads:
+                    thread.startEpoch = self.epoch
+                    thread.scheduled = True
+            else:
+                self.epoch = time.time()
             # Precalculate when we should be done
-            endTime = time.time() + self.timelimit
+            endTime = self.epoch + self.timelimit
             for thread in execThreads:
                 thread.endTime = endTime
             if self.doParallel:
@@ -860,6 +1092,12 @@ class ScenarioRunner:
 
             Campaign.logger.log( "PROFILE: Threads killed in {0}".format( time.time() - startTime ), True )
             startTime = time.time()
+
+            print "Measuring clock offsets of the hosts again"
+            self.measureClocks( executionHosts )
+
+            Campaign.logger.log( "PROFILE: Clock offsets measured in {0}".format( time.time() - startTime ), True )
+            startTime = time.time()
         
         finally:
             print "Removing all traffic control from hosts."
@@ -872,6 +1110,25 @@ class ScenarioRunner:
             startTime = time.time()
     
 
+    def measureClocks(self, executionHosts):
+        """
+        Measures the clock offset of each of the hosts relative to the local clock.
+
+        The hosts are measured one after another to keep the local machine from adding to the round trip times.
+        Hosts of which the clock can't be read are skipped, unless the clients are to be started by the hosts.
+
+        @param  executionHosts      The hosts to measure.
+        """
+        for host in executionHosts:
+            try:
+                offset, rtt = host.measureClockOffset()
+            except Exception as e:
+                if self.doScheduledStart:
+                    raise
+                Campaign.logger.log( "Warning! Could not measure the clock offset of host {0}: {1}".format( host.name, e.__str__() ) )
+                continue
+            Campaign.logger.log( "Host {0} has clock offset {1:.6f}s (rtt {2:.6f}s)".format( host.name, offset, rtt ) )
+
     def parseLogs(self):
         """
         Retrieve and parse logs.
@@ -883,10 +1140,10 @@ class ScenarioRunner:
             execdir = os.path.join( self.resultsDir, 'executions', 'exec_{0}'.format( execution.getNumber() ) )
             os.makedirs( os.path.join( execdir, 'logs' ) )
             os.makedirs( os.path.join( execdir, 'parsedLogs' ) )
-            if not execution.client.isSideService():
-                logThreads.append( LogProcessor( execution, execdir ) )
+            if not execution.client.isSideService() or execution.client.hasSideServiceLogs():
+                logThreads.append( LogProcessor( execution, execdir, parse = False, compress = self.doCompressLogs, remoteParsing = self.remoteParsing ) )
         self.threads += logThreads
-        print "Retrieving logs and parsing them"
+        print "Retrieving logs"
         if self.doParallel:
             for thread in logThreads:
                 thread.start()
@@ -900,6 +1157,57 @@ class ScenarioRunner:
         for thread in logThreads:
             if thread.isAlive() or thread.getException() is not None:
                 raise Exception( "One or more log processors failed." )
+        print "Parsing logs"
+        failures = self.parseRetrievedLogs( [( thread.execution, thread.execdir ) for thread in logThreads] )
+        for execution, message, trace in failures:
+            Campaign.logger.log( "Exception while parsing the logs of execution {0} with client {1} on host {2}: {3}".format( execution.getNumber(), execution.client.name, execution.host.name, message ) )
+            Campaign.logger.logPre( trace )
+        if len(failures) > 0:
+            raise Exception( "One or more log processors failed." )
+
+    def parseRetrievedLogs(self, tasks):
+        """
+        Runs the parsers of executions whose logs have been retrieved.
+
+        Parsing is CPU bound, so when running in parallel the executions are parsed by a pool of processes, one for
+        each core of the local machine. Otherwise they are parsed one after another.
+
+        @param  tasks       The list of tuples (execution, execdir), with execdir the path to the base directory of the
+                            execution on the local machine.
+
+        @return The list of tuples (execution, message, traceback), one for each execution of which the parsers failed.
+        """
+        global parserTasks
+        if len(tasks) == 0:
+            return []
+        processes = 1
+        if self.doParallel:
+            try:
+                processes = min( multiprocessing.cpu_count(), len(tasks) )
+            except NotImplementedError:
+                pass
+        parserTasks = tasks
+        try:
+            if processes > 1:
+                pool = multiprocessing.Pool( processes )
+                try:
+                    # A timeout on get keeps the wait interruptible
+                    results = pool.map_async( runParserTask, range( len(tasks) ), 1 ).get( 365 * 24 * 3600 )
+                    pool.close()
+                except:
+                    pool.terminate()
+                    raise
+                finally:
+                    pool.join()
+            else:
+                results = [runParserTask( i ) for i in range( len(tasks) )]
+        finally:
+            parserTasks = None
+        failures = []
+        for ( execution, _ ), result in zip( tasks, results ):
+            if result is not None:
+                failures.append( ( execution, result[0], result[1] ) )
+        return failures
 
     def tryParseLogs(self):
         """
@@ -914,8 +1222,8 @@ class ScenarioRunner:
                 os.makedirs( os.path.join( execdir, 'logs' ) )
             if not os.path.exists( os.path.join( execdir, 'parsedLogs' ) ):
                 os.makedirs( os.path.join( execdir, 'parsedLogs' ) )
-            if not execution.client.isSideService():
-                logThreads.append( LogProcessor( execution, execdir, True ) )
+            if not execution.client.isSideService() or execution.client.hasSideServiceLogs():
+                logThreads.append( LogProcessor( execution, execdir, True, compress = self.doCompressLogs ) )
         self.threads += logThreads
         print "Salvaging logs and parsing them"
         for thread in logThreads:
@@ -1146,6 +1454,10 @@ class CampaignRunner:
             scenarioLine = 0
             scenarioTimeLimit = 600
             scenarioParallel = True
+            scenarioVerify = False
+            scenarioScheduledStart = False
+            scenarioCompressLogs = True
+            scenarioRemoteParsing = ''
             for line in fileObj:
                 line = line.strip()
                 print "Parsing {0}".format(line)
@@ -1159,13 +1471,17 @@ class CampaignRunner:
                         raise Exception( "Unexpected section name {0} in campaign file on line {1}. Only scenario sections are allowed in campaign files.".format( sectionName, Campaign.currentLineNumber ) )
                     # New scenario, so check sanity of the old one, but not for the scenario before the first scenario
                     if scenarioLine != 0:
-                        self.scenarios.append( ScenarioRunner( scenarioName, scenarioFiles, scenarioTimeLimit, scenarioParallel, self ) )
+                        self.scenarios.append( ScenarioRunner( scenarioName, scenarioFiles, scenarioTimeLimit, scenarioParallel, self, scenarioVerify, scenarioScheduledStart, scenarioCompressLogs, scenarioRemoteParsing ) )
                     # New scenario is OK, let's initialize for the next one
                     scenarioName = ''
                     scenarioFiles = []
                     scenarioLine = Campaign.currentLineNumber
                     scenarioTimeLimit = 300
                     scenarioParallel = True
+                    scenarioVerify = False
+                    scenarioScheduledStart = False
+                    scenarioCompressLogs = True
+                    scenarioRemoteParsing = ''
                 else:
                     # Not a section, so should be a parameter
                     parameterName = getParameterName( line )
@@ -1193,6 +1509,22 @@ class CampaignRunner:
                     elif parameterName == 'parallel':
                         # disable parallel handling of clients if it gives trouble
                         scenarioParallel = ( parameterValue != 'no' )
+                    elif parameterName == 'verify':
+                        # verify the data on the seeding hosts after it has been sent
+                        scenarioVerify = ( parameterValue == 'yes' )
+                    elif parameterName == 'scheduledstart':
+                        # dispatch all clients ahead of time and let the hosts start them at their start times
+                        scenarioScheduledStart = ( parameterValue == 'yes' )
+                    elif parameterName == 'compresslogs':
+                        # store the raw logs compressed, unless they are wanted as plain files
+                        scenarioCompressLogs = ( parameterValue != 'no' )
+                    elif parameterName == 'remoteparsing':
+                        # run the parsers on the hosts and retrieve the parsed logs
+                        if parameterValue not in ['yes', 'parsedonly', 'no']:
+                            raise Exception( 'The remote parsing of the scenario defined on line {0} should be yes, parsedonly or no, not "{1}" (line {2})'.format( scenarioLine, parameterValue, Campaign.currentLineNumber ) )
+                        scenarioRemoteParsing = parameterValue
+                        if parameterValue == 'no':
+                            scenarioRemoteParsing = ''
                     elif parameterName == 'timelimit' or parameterName == 'timeout':
                         # I keep calling it timeout, so I'm guessing that is also/more natural
                         # Time limit for the execution of a scenario, in seconds
@@ -1202,7 +1534,7 @@ class CampaignRunner:
                     else:
                         raise Exception( 'Unsupported parameter "{0}" found on line {1}'.format( parameterName, Campaign.currentLineNumber ) )
                 Campaign.currentLineNumber += 1
-            self.scenarios.append( ScenarioRunner( scenarioName, scenarioFiles, scenarioTimeLimit, scenarioParallel, self ) )
+            self.scenarios.append( ScenarioRunner( scenarioName, scenarioFiles, scenarioTimeLimit, scenarioParallel, self, scenarioVerify, scenarioScheduledStart, scenarioCompressLogs, scenarioRemoteParsing ) )
             
             if justScenario:
                 for scName in justScenario:
@@ -0,0 +1,57 @@
+"""
+Tests for core.quantiles
+
+Run from the ControlScripts directory:
+    python -m unittest discover -s tests
+"""
+
+import random
+import unittest
+
+from core.quantiles import quantileSketch
+
+class TestQuantileSketch(unittest.TestCase):
+
+    def assertClose(self, estimate, exact, accuracy):
+        self.assertTrue( abs( estimate - exact ) <= accuracy * abs( exact ) + 1e-9, "{0} is not within {1} of {2}".format( estimate, accuracy, exact ) )
+
+    def testEmpty(self):
+        s = quantileSketch()
+        q = s.quantile( 0.5 )
+        self.assertTrue( q != q )
+
+    def testRelativeAccuracy(self):
+        r = random.Random( 1 )
+        values = [r.expovariate( 0.01 ) for _ in range( 10000 )] + [-r.random() * 10 for _ in range( 1000 )] + [0.0] * 100
+        s = quantileSketch( 0.01 )
+        s.addAll( values )
+        values.sort()
+        for q in [0, 0.01, 0.1, 0.5, 0.9, 0.99, 1]:
+            self.assertClose( s.quantile( q ), values[int( q * ( len(values) - 1 ) )], 0.01 )
+
+    def testMerge(self):
+        a = quantileSketch()
+        b = quantileSketch()
+        a.addAll( range( 1, 501 ) )
+        b.addAll( range( 501, 1001 ) )
+        a.merge( b )
+        self.assertEqual( a.count, 1000 )
+        self.assertEqual( a.minimum, 1 )
+        self.assertEqual( a.maximum, 1000 )
+        self.assertClose( a.quantile( 0.5 ), 500, 0.01 )
+        self.assertRaises( Exception, a.merge, quantileSketch( 0.02 ) )
+
+    def testNonFinite(self):
+        s = quantileSketch()
+        s.add( float('inf') )
+        s.add( float('-inf') )
+        s.add( float('nan') )
+        self.assertEqual( s.count, 0 )
+        s.addAll( [1.0, float('inf'), 2.0, float('nan'), 3.0, float('-inf')] )
+        self.assertEqual( s.count, 3 )
+        self.assertEqual( s.minimum, 1.0 )
+        self.assertEqual( s.maximum, 3.0 )
+        self.assertClose( s.quantile( 0.5 ), 2.0, 0.01 )
+
+if __name__ == "__main__":
+    unittest.main()
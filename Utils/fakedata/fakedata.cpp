@@ -8,6 +8,8 @@
 
 #include "fakedata.h"
 
+int fakedataVerbose = 1;
+
 int generateFakeData( int f, size_t n, size_t offset ) {
     file_resize( f, n );
 
@@ -15,7 +17,7 @@ int generateFakeData( int f, size_t n, size_t offset ) {
     int left, done, ret;
     char buf[4096];
     for( i = 0; i < n / 4; i += 1 ) {
-        if( !( i & 0x0FF ) )
+        if( fakedataVerbose && !( i & 0x0FF ) )
             printf( "Status: %liM written\n", (long int)( i / ( 1 << 8 ) ) );
         for( j = 0; j < 1024; j++ )
             *(((uint32_t*) buf)+j) = htobe32( offset+j+((uint32_t)((off_t)i<<10)) );
@@ -41,7 +43,7 @@ int generateFakeData( int f, size_t n, size_t offset ) {
             break; // Prevent infinite loop on generating 16G
         }
     }
-    if( !( i & 0x0FF ) )
+    if( fakedataVerbose && !( i & 0x0FF ) )
         printf( "Status: %liM written\n", (long int)( i / ( 1 << 8 ) ) );
 
     struct stat st;
@@ -16,6 +16,11 @@
  */
 int generateFakeData( int filename, size_t n, size_t offset);
 
+/**
+ * Set to 0 to have generateFakeData(...) not print its progress.
+ */
+extern int fakedataVerbose;
+
 #define file_resize( f, n ) ftruncate( f, n )
 
 void file_size( int f );
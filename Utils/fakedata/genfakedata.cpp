@@ -1,9 +1,11 @@
 #include <stdio.h>
+#include <string.h>
 #include <sys/types.h>
 #include <sys/stat.h>
 #include <fcntl.h>
 #include <stdlib.h>
 #include <unistd.h>
+#include <pthread.h>
 
 #include "fakedata.h"
 
@@ -13,40 +15,154 @@
 #define OPENFLAGS         O_RDWR|O_CREAT
 #endif
 
-int main( int argc, char** argv ) {
-    if( argc < 3 ) {
-        printf( "Usage: %s outputfile size [offset]\n", argv[0] );
-        printf( "Prints semi-non-trivial data to a file: at each 4th byte (0, 3, 7, ...) it prints a 32-bit counter (0, 1, 2, ...) in big-endian byte order\n" );
-        printf( "- outputfile : the file to write to\n" );
-        printf( "- size : the desired size of the file in KBytes (will be rounded up to a multiple of 4)\n" );
-        printf( "- offset : the offset of the internal counter to be written (default: 0)\n" );
+/**
+ * A single file to be generated in batch mode.
+ */
+struct job {
+    const char* filename;
+    size_t n;
+    size_t offset;
+    int result;
+};
+
+static struct job* jobs = NULL;
+static int jobCount = 0;
+static int nextJob = 0;
+static pthread_mutex_t nextJobLock = PTHREAD_MUTEX_INITIALIZER;
+
+void usage( const char* name ) {
+    printf( "Usage: %s outputfile size [offset]\n", name );
+    printf( "   or: %s -p threads outputfile size offset [outputfile size offset [...]]\n", name );
+    printf( "Prints semi-non-trivial data to a file: at each 4th byte (0, 3, 7, ...) it prints a 32-bit counter (0, 1, 2, ...) in big-endian byte order\n" );
+    printf( "- outputfile : the file to write to\n" );
+    printf( "- size : the desired size of the file in KBytes (will be rounded up to a multiple of 4)\n" );
+    printf( "- offset : the offset of the internal counter to be written (default: 0)\n" );
+    printf( "- threads : the number of files to be written in parallel in batch mode (-p); 0 for the number of online processors\n" );
+}
+
+/**
+ * Parses and checks the size argument.
+ *
+ * @param   arg     The size argument.
+ * @param   n       Output: the size in kilobytes, rounded up to a multiple of 4.
+ *
+ * @return  0 for success, non-0 otherwise.
+ */
+int parseSize( const char* arg, size_t* n ) {
+    *n = strtol( arg, NULL, 10 );
+    if( *n < 1 ) {
+        printf( "Positive size in bytes expected, got %s\n", arg );
         return -1;
     }
+    if( *n & 0x3 ) {
+        *n = ( *n & ~0X3 ) + 4;
+        printf( "Warning: size was given as %s, which is not a multiple of 4. %li kilobytes will be written instead.\n", arg, (long int) *n );
+    }
+    if( *n > (long long int)2 * 1024 * 1024 * 1024 ) {
+        printf( "Fake data counter is 32 bits, meaning it can count to 4G and, printing 4 bytes for each count, can generate a maximum file size of 16G. You will have repetition in your fake file.\n" );
+        return -1;
+    }
+    return 0;
+}
 
-    size_t n = strtol( argv[2], NULL, 10 );
-    if( n < 1 ) {
-        printf( "Positive size in bytes expected, got %s\n", argv[2] );
+int generateFile( const char* filename, size_t n, size_t offset ) {
+    int f = open( filename, OPENFLAGS, S_IRUSR | S_IWUSR | S_IRGRP | S_IROTH );
+    if( f < 0 ) {
+        perror( filename );
         return -1;
     }
-    if( n & 0x3 ) {
-        n = ( n & ~0X3 ) + 4;
-        printf( "Warning: size was given as %s, which is not a multiple of 4. %li kilobytes will be written instead.\n", argv[2], (long int) n );
+
+    return generateFakeData( f, n, offset );
+}
+
+void* batchWorker( void* ) {
+    while( true ) {
+        pthread_mutex_lock( &nextJobLock );
+        int j = nextJob++;
+        pthread_mutex_unlock( &nextJobLock );
+        if( j >= jobCount )
+            break;
+        jobs[j].result = generateFile( jobs[j].filename, jobs[j].n, jobs[j].offset );
+        if( jobs[j].result == 0 )
+            printf( "Done: %s\n", jobs[j].filename );
+        else
+            printf( "Failed: %s\n", jobs[j].filename );
     }
-    if( n > (long long int)2 * 1024 * 1024 * 1024 ) {
-        printf( "Fake data counter is 32 bits, meaning it can count to 4G and, printing 4 bytes for each count, can generate a maximum file size of 16G. You will have repetition in your fake file.\n" );
+    return NULL;
+}
+
+int batchMain( int argc, char** argv ) {
+    if( argc < 6 || ( argc - 3 ) % 3 != 0 ) {
+        usage( argv[0] );
         return -1;
     }
 
-    size_t offset = 0;
-    if( argc > 3 ) {
-        offset = strtol( argv[3], NULL, 10 );
+    long threads = strtol( argv[2], NULL, 10 );
+    if( threads < 1 )
+        threads = sysconf( _SC_NPROCESSORS_ONLN );
+    if( threads < 1 )
+        threads = 1;
+
+    jobCount = ( argc - 3 ) / 3;
+    jobs = (struct job*) malloc( jobCount * sizeof( struct job ) );
+    if( !jobs ) {
+        perror( "allocating jobs" );
+        return -1;
+    }
+    for( int j = 0; j < jobCount; j++ ) {
+        jobs[j].filename = argv[3 + 3 * j];
+        if( parseSize( argv[4 + 3 * j], &jobs[j].n ) )
+            return -1;
+        jobs[j].offset = strtol( argv[5 + 3 * j], NULL, 10 );
+        jobs[j].result = -1;
     }
+    if( threads > jobCount )
+        threads = jobCount;
 
-    int f = open( argv[1], OPENFLAGS, S_IRUSR | S_IWUSR | S_IRGRP | S_IROTH );
-    if( f < 0 ) {
-        perror( argv[1] );
+    // Batch mode writes many files at once: progress of each file would just be noise
+    fakedataVerbose = 0;
+
+    pthread_t* workers = (pthread_t*) malloc( threads * sizeof( pthread_t ) );
+    if( !workers ) {
+        perror( "allocating threads" );
         return -1;
     }
+    long started = 0;
+    for( ; started < threads; started++ ) {
+        if( pthread_create( workers + started, NULL, batchWorker, NULL ) )
+            break;
+    }
+    if( started == 0 )
+        batchWorker( NULL );
+    for( long t = 0; t < started; t++ )
+        pthread_join( workers[t], NULL );
+    free( workers );
 
-    return generateFakeData( f, n, offset );
+    int ret = 0;
+    for( int j = 0; j < jobCount; j++ )
+        if( jobs[j].result != 0 )
+            ret = jobs[j].result;
+    free( jobs );
+    return ret;
+}
+
+int main( int argc, char** argv ) {
+    if( argc > 1 && !strcmp( argv[1], "-p" ) )
+        return batchMain( argc, argv );
+
+    if( argc < 3 ) {
+        usage( argv[0] );
+        return -1;
+    }
+
+    size_t n;
+    if( parseSize( argv[2], &n ) )
+        return -1;
+
+    size_t offset = 0;
+    if( argc > 3 ) {
+        offset = strtol( argv[3], NULL, 10 );
+    }
+
+    return generateFile( argv[1], n, offset );
 }
@@ -0,0 +1,438 @@
+#include <stdio.h>
+#include <stdlib.h>
+#include <string.h>
+#include <errno.h>
+#include <time.h>
+#include <fcntl.h>
+#include <unistd.h>
+#include <dirent.h>
+#include <sys/types.h>
+#include <sys/stat.h>
+
+/*
+ * A low overhead sampler of process statistics from /proc.
+ *
+ * One sampler runs per host and serves all profiled executions on that host. Executions register themselves by
+ * appending a line to the file "register" in the sampler directory:
+ *     pid interval logdir
+ * where interval is the time between two samples in seconds (may be fractional) and logdir is the directory in which
+ * the logs of that process are written. The sampler picks up new registrations while running and samples each process
+ * until it disappears. No processes are forked for sampling: the /proc files of each process are kept open and
+ * reread.
+ *
+ * All logs have time as the wall clock time of the sample in seconds. The log cpu.log starts with a header line
+ *     #procsampler 1 clockticks pagesize
+ * followed by one line per sample
+ *     time utime stime cutime cstime vsize rss
+ * with the CPU times in clock ticks, vsize in bytes and rss in pages, all taken from /proc/pid/stat.
+ *
+ * The log io.log starts with the header line
+ *     #procsampler-io 1
+ * followed by one line per sample
+ *     time rchar wchar syscr syscw read_bytes write_bytes sockets txqueue rxqueue
+ * with the first six values as found in /proc/pid/io (-1 if that is not readable), sockets the number of open sockets
+ * of the process and txqueue and rxqueue the total number of bytes in the send and receive queues of its TCP sockets.
+ *
+ * The log net.log starts with the header line
+ *     #procsampler-net 1
+ * followed by one line per interface per sample
+ *     time interface rxbytes rxpackets txbytes txpackets
+ * as found in /proc/pid/net/dev, i.e. the counters of the network namespace of the process.
+ *
+ * The sampler stops when the file "stop" appears in the sampler directory, or when it has had nothing to do for an
+ * hour. On exit it removes the directory "running" from the sampler directory, which is used by the executions as a
+ * lock to start only one sampler.
+ */
+
+#define MAX_IDLE_SECONDS 3600.0
+#define REGISTER_POLL_SECONDS 0.1
+
+typedef struct {
+    int pid;
+    double interval;
+    double nextSample;
+    int statFd;
+    int ioFd;
+    int netDevFd;
+    int tcpFd;
+    int tcp6Fd;
+    FILE* log;
+    FILE* ioLog;
+    FILE* netLog;
+} sampledProcess;
+
+/* Buffer for reading complete /proc files */
+static char* fileBuffer = NULL;
+static size_t fileBufferSize = 0;
+
+/* Buffer for the socket inodes of a process */
+static unsigned long* inodes = NULL;
+static int inodeCapacity = 0;
+
+static sampledProcess* processes = NULL;
+static int processCount = 0;
+static int processCapacity = 0;
+
+static double now( void ) {
+    struct timespec ts;
+    clock_gettime( CLOCK_MONOTONIC, &ts );
+    return ts.tv_sec + ts.tv_nsec / 1e9;
+}
+
+static int openProcFile( int pid, const char* name ) {
+    char path[64];
+    snprintf( path, sizeof( path ), "/proc/%d/%s", pid, name );
+    return open( path, O_RDONLY );
+}
+
+static FILE* openLog( const char* logdir, const char* name ) {
+    char path[4096];
+    FILE* f;
+    snprintf( path, sizeof( path ), "%s/%s", logdir, name );
+    f = fopen( path, "a" );
+    if( !f )
+        fprintf( stderr, "Could not open log file %s: %s\n", path, strerror( errno ) );
+    return f;
+}
+
+static void closeFd( int fd ) {
+    if( fd >= 0 )
+        close( fd );
+}
+
+/* Adds a process to the list of sampled processes. Returns 0 on success. */
+static int addProcess( int pid, double interval, const char* logdir ) {
+    sampledProcess* p;
+    if( processCount == processCapacity ) {
+        processCapacity = processCapacity ? processCapacity * 2 : 16;
+        processes = (sampledProcess*)realloc( processes, processCapacity * sizeof( sampledProcess ) );
+        if( !processes ) {
+            perror( "realloc" );
+            exit( 1 );
+        }
+    }
+    p = processes + processCount;
+    p->statFd = openProcFile( pid, "stat" );
+    if( p->statFd < 0 ) {
+        fprintf( stderr, "Could not open /proc/%d/stat: %s\n", pid, strerror( errno ) );
+        return -1;
+    }
+    /* These may not be available, which only means their values are missing from the logs */
+    p->ioFd = openProcFile( pid, "io" );
+    p->netDevFd = openProcFile( pid, "net/dev" );
+    p->tcpFd = openProcFile( pid, "net/tcp" );
+    p->tcp6Fd = openProcFile( pid, "net/tcp6" );
+    p->log = openLog( logdir, "cpu.log" );
+    p->ioLog = openLog( logdir, "io.log" );
+    p->netLog = openLog( logdir, "net.log" );
+    if( !p->log || !p->ioLog || !p->netLog ) {
+        if( p->log )
+            fclose( p->log );
+        if( p->ioLog )
+            fclose( p->ioLog );
+        if( p->netLog )
+            fclose( p->netLog );
+        closeFd( p->statFd );
+        closeFd( p->ioFd );
+        closeFd( p->netDevFd );
+        closeFd( p->tcpFd );
+        closeFd( p->tcp6Fd );
+        return -1;
+    }
+    p->pid = pid;
+    p->interval = interval;
+    p->nextSample = now();
+    fprintf( p->log, "#procsampler 1 %ld %ld\n", sysconf( _SC_CLK_TCK ), sysconf( _SC_PAGESIZE ) );
+    fflush( p->log );
+    fprintf( p->ioLog, "#procsampler-io 1\n" );
+    fflush( p->ioLog );
+    fprintf( p->netLog, "#procsampler-net 1\n" );
+    fflush( p->netLog );
+    processCount++;
+    return 0;
+}
+
+static void removeProcess( int i ) {
+    closeFd( processes[i].statFd );
+    closeFd( processes[i].ioFd );
+    closeFd( processes[i].netDevFd );
+    closeFd( processes[i].tcpFd );
+    closeFd( processes[i].tcp6Fd );
+    fclose( processes[i].log );
+    fclose( processes[i].ioLog );
+    fclose( processes[i].netLog );
+    processes[i] = processes[processCount - 1];
+    processCount--;
+}
+
+/* Reads a complete /proc file into fileBuffer, which is zero terminated. Returns the length or -1 on failure. */
+static ssize_t readProcFile( int fd ) {
+    ssize_t n, total = 0;
+    if( fd < 0 )
+        return -1;
+    for( ;; ) {
+        if( fileBufferSize - total < 4096 ) {
+            fileBufferSize = fileBufferSize ? fileBufferSize * 2 : 65536;
+            fileBuffer = (char*)realloc( fileBuffer, fileBufferSize );
+            if( !fileBuffer ) {
+                perror( "realloc" );
+                exit( 1 );
+            }
+        }
+        n = pread( fd, fileBuffer + total, fileBufferSize - total - 1, total );
+        if( n < 0 )
+            return -1;
+        if( n == 0 )
+            break;
+        total += n;
+    }
+    fileBuffer[total] = '\0';
+    return total;
+}
+
+static int compareInodes( const void* a, const void* b ) {
+    unsigned long x = *(const unsigned long*)a;
+    unsigned long y = *(const unsigned long*)b;
+    return x < y ? -1 : ( x > y ? 1 : 0 );
+}
+
+/* Collects the sorted inodes of the sockets of a process in inodes. Returns their number, or -1 on failure. */
+static int collectSocketInodes( int pid ) {
+    char path[64];
+    char link[320];
+    char target[64];
+    DIR* d;
+    struct dirent* e;
+    ssize_t n;
+    int count = 0;
+    snprintf( path, sizeof( path ), "/proc/%d/fd", pid );
+    d = opendir( path );
+    if( !d )
+        return -1;
+    while( ( e = readdir( d ) ) ) {
+        if( e->d_name[0] == '.' )
+            continue;
+        snprintf( link, sizeof( link ), "%s/%s", path, e->d_name );
+        n = readlink( link, target, sizeof( target ) - 1 );
+        if( n < 9 )
+            continue;
+        target[n] = '\0';
+        if( strncmp( target, "socket:[", 8 ) )
+            continue;
+        if( count == inodeCapacity ) {
+            inodeCapacity = inodeCapacity ? inodeCapacity * 2 : 256;
+            inodes = (unsigned long*)realloc( inodes, inodeCapacity * sizeof( unsigned long ) );
+            if( !inodes ) {
+                perror( "realloc" );
+                exit( 1 );
+            }
+        }
+        inodes[count++] = strtoul( target + 8, NULL, 10 );
+    }
+    closedir( d );
+    qsort( inodes, count, sizeof( unsigned long ), compareInodes );
+    return count;
+}
+
+/* Adds the queue sizes of the TCP sockets in /proc/pid/net/tcp(6) that belong to the process. */
+static void sumTCPQueues( int fd, int inodeCount, unsigned long long* txqueue, unsigned long long* rxqueue ) {
+    char* line;
+    char* next;
+    unsigned long tx, rx, inode;
+    if( readProcFile( fd ) < 0 )
+        return;
+    /* Skip the header line */
+    line = strchr( fileBuffer, '\n' );
+    while( line ) {
+        line++;
+        next = strchr( line, '\n' );
+        /* sl local_address rem_address st tx_queue:rx_queue tr:tm->when retrnsmt uid timeout inode */
+        if( sscanf( line, "%*s %*s %*s %*s %lx:%lx %*s %*s %*s %*s %lu", &tx, &rx, &inode ) == 3 ) {
+            if( bsearch( &inode, inodes, inodeCount, sizeof( unsigned long ), compareInodes ) ) {
+                *txqueue += tx;
+                *rxqueue += rx;
+            }
+        }
+        line = next;
+    }
+}
+
+/* Writes the I/O and socket counters of a process to its io.log. */
+static void sampleIO( sampledProcess* p, struct timespec* ts ) {
+    long long rchar = -1, wchar = -1, syscr = -1, syscw = -1, readBytes = -1, writeBytes = -1;
+    unsigned long long txqueue = 0, rxqueue = 0;
+    char* s;
+    int sockets;
+    if( readProcFile( p->ioFd ) > 0 ) {
+        for( s = fileBuffer; s; s = strchr( s, '\n' ) ) {
+            if( *s == '\n' )
+                s++;
+            if( !strncmp( s, "rchar: ", 7 ) )
+                rchar = atoll( s + 7 );
+            else if( !strncmp( s, "wchar: ", 7 ) )
+                wchar = atoll( s + 7 );
+            else if( !strncmp( s, "syscr: ", 7 ) )
+                syscr = atoll( s + 7 );
+            else if( !strncmp( s, "syscw: ", 7 ) )
+                syscw = atoll( s + 7 );
+            else if( !strncmp( s, "read_bytes: ", 12 ) )
+                readBytes = atoll( s + 12 );
+            else if( !strncmp( s, "write_bytes: ", 13 ) )
+                writeBytes = atoll( s + 13 );
+        }
+    }
+    sockets = collectSocketInodes( p->pid );
+    if( sockets > 0 ) {
+        sumTCPQueues( p->tcpFd, sockets, &txqueue, &rxqueue );
+        sumTCPQueues( p->tcp6Fd, sockets, &txqueue, &rxqueue );
+    }
+    fprintf( p->ioLog, "%ld.%09ld %lld %lld %lld %lld %lld %lld %d %llu %llu\n", (long)ts->tv_sec, (long)ts->tv_nsec, rchar, wchar, syscr, syscw, readBytes, writeBytes, sockets, txqueue, rxqueue );
+    fflush( p->ioLog );
+}
+
+/* Writes the interface counters of the network namespace of a process to its net.log. */
+static void sampleNet( sampledProcess* p, struct timespec* ts ) {
+    char* line;
+    char* next;
+    char* colon;
+    unsigned long long v[10];
+    if( readProcFile( p->netDevFd ) < 0 )
+        return;
+    /* Skip the two header lines */
+    line = strchr( fileBuffer, '\n' );
+    if( line )
+        line = strchr( line + 1, '\n' );
+    while( line ) {
+        line++;
+        next = strchr( line, '\n' );
+        if( next )
+            *next = '\0';
+        colon = strchr( line, ':' );
+        if( colon ) {
+            *colon = '\0';
+            while( *line == ' ' )
+                line++;
+            /* rx: bytes packets errs drop fifo frame compressed multicast, tx: bytes packets ... */
+            if( sscanf( colon + 1, "%llu %llu %llu %llu %llu %llu %llu %llu %llu %llu", v, v + 1, v + 2, v + 3, v + 4, v + 5, v + 6, v + 7, v + 8, v + 9 ) == 10 )
+                fprintf( p->netLog, "%ld.%09ld %s %llu %llu %llu %llu\n", (long)ts->tv_sec, (long)ts->tv_nsec, line, v[0], v[1], v[8], v[9] );
+        }
+        line = next;
+    }
+    fflush( p->netLog );
+}
+
+/* Reads the complete lines that were added to the register file since the last call. */
+static void readRegistrations( const char* registerPath, long* offset ) {
+    char line[4096];
+    char logdir[4096];
+    int pid;
+    double interval;
+    size_t len;
+    FILE* f = fopen( registerPath, "r" );
+    if( !f )
+        return;
+    if( fseek( f, *offset, SEEK_SET ) == 0 ) {
+        while( fgets( line, sizeof( line ), f ) ) {
+            len = strlen( line );
+            /* Incomplete line: it's still being written, try again later */
+            if( len == 0 || line[len - 1] != '\n' )
+                break;
+            *offset += len;
+            line[len - 1] = '\0';
+            if( sscanf( line, "%d %lf %4095[^\n]", &pid, &interval, logdir ) != 3 || pid <= 0 || interval <= 0 ) {
+                fprintf( stderr, "Ignoring malformed registration: %s\n", line );
+                continue;
+            }
+            addProcess( pid, interval, logdir );
+        }
+    }
+    fclose( f );
+}
+
+/* Takes one sample of a process. Returns 0 on success, -1 if the process is gone. */
+static int sample( sampledProcess* p ) {
+    char buf[1024];
+    char* s;
+    char* tok;
+    char* save;
+    int field;
+    unsigned long long values[22];
+    struct timespec ts;
+    ssize_t n = pread( p->statFd, buf, sizeof( buf ) - 1, 0 );
+    if( n <= 0 )
+        return -1;
+    buf[n] = '\0';
+    clock_gettime( CLOCK_REALTIME, &ts );
+    /* The command name may contain anything, so start after its closing parenthesis */
+    s = strrchr( buf, ')' );
+    if( !s )
+        return -1;
+    /* Field 3 (state) is token 0, so field n is token n - 3 */
+    field = 0;
+    for( tok = strtok_r( s + 1, " ", &save ); tok && field < 22; tok = strtok_r( NULL, " ", &save ) )
+        values[field++] = strtoull( tok, NULL, 10 );
+    if( field < 22 )
+        return -1;
+    fprintf( p->log, "%ld.%09ld %llu %llu %llu %llu %llu %llu\n", (long)ts.tv_sec, (long)ts.tv_nsec, values[11], values[12], values[13], values[14], values[20], values[21] );
+    fflush( p->log );
+    sampleIO( p, &ts );
+    sampleNet( p, &ts );
+    return 0;
+}
+
+int main( int argc, char** argv ) {
+    char registerPath[4096];
+    char stopPath[4096];
+    char runningPath[4096];
+    long registerOffset = 0;
+    double t, next, lastBusy;
+    struct timespec sleepTime;
+    struct stat st;
+    int i;
+
+    if( argc < 2 ) {
+        printf( "Usage: %s directory\nSamples the processes registered in directory/register until directory/stop exists.\n", argv[0] );
+        return 1;
+    }
+    snprintf( registerPath, sizeof( registerPath ), "%s/register", argv[1] );
+    snprintf( stopPath, sizeof( stopPath ), "%s/stop", argv[1] );
+    snprintf( runningPath, sizeof( runningPath ), "%s/running", argv[1] );
+
+    lastBusy = now();
+    while( stat( stopPath, &st ) != 0 ) {
+        readRegistrations( registerPath, &registerOffset );
+        t = now();
+        next = t + REGISTER_POLL_SECONDS;
+        for( i = 0; i < processCount; ) {
+            if( processes[i].nextSample <= t ) {
+                if( sample( processes + i ) ) {
+                    removeProcess( i );
+                    continue;
+                }
+                processes[i].nextSample += processes[i].interval;
+                if( processes[i].nextSample <= t )
+                    processes[i].nextSample = t + processes[i].interval;
+            }
+            if( processes[i].nextSample < next )
+                next = processes[i].nextSample;
+            i++;
+        }
+        if( processCount > 0 )
+            lastBusy = t;
+        else if( t - lastBusy > MAX_IDLE_SECONDS )
+            break;
+        t = next - now();
+        if( t > 0 ) {
+            sleepTime.tv_sec = (time_t)t;
+            sleepTime.tv_nsec = (long)( ( t - sleepTime.tv_sec ) * 1e9 );
+            nanosleep( &sleepTime, NULL );
+        }
+    }
+    while( processCount > 0 )
+        removeProcess( processCount - 1 );
+    free( processes );
+    free( fileBuffer );
+    free( inodes );
+    rmdir( runningPath );
+    return 0;
+}